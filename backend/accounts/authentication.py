@@ -0,0 +1,182 @@
+"""
+Token authentication with an in-process cache.
+
+DRF's TokenAuthentication reads authtoken_token joined to users on every API
+call, and views then lazily load user.supplier_staff / user.consumer_profile.
+CachingTokenAuthentication loads the token, the user and both profile relations
+with one joined query and keeps the result in a bounded TTL LRU.
+
+Every entry remembers the user's version from the shared Django cache
+(USER_VERSION_KEY, Redis in production) at the time it was loaded, and a hit
+is used only while that version is unchanged - one cache GET instead of the
+joined query. invalidate_user() (see accounts.signals: the token is deleted,
+the user is saved or deleted, the user's SupplierStaff / ConsumerProfile
+changes) drops the local entries and deletes the shared version, right away
+and again after commit, so every worker process reloads the user on its next
+request, as accounts.link_access does with its shared tier.
+"""
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """
+    Bounded LRU of token key -> Token (with user and profiles) with a TTL.
+    Keeps a user_id -> keys index so all tokens of a user can be evicted at once.
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, token, version)
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self.get_versioned(key)
+        return entry[0] if entry is not None else None
+
+    def get_versioned(self, key):
+        """(token, version it was stored with) or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def set(self, key, token, version=None):
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, token, version)
+            self._keys_by_user.setdefault(token.user_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def evict(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def evict_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[1].user_id
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+
+def _build_cache():
+    options = getattr(settings, 'TOKEN_AUTH_CACHE', {})
+    return TokenCache(
+        max_size=options.get('MAX_SIZE', 10000),
+        ttl=options.get('TTL', 60),
+    )
+
+
+token_cache = _build_cache()
+
+USER_VERSION_KEY = 'accounts:token-auth:user:{user_id}'
+
+
+def _version_ttl():
+    return getattr(settings, 'TOKEN_AUTH_CACHE', {}).get('VERSION_TTL', 24 * 60 * 60)
+
+
+def user_version(user_id):
+    """Current shared version of the user's cached tokens, created if missing."""
+    key = USER_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        # add(): из двух процессов, создающих версию одновременно, выигрывает первый
+        cache.add(key, uuid.uuid4().hex, _version_ttl())
+        version = cache.get(key)
+    return version
+
+
+def _drop_user(user_id):
+    token_cache.evict_user(user_id)
+    cache.delete(USER_VERSION_KEY.format(user_id=user_id))
+
+
+def invalidate_user(user_id):
+    """
+    Make every process reload the user's tokens.
+
+    Dropped right away and once more after commit, so a concurrent request
+    can't cache the pre-commit state of the user under a fresh version.
+    """
+    if user_id is None:
+        return
+    _drop_user(user_id)
+    transaction.on_commit(lambda: _drop_user(user_id))
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for rest_framework.authentication.TokenAuthentication.
+    """
+
+    def get_token_queryset(self):
+        return Token.objects.select_related(
+            'user',
+            'user__supplier_staff',
+            'user__consumer_profile',
+        )
+
+    def authenticate_credentials(self, key):
+        token = None
+        entry = token_cache.get_versioned(key)
+        if entry is not None:
+            token, version = entry
+            if version is None or cache.get(USER_VERSION_KEY.format(user_id=token.user_id)) != version:
+                # пользователя изменили в другом процессе
+                token_cache.evict(key)
+                token = None
+
+        if token is None:
+            try:
+                token = self.get_token_queryset().get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+            token_cache.set(key, token, user_version(token.user_id))
+
+        # каждый запрос получает свою копию: views меняют и сохраняют request.user
+        token = copy.deepcopy(token)
+        return (token.user, token)
@@ -0,0 +1,132 @@
+"""
+Cached consumer -> accepted suppliers access map.
+
+The "does this consumer have an accepted link with this supplier" check runs on
+every catalog read, order / chat / complaint creation. The set of accepted
+supplier ids per consumer is kept in two tiers:
+
+  1. process memory (bounded, short TTL) - a plain set lookup;
+  2. the shared Django cache (Redis in production, see CACHES in settings).
+
+Both tiers are stamped with the consumer's version in the shared cache
+(VERSION_KEY) read before the set was loaded, and an entry is used only
+while that version is current - one cache GET on a local hit. Any
+save/delete of a ConsumerSupplierLink (approve / reject / block, cancel,
+admin edits, cascades, see accounts.signals) replaces the version, right
+away and again after commit, so every process reloads on its next check
+and a set loaded before the change is never served, even if it is stored
+after the invalidation.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ConsumerSupplierLink
+
+
+CACHE_KEY = 'accounts:accepted-suppliers:{consumer_id}'
+VERSION_KEY = 'accounts:accepted-suppliers:version:{consumer_id}'
+
+_local = OrderedDict()  # consumer_id -> (expires_at, version, frozenset of supplier ids)
+_lock = threading.Lock()
+
+
+def _local_ttl():
+    return getattr(settings, 'LINK_ACCESS_LOCAL_TTL', 5)
+
+
+def _shared_ttl():
+    return getattr(settings, 'LINK_ACCESS_CACHE_TTL', 60 * 60)
+
+
+def _version_ttl():
+    return getattr(settings, 'LINK_ACCESS_VERSION_TTL', 24 * 60 * 60)
+
+
+def _local_max_size():
+    return getattr(settings, 'LINK_ACCESS_LOCAL_MAX_SIZE', 10000)
+
+
+def _load(consumer_id):
+    return frozenset(
+        ConsumerSupplierLink.objects.filter(
+            consumer_id=consumer_id,
+            status='accepted',
+        ).values_list('supplier_id', flat=True)
+    )
+
+
+def consumer_version(consumer_id):
+    """Current shared version of the consumer's access set, created if missing."""
+    key = VERSION_KEY.format(consumer_id=consumer_id)
+    version = cache.get(key)
+    if version is None:
+        # add(): из двух процессов, создающих версию одновременно, выигрывает первый
+        cache.add(key, uuid.uuid4().hex, _version_ttl())
+        version = cache.get(key)
+    return version
+
+
+def get_accepted_supplier_ids(consumer_id):
+    """
+    frozenset of supplier ids the consumer has an accepted link with.
+    """
+    now = time.monotonic()
+    version = consumer_version(consumer_id)
+    with _lock:
+        entry = _local.get(consumer_id)
+        if entry is not None and entry[0] > now and entry[1] == version:
+            _local.move_to_end(consumer_id)
+            return entry[2]
+
+    key = CACHE_KEY.format(consumer_id=consumer_id)
+    entry = cache.get(key)
+    if entry is not None and entry[0] == version:
+        supplier_ids = entry[1]
+    else:
+        # набор с версией, прочитанной до загрузки: если связи поменяют раньше, чем мы его
+        # сохраним, версия уже будет другой и запись никто не возьмёт
+        supplier_ids = _load(consumer_id)
+        cache.set(key, (version, supplier_ids), _shared_ttl())
+
+    with _lock:
+        _local[consumer_id] = (now + _local_ttl(), version, supplier_ids)
+        _local.move_to_end(consumer_id)
+        while len(_local) > _local_max_size():
+            _local.popitem(last=False)
+    return supplier_ids
+
+
+def has_accepted_link(consumer_id, supplier_id):
+    return supplier_id in get_accepted_supplier_ids(consumer_id)
+
+
+def _drop(consumer_id):
+    with _lock:
+        _local.pop(consumer_id, None)
+    cache.set(VERSION_KEY.format(consumer_id=consumer_id), uuid.uuid4().hex, _version_ttl())
+    cache.delete(CACHE_KEY.format(consumer_id=consumer_id))
+
+
+def invalidate(consumer_id):
+    """
+    Forget the cached access set of a consumer in every process.
+
+    The version is replaced right away and once more after commit, so a set
+    a concurrent request loads from the pre-commit links is never served.
+    """
+    if consumer_id is None:
+        return
+    _drop(consumer_id)
+    transaction.on_commit(lambda: _drop(consumer_id))
+
+
+def clear():
+    """Drop the whole in-process tier (tests / maintenance)."""
+    with _lock:
+        _local.clear()
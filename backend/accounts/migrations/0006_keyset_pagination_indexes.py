@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_consumersupplierlink_assigned_sales_rep'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consumersupplierlink',
+            index=models.Index(fields=['consumer', '-requested_at', 'id'], name='consumer_su_consume_8d22ce_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consumersupplierlink',
+            index=models.Index(fields=['supplier', '-requested_at', 'id'], name='consumer_su_supplie_866522_idx'),
+        ),
+    ]
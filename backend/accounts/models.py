@@ -104,6 +104,8 @@ class SupplierProfile(models.Model):
     city = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
     logo = models.ImageField(upload_to='supplier_logos/', blank=True, null=True)
+    # уменьшенные копии логотипа (scp_project/images.py)
+    logo_variants = models.JSONField(blank=True, null=True, editable=False)
     is_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -161,6 +163,11 @@ class ConsumerSupplierLink(models.Model):
     class Meta:
         db_table = 'consumer_supplier_links'
         unique_together = ['consumer', 'supplier']
+        indexes = [
+            # keyset-пагинация /api/accounts/links/: (-requested_at, id)
+            models.Index(fields=['consumer', '-requested_at', 'id']),
+            models.Index(fields=['supplier', '-requested_at', 'id']),
+        ]
         
     def __str__(self):
         return f"{self.consumer.business_name} -> {self.supplier.company_name} ({self.status})"
\ No newline at end of file
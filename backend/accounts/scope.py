@@ -0,0 +1,201 @@
+"""
+Per-request authorization scope.
+
+Every view needs to know who the requesting user is: superuser, supplier
+staff (and for which supplier, with which role) or consumer (and which
+suppliers accepted them). Instead of querying SupplierStaff / ConsumerProfile /
+ConsumerSupplierLink again in each view, the scope is resolved lazily once per
+request and cached on the request object.
+
+Usage in a view:
+
+    scope = get_access_scope(self.request)
+    if scope.is_staff_of(supplier_id): ...
+"""
+from django.utils.functional import cached_property
+
+from . import link_access
+from .models import User
+
+
+# user_type -> role inside the supplier organization
+STAFF_ROLES = {
+    'supplier_owner': 'owner',
+    'supplier_manager': 'manager',
+    'supplier_sales': 'sales',
+}
+
+
+def _as_id(value):
+    """Normalize a supplier id coming from URL kwargs / request data."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_cached_relation(user, name):
+    """
+    Return (is_cached, value) for a reverse one-to-one relation of the user
+    without hitting the database.
+    """
+    descriptor = getattr(type(user), name)
+    if descriptor.is_cached(user):
+        return True, descriptor.related.get_cached_value(user)
+    return False, None
+
+
+class AccessScope:
+    """
+    Authorization facts about one user, computed on first access.
+
+    kind is one of: 'superuser', 'staff', 'consumer', 'anonymous', 'none'.
+    """
+    SUPERUSER = 'superuser'
+    STAFF = 'staff'
+    CONSUMER = 'consumer'
+    ANONYMOUS = 'anonymous'
+    NONE = 'none'
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def _profiles(self):
+        """
+        (supplier_staff, consumer_profile) for the user.
+        Both relations are loaded with a single joined query, unless they are
+        already cached on the user instance (e.g. by the authentication class).
+        """
+        user = self.user
+        if user is None or not user.is_authenticated:
+            return None, None
+
+        staff_cached, staff = _get_cached_relation(user, 'supplier_staff')
+        consumer_cached, consumer = _get_cached_relation(user, 'consumer_profile')
+        if staff_cached and consumer_cached:
+            return staff, consumer
+
+        loaded = (
+            User.objects
+            .select_related('supplier_staff', 'consumer_profile')
+            .get(pk=user.pk)
+        )
+        _, staff = _get_cached_relation(loaded, 'supplier_staff')
+        _, consumer = _get_cached_relation(loaded, 'consumer_profile')
+
+        # кладём в кэш самого user, чтобы user.supplier_staff / user.consumer_profile
+        # дальше по коду не делали отдельных запросов
+        User.supplier_staff.related.set_cached_value(user, staff)
+        User.consumer_profile.related.set_cached_value(user, consumer)
+        return staff, consumer
+
+    # ---- principal ----
+
+    @property
+    def is_authenticated(self):
+        return self.user is not None and self.user.is_authenticated
+
+    @property
+    def is_superuser(self):
+        return self.is_authenticated and self.user.is_superuser
+
+    @cached_property
+    def kind(self):
+        if not self.is_authenticated:
+            return self.ANONYMOUS
+        if self.user.is_superuser:
+            return self.SUPERUSER
+        if self.staff is not None:
+            return self.STAFF
+        if self.consumer_profile is not None:
+            return self.CONSUMER
+        return self.NONE
+
+    # ---- supplier staff ----
+
+    @property
+    def staff(self):
+        return self._profiles[0]
+
+    @property
+    def is_staff_member(self):
+        return self.staff is not None
+
+    @cached_property
+    def supplier_ids(self):
+        """Suppliers the user works for (empty for non-staff)."""
+        if self.staff is None:
+            return frozenset()
+        return frozenset([self.staff.supplier_id])
+
+    @property
+    def supplier_id(self):
+        return self.staff.supplier_id if self.staff is not None else None
+
+    @property
+    def role(self):
+        """'owner', 'manager', 'sales' or None."""
+        if self.staff is None:
+            return None
+        return STAFF_ROLES.get(self.user.user_type)
+
+    def is_staff_of(self, supplier_id):
+        return _as_id(supplier_id) in self.supplier_ids
+
+    def role_for(self, supplier_id):
+        """Role of the user inside the given supplier, or None."""
+        if not self.is_staff_of(supplier_id):
+            return None
+        return self.role
+
+    # ---- consumer ----
+
+    @property
+    def consumer_profile(self):
+        return self._profiles[1]
+
+    @property
+    def consumer_id(self):
+        profile = self.consumer_profile
+        return profile.id if profile is not None else None
+
+    @property
+    def is_consumer(self):
+        return self.consumer_profile is not None
+
+    @cached_property
+    def accepted_supplier_ids(self):
+        """
+        Suppliers that accepted a link with the consumer (empty for non-consumers).
+        Served from the cached access map, see accounts.link_access.
+        """
+        if self.consumer_profile is None:
+            return frozenset()
+        return link_access.get_accepted_supplier_ids(self.consumer_id)
+
+    def has_accepted_link(self, supplier_id):
+        return _as_id(supplier_id) in self.accepted_supplier_ids
+
+    # ---- combined checks ----
+
+    def can_view_supplier(self, supplier_id):
+        """Superuser, staff of the supplier or consumer with an accepted link."""
+        return (
+            self.is_superuser
+            or self.is_staff_of(supplier_id)
+            or self.has_accepted_link(supplier_id)
+        )
+
+
+def get_access_scope(request):
+    """
+    Return the AccessScope of the request, creating it on first call.
+    The scope is bound to request.user, so it is rebuilt if authentication changes.
+    """
+    user = getattr(request, 'user', None)
+    scope = getattr(request, 'access_scope', None)
+    if scope is None or scope.user is not user:
+        scope = AccessScope(user)
+        request.access_scope = scope
+    return scope
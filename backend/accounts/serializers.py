@@ -3,23 +3,31 @@ from .models import User, ConsumerProfile, SupplierProfile, ConsumerSupplierLink
 
 from django.db import transaction
 
+from scp_project.fieldsets import SparseFieldsetMixin
+from scp_project.images import ImageVariantsField
 
-class SupplierProfileSerializer(serializers.ModelSerializer):
+
+class SupplierProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Карточка поставщика (компания).
     """
+    logo_variants = ImageVariantsField()
+
     class Meta:
         model = SupplierProfile
         fields = [
             'id',
             'company_name',
             'city',
+            'logo',
+            'logo_variants',  # thumb / list / detail + placeholder
             'is_verified',
             'created_at',
         ]
+        read_only_fields = ['logo']
 
 
-class ConsumerProfileSerializer(serializers.ModelSerializer):
+class ConsumerProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Карточка потребителя (ресторан/отель).
     """
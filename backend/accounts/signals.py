@@ -0,0 +1,80 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from scp_project import images
+
+from . import link_access
+from .authentication import invalidate_user, token_cache
+from .models import ConsumerProfile, ConsumerSupplierLink, SupplierProfile, SupplierStaff, User
+
+
+# ---- accepted-link access map ----
+
+@receiver(post_init, sender=ConsumerSupplierLink)
+def remember_link_consumer(sender, instance, **kwargs):
+    # запоминаем исходного consumer, чтобы при смене consumer (админка) сбросить кэш обоих
+    instance._loaded_consumer_id = instance.__dict__.get('consumer_id')
+
+
+@receiver(post_save, sender=ConsumerSupplierLink)
+def invalidate_link_access_on_save(sender, instance, **kwargs):
+    link_access.invalidate(instance.consumer_id)
+    loaded_consumer_id = getattr(instance, '_loaded_consumer_id', None)
+    if loaded_consumer_id != instance.consumer_id:
+        link_access.invalidate(loaded_consumer_id)
+    instance._loaded_consumer_id = instance.consumer_id
+
+
+@receiver(post_delete, sender=ConsumerSupplierLink)
+def invalidate_link_access_on_delete(sender, instance, **kwargs):
+    link_access.invalidate(instance.consumer_id)
+    loaded_consumer_id = getattr(instance, '_loaded_consumer_id', None)
+    if loaded_consumer_id != instance.consumer_id:
+        link_access.invalidate(loaded_consumer_id)
+
+
+# ---- token authentication cache ----
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    token_cache.evict(instance.key)
+    # другие процессы узнают об этом по версии пользователя в общем кэше
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def evict_changed_user(sender, instance, **kwargs):
+    # деактивация, смена user_type и т.д. — следующий запрос перечитает пользователя
+    invalidate_user(instance.pk)
+
+
+@receiver(post_init, sender=SupplierStaff)
+@receiver(post_init, sender=ConsumerProfile)
+def remember_profile_user(sender, instance, **kwargs):
+    instance._loaded_user_id = instance.__dict__.get('user_id')
+
+
+@receiver(post_save, sender=SupplierStaff)
+@receiver(post_delete, sender=SupplierStaff)
+@receiver(post_save, sender=ConsumerProfile)
+@receiver(post_delete, sender=ConsumerProfile)
+def evict_profile_user(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+    loaded_user_id = getattr(instance, '_loaded_user_id', None)
+    if loaded_user_id is not None and loaded_user_id != instance.user_id:
+        invalidate_user(loaded_user_id)
+    instance._loaded_user_id = instance.user_id
+
+
+# ---- supplier logo derivatives ----
+
+@receiver(post_save, sender=SupplierProfile)
+def queue_logo_variants(sender, instance, **kwargs):
+    images.queue_if_changed(instance, 'logo', 'logo_variants')
+
+
+@receiver(post_delete, sender=SupplierProfile)
+def delete_logo_variants(sender, instance, **kwargs):
+    images.delete_for(instance, 'logo', 'logo_variants')
@@ -1,3 +1,406 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from catalog.models import Category, Product
+from chat.models import Conversation, Message
+from complaints.models import Complaint, Incident
+from orders.models import Order, OrderItem
+
+from . import link_access
+from .admin import ConsumerSupplierLinkAdmin
+from .authentication import USER_VERSION_KEY, TokenCache, token_cache
+from .models import ConsumerProfile, ConsumerSupplierLink, SupplierProfile, SupplierStaff
+from .scope import AccessScope, get_access_scope
+
+User = get_user_model()
+
+
+class ScopeFixtureMixin:
+    """
+    Supplier with an owner and a sales rep, a linked consumer and a bit of data
+    in every app, so list endpoints have several rows to serialize.
+    """
+
+    def setUp(self):
+        cache.clear()
+        link_access.clear()
+        token_cache.clear()
+        self.client = APIClient()
+
+        self.supplier = SupplierProfile.objects.create(
+            company_name="Fresh Farm", city="Almaty", address="Street 1", registration_number="111"
+        )
+        self.other_supplier = SupplierProfile.objects.create(
+            company_name="Other Farm", city="Almaty", address="Street 2", registration_number="222"
+        )
+
+        self.owner = User.objects.create_user(
+            username='owner', email='owner@example.com', password='password', user_type='supplier_owner'
+        )
+        self.owner_staff = SupplierStaff.objects.create(user=self.owner, supplier=self.supplier, position="Owner")
+        self.sales = User.objects.create_user(
+            username='sales', email='sales@example.com', password='password', user_type='supplier_sales'
+        )
+        self.sales_staff = SupplierStaff.objects.create(user=self.sales, supplier=self.supplier, position="Sales")
+
+        self.consumer_user = User.objects.create_user(
+            username='consumer', email='consumer@example.com', password='password', user_type='consumer'
+        )
+        self.consumer = ConsumerProfile.objects.create(
+            user=self.consumer_user,
+            business_name="Cafe",
+            business_type="cafe",
+            address="Street 3",
+            city="Almaty",
+        )
+        self.link = ConsumerSupplierLink.objects.create(
+            consumer=self.consumer, supplier=self.supplier, status='accepted', assigned_sales_rep=self.sales_staff
+        )
+        ConsumerSupplierLink.objects.create(consumer=self.consumer, supplier=self.other_supplier, status='pending')
+
+        parent = Category.objects.create(name="Food")
+        category = Category.objects.create(name="Dairy", parent=parent)
+        self.products = [
+            Product.objects.create(
+                supplier=self.supplier,
+                category=category,
+                name=f"Milk {i}",
+                unit='l',
+                unit_price=Decimal('10.00'),
+                stock_quantity=Decimal('100'),
+            )
+            for i in range(3)
+        ]
+
+        for _ in range(3):
+            order = Order.objects.create(consumer=self.consumer, supplier=self.supplier, total_amount=Decimal('20'))
+            for product in self.products:
+                OrderItem.objects.create(
+                    order=order,
+                    product=product,
+                    quantity=Decimal('2'),
+                    unit_price=product.unit_price,
+                    line_total=Decimal('20'),
+                )
+
+        self.conversations = []
+        for _ in range(3):
+            conv = Conversation.objects.create(
+                supplier=self.supplier,
+                consumer=self.consumer,
+                created_by=self.consumer_user,
+                assigned_staff=self.sales_staff,
+            )
+            for text in ("hi", "hello"):
+                Message.objects.create(conversation=conv, sender=self.consumer_user, text=text)
+            self.conversations.append(conv)
+
+        for i in range(3):
+            Complaint.objects.create(
+                consumer=self.consumer,
+                supplier=self.supplier,
+                created_by=self.consumer_user,
+                title=f"Complaint {i}",
+                description="Broken bottles",
+            )
+            Incident.objects.create(
+                supplier=self.supplier,
+                created_by=self.owner,
+                title=f"Incident {i}",
+                description="Truck delay",
+            )
+
+    def authenticate(self, user):
+        # свежий экземпляр, чтобы кэш связей от прошлых запросов не влиял на подсчёт запросов
+        self.client.force_authenticate(user=User.objects.get(pk=user.pk))
+
+
+class AccessScopeTest(ScopeFixtureMixin, TestCase):
+
+    def test_consumer_scope(self):
+        scope = AccessScope(User.objects.get(pk=self.consumer_user.pk))
+        with self.assertNumQueries(2):
+            self.assertEqual(scope.kind, AccessScope.CONSUMER)
+            self.assertEqual(scope.consumer_id, self.consumer.id)
+            self.assertEqual(scope.supplier_ids, frozenset())
+            self.assertIsNone(scope.role)
+            self.assertEqual(scope.accepted_supplier_ids, frozenset([self.supplier.id]))
+            self.assertTrue(scope.can_view_supplier(self.supplier.id))
+            self.assertFalse(scope.can_view_supplier(self.other_supplier.id))
+
+    def test_staff_scope(self):
+        scope = AccessScope(User.objects.get(pk=self.sales.pk))
+        with self.assertNumQueries(1):
+            self.assertEqual(scope.kind, AccessScope.STAFF)
+            self.assertEqual(scope.supplier_ids, frozenset([self.supplier.id]))
+            self.assertEqual(scope.role, 'sales')
+            self.assertEqual(scope.role_for(self.supplier.id), 'sales')
+            self.assertIsNone(scope.role_for(self.other_supplier.id))
+            self.assertFalse(scope.is_staff_of('not-an-id'))
+            self.assertEqual(scope.accepted_supplier_ids, frozenset())
+
+    def test_scope_primes_user_relations(self):
+        user = User.objects.get(pk=self.owner.pk)
+        AccessScope(user).kind
+        with self.assertNumQueries(0):
+            self.assertEqual(user.supplier_staff.supplier_id, self.supplier.id)
+
+    def test_scope_is_cached_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.consumer_user.pk)
+        self.assertIs(get_access_scope(request), get_access_scope(request))
+
+
+class EndpointQueryCountTest(ScopeFixtureMixin, TestCase):
+    """
+    Each endpoint resolves the user's scope once; the number of queries must not
+    depend on how many rows are returned.
+    """
+
+    def assertQueries(self, user, url, expected):
+        self.authenticate(user)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response
+
+    def test_links(self):
+        # scope + links
+        response = self.assertQueries(self.consumer_user, reverse('consumer-supplier-links'), 2)
+        self.assertEqual(len(response.data), 2)
+        self.assertQueries(self.owner, reverse('consumer-supplier-links'), 2)
+
+    def test_supplier_products(self):
+        # scope + accepted links + products
+        url = reverse('supplier-products', args=[self.supplier.id])
+        response = self.assertQueries(self.consumer_user, url, 3)
+        self.assertEqual(len(response.data), 3)
+        self.assertQueries(self.owner, url, 2)
+
+    def test_orders(self):
+        # scope + orders + items
+        response = self.assertQueries(self.consumer_user, reverse('order-list-create'), 3)
+        self.assertEqual(len(response.data), 3)
+        self.assertQueries(self.owner, reverse('order-list-create'), 3)
+        self.assertQueries(self.owner, reverse('my-supplier-orders'), 3)
+        self.assertQueries(self.consumer_user, reverse('my-consumer-orders'), 3)
+
+    def test_conversations(self):
+        # scope + conversations with annotated summary
+        response = self.assertQueries(self.sales, reverse('conversation-list-create'), 2)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response.data[0]['unread_count'], 2)
+        self.assertEqual(response.data[0]['last_message'], 'hello')
+
+    def test_messages(self):
+        # scope + conversation + messages
+        url = reverse('message-list-create', args=[self.conversations[0].id])
+        response = self.assertQueries(self.consumer_user, url, 3)
+        self.assertEqual(len(response.data), 2)
+        self.assertQueries(self.owner, url, 3)
+
+    def test_complaints(self):
+        # scope + complaints
+        response = self.assertQueries(self.sales, reverse('complaint-list-create'), 2)
+        self.assertEqual(len(response.data), 3)
+        self.assertQueries(self.consumer_user, reverse('complaint-list-create'), 2)
+
+    def test_incidents(self):
+        # scope + incidents
+        response = self.assertQueries(self.owner, reverse('incident-list-create'), 2)
+        self.assertEqual(len(response.data), 3)
+
+    def test_create_order_checks_link_from_scope(self):
+        self.authenticate(self.consumer_user)
+        response = self.client.post(
+            reverse('order-list-create'),
+            {
+                'supplier_id': self.other_supplier.id,
+                'items': [{'product_id': self.products[0].id, 'quantity': '1', 'unit_price': '10.00'}],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class AcceptedLinkCacheTest(ScopeFixtureMixin, TestCase):
+
+    def accepted(self):
+        return link_access.get_accepted_supplier_ids(self.consumer.id)
+
+    def test_warm_lookup_skips_database(self):
+        self.assertEqual(self.accepted(), frozenset([self.supplier.id]))
+        with self.assertNumQueries(0):
+            self.assertTrue(link_access.has_accepted_link(self.consumer.id, self.supplier.id))
+
+    def test_shared_tier_survives_local_eviction(self):
+        self.accepted()
+        link_access.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.accepted(), frozenset([self.supplier.id]))
+
+    def test_block_in_another_process_is_seen(self):
+        self.accepted()
+        # другой процесс заблокировал связь: наши записи остались, его сигнал сменил общую версию
+        ConsumerSupplierLink.objects.filter(pk=self.link.pk).update(status='blocked')
+        self.assertIn(self.supplier.id, self.accepted())
+
+        cache.set(link_access.VERSION_KEY.format(consumer_id=self.consumer.id), 'other-process')
+        self.assertNotIn(self.supplier.id, self.accepted())
+
+    def test_set_loaded_before_a_change_is_not_served(self):
+        load = link_access._load
+
+        def load_then_reject(consumer_id):
+            # связь отклоняют, пока этот запрос читает старый набор из базы
+            supplier_ids = load(consumer_id)
+            ConsumerSupplierLink.objects.filter(pk=self.link.pk).update(status='rejected')
+            link_access.invalidate(consumer_id)
+            return supplier_ids
+
+        with mock.patch.object(link_access, '_load', side_effect=load_then_reject):
+            self.assertIn(self.supplier.id, self.accepted())
+        self.assertNotIn(self.supplier.id, self.accepted())
+
+    def test_products_use_cached_link(self):
+        self.accepted()
+        self.authenticate(self.consumer_user)
+        # scope + products, the link check is an in-memory lookup
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('supplier-products', args=[self.supplier.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_approve_invalidates(self):
+        pending = ConsumerSupplierLink.objects.get(supplier=self.other_supplier)
+        other_owner = User.objects.create_user(
+            username='owner2', email='owner2@example.com', password='password', user_type='supplier_owner'
+        )
+        SupplierStaff.objects.create(user=other_owner, supplier=self.other_supplier)
+        self.assertNotIn(self.other_supplier.id, self.accepted())
+
+        self.authenticate(other_owner)
+        response = self.client.post(reverse('link-approve', args=[pending.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(self.other_supplier.id, self.accepted())
+
+        response = self.client.post(reverse('link-block', args=[pending.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(self.other_supplier.id, self.accepted())
+
+    def test_block_denies_catalog_access(self):
+        self.authenticate(self.consumer_user)
+        url = reverse('supplier-products', args=[self.supplier.id])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        self.authenticate(self.owner)
+        self.client.post(reverse('link-block', args=[self.link.id]))
+
+        self.authenticate(self.consumer_user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_cancel_invalidates(self):
+        pending = ConsumerSupplierLink.objects.get(supplier=self.other_supplier)
+        self.accepted()
+        self.authenticate(self.consumer_user)
+        response = self.client.post(reverse('link-cancel', args=[pending.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertIsNone(cache.get(link_access.CACHE_KEY.format(consumer_id=self.consumer.id)))
+
+    def test_admin_edit_invalidates(self):
+        self.accepted()
+        request = RequestFactory().post('/')
+        request.user = User.objects.create_superuser(email='admin@example.com', username='admin', password='password')
+        link = ConsumerSupplierLink.objects.get(pk=self.link.pk)
+        link.status = 'rejected'
+        ConsumerSupplierLinkAdmin(ConsumerSupplierLink, AdminSite()).save_model(request, link, None, True)
+        self.assertEqual(self.accepted(), frozenset())
+
+
+class TokenCacheTest(TestCase):
+
+    def test_lru_bound_and_ttl(self):
+        lru = TokenCache(max_size=2, ttl=60)
+        tokens = [Token(key=f"key{i}", user_id=i) for i in range(3)]
+        for token in tokens:
+            lru.set(token.key, token)
+        self.assertEqual(len(lru), 2)
+        self.assertIsNone(lru.get('key0'))
+        self.assertIs(lru.get('key2'), tokens[2])
+
+        lru.evict_user(2)
+        self.assertIsNone(lru.get('key2'))
+
+        expired = TokenCache(max_size=2, ttl=0)
+        expired.set('key0', tokens[0])
+        self.assertIsNone(expired.get('key0'))
+
+
+class CachingTokenAuthenticationTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.owner)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.url = reverse('incident-list-create')
+
+    def test_first_request_loads_user_and_profiles_in_one_query(self):
+        # token+user+profiles, incidents
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cached_request_skips_auth_query(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 3)
+
+    def test_invalid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token nope")
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_is_evicted(self):
+        self.client.get(self.url)
+        self.token.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_evicted(self):
+        self.client.get(self.url)
+        self.owner.is_active = False
+        self.owner.save()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_change_in_another_process_is_seen(self):
+        self.client.get(self.url)
+        # другой процесс деактивировал пользователя: у нас остаётся только локальная запись,
+        # общая версия пользователя удалена его сигналом
+        User.objects.filter(pk=self.owner.pk).update(is_active=False)
+        self.assertIsNotNone(token_cache.get(self.token.key))
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+        cache.delete(USER_VERSION_KEY.format(user_id=self.owner.pk))
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_change_is_evicted(self):
+        self.client.get(self.url)
+        self.owner_staff.supplier = self.other_supplier
+        self.owner_staff.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 0)
+
+    def test_requests_get_their_own_user_copy(self):
+        self.client.patch(reverse('user-profile-update'), {'first_name': 'Changed'})
+        cached = token_cache.get(self.token.key)
+        self.assertIsNone(cached)
+        self.client.get(self.url)
+        self.assertEqual(token_cache.get(self.token.key).user.first_name, 'Changed')
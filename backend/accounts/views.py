@@ -4,11 +4,12 @@ from rest_framework import generics, permissions, status
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .models import ConsumerProfile, ConsumerSupplierLink, SupplierProfile, SupplierStaff
+from .scope import get_access_scope
 from .serializers import (
     ConsumerProfileSerializer,
     ConsumerRegisterSerializer,
@@ -41,21 +42,17 @@ def me(request):
 
 
 
-def resolve_requester_supplier_id(user):
+def resolve_requester_supplier_id(request):
     """
     Helper to determine the supplier_id for the requesting user.
     - If user is superuser, they might provide ?supplier_id=... (not implemented here, but possible).
-    - If user is staff, we look up their SupplierStaff entry.
+    - If user is staff, we take it from the request's access scope.
     """
-    if user.is_superuser:
+    scope = get_access_scope(request)
+    if scope.is_superuser:
         return None  # Superuser context might be handled differently in views
-    
-    # Check if user is linked to a supplier
-    try:
-        staff = SupplierStaff.objects.get(user=user)
-        return staff.supplier_id
-    except SupplierStaff.DoesNotExist:
-        return None
+
+    return scope.supplier_id
 
 
 class IsSupplierOwnerOrManagerOrAdmin(permissions.BasePermission):
@@ -93,6 +90,7 @@ class SupplierListView(generics.ListAPIView):
     queryset = SupplierProfile.objects.all().order_by('-is_verified', 'company_name')
     serializer_class = SupplierProfileSerializer
     permission_classes = [permissions.AllowAny]  # пока открыто всем
+    keyset_ordering = ('company_name', 'id')
 
 class ConsumerSupplierLinkListCreateView(generics.ListCreateAPIView):
     """
@@ -102,38 +100,34 @@ class ConsumerSupplierLinkListCreateView(generics.ListCreateAPIView):
     """
     serializer_class = ConsumerSupplierLinkSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('-requested_at', 'id')
 
     def get_queryset(self):
-        user = self.request.user
+        scope = get_access_scope(self.request)
 
         # если пользователь — consumer
-        if hasattr(user, 'consumer_profile'):
+        if scope.is_consumer:
             return ConsumerSupplierLink.objects.filter(
-                consumer=user.consumer_profile
+                consumer_id=scope.consumer_id
             ).select_related('consumer', 'supplier')
 
         # если пользователь — сотрудник поставщика (Owner/Manager/Sales)
-        staff_links = SupplierStaff.objects.filter(user=user).select_related('supplier')
-        supplier_ids = [s.supplier_id for s in staff_links]
-        if supplier_ids:
+        if scope.supplier_ids:
             return ConsumerSupplierLink.objects.filter(
-                supplier_id__in=supplier_ids
+                supplier_id__in=scope.supplier_ids
             ).select_related('consumer', 'supplier')
 
         # если суперюзер / админ — можно всё
-        if user.is_superuser:
+        if scope.is_superuser:
             return ConsumerSupplierLink.objects.all().select_related('consumer', 'supplier')
 
         # по умолчанию — пусто
         return ConsumerSupplierLink.objects.none()
 
     def perform_create(self, serializer):
-        user = self.request.user
-
-        # 1) ищем ConsumerProfile по user
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
+        # 1) берём ConsumerProfile из scope запроса
+        consumer_profile = get_access_scope(self.request).consumer_profile
+        if consumer_profile is None:
             raise ValidationError("У текущего пользователя нет ConsumerProfile, он не может создавать запросы.")
 
         # 2) можно дополнительно проверить, что это именно consumer
@@ -170,11 +164,10 @@ class BaseLinkActionView(APIView):
         except ConsumerSupplierLink.DoesNotExist:
             return Response({"detail": "Link not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        user = request.user
+        scope = get_access_scope(request)
 
         # 2) проверяем, что пользователь — staff этого поставщика
-        staff_links = SupplierStaff.objects.filter(user=user, supplier=link.supplier)
-        if not staff_links.exists() and not user.is_superuser:
+        if not scope.is_staff_of(link.supplier_id) and not scope.is_superuser:
             return Response(
                 {"detail": "Вы не связаны с этим поставщиком и не можете менять статус линка."},
                 status=status.HTTP_403_FORBIDDEN
@@ -254,19 +247,17 @@ class CancelLinkRequestView(APIView):
 
     def post(self, request, pk):
         try:
-            link = ConsumerSupplierLink.objects.select_related('consumer').get(pk=pk)
+            link = ConsumerSupplierLink.objects.get(pk=pk)
         except ConsumerSupplierLink.DoesNotExist:
             return Response({"detail": "Link not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        user = request.user
-        
+        scope = get_access_scope(request)
+
         # Проверяем, что это consumer и это его линк
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
+        if not scope.is_consumer:
             return Response({"detail": "Only consumers can cancel requests."}, status=status.HTTP_403_FORBIDDEN)
 
-        if link.consumer != consumer_profile:
+        if link.consumer_id != scope.consumer_id:
             return Response({"detail": "This is not your request."}, status=status.HTTP_403_FORBIDDEN)
 
         if link.status != 'pending':
@@ -375,10 +366,10 @@ class ConsumerProfileUpdateView(generics.UpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        try:
-            return ConsumerProfile.objects.get(user=self.request.user)
-        except ConsumerProfile.DoesNotExist:
+        consumer_profile = get_access_scope(self.request).consumer_profile
+        if consumer_profile is None:
             raise ValidationError("Consumer profile not found for current user.")
+        return consumer_profile
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
@@ -476,7 +467,7 @@ class SupplierStaffListCreateView(generics.ListCreateAPIView):
         if user.is_superuser:
             return SupplierStaff.objects.select_related("user", "supplier").all()
 
-        supplier_id = resolve_requester_supplier_id(user)
+        supplier_id = resolve_requester_supplier_id(self.request)
         if not supplier_id:
             return SupplierStaff.objects.none()
 
@@ -490,7 +481,7 @@ class SupplierStaffListCreateView(generics.ListCreateAPIView):
             serializer.save()
             return
 
-        supplier_id = resolve_requester_supplier_id(user)
+        supplier_id = resolve_requester_supplier_id(self.request)
         if not supplier_id:
             raise PermissionDenied("You are not associated with any supplier.")
 
@@ -518,7 +509,7 @@ class SupplierStaffRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIVi
         if user.is_superuser:
             return SupplierStaff.objects.select_related("user", "supplier").all()
 
-        supplier_id = resolve_requester_supplier_id(user)
+        supplier_id = resolve_requester_supplier_id(self.request)
         if not supplier_id:
             return SupplierStaff.objects.none()
 
@@ -0,0 +1,93 @@
+"""
+In-process cache of the category tree.
+
+The whole tree is small and read on every catalog screen, so each worker
+process keeps it in memory, built with one query ordered by depth. A version
+stamp in the shared Django cache (Redis in production) is checked on every
+read; any category save / delete (see catalog.signals) replaces the stamp, so
+all processes rebuild on their next read. Reads of an unchanged tree don't
+touch the database.
+"""
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Category
+
+
+VERSION_KEY = 'catalog:category-tree:version'
+
+_lock = threading.Lock()
+_state = {'version': None, 'roots': [], 'nodes': {}}
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _build():
+    nodes, roots = {}, []
+    rows = Category.objects.order_by('depth', 'name', 'id').values(
+        'id', 'name', 'description', 'parent_id', 'path', 'depth',
+    )
+    for row in rows:
+        node = {
+            'id': row['id'],
+            'name': row['name'],
+            'description': row['description'],
+            'parent': row['parent_id'],
+            'depth': row['depth'],
+            'path': row['path'],
+            'children': [],
+        }
+        nodes[row['id']] = node
+        parent = nodes.get(row['parent_id'])
+        (parent['children'] if parent is not None else roots).append(node)
+    return roots, nodes
+
+
+def _load():
+    version = _current_version()
+    with _lock:
+        if _state['version'] == version:
+            return _state['roots'], _state['nodes']
+    roots, nodes = _build()
+    with _lock:
+        _state.update(version=version, roots=roots, nodes=nodes)
+    return roots, nodes
+
+
+def get_tree():
+    """
+    Root categories with nested 'children', sorted by name.
+    Shared between requests: treat as read-only.
+    """
+    return _load()[0]
+
+
+def get_path(category_id):
+    """Materialized path of a category, or None if it doesn't exist."""
+    node = _load()[1].get(category_id)
+    if node is not None:
+        return node['path']
+    # категории нет в дереве этого процесса (например, её создали до того, как сменилась версия):
+    # путь из базы, чтобы результат не зависел от состояния кэша
+    return Category.objects.filter(pk=category_id).values_list('path', flat=True).first()
+
+
+def _bump():
+    with _lock:
+        _state['version'] = None
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def invalidate():
+    """Drop the tree in every process: now and once more after commit."""
+    _bump()
+    transaction.on_commit(_bump)
@@ -0,0 +1,120 @@
+"""
+Filters and facet counts for a supplier's product list.
+
+    ?category=<id>&unit=kg,l&price_min=100&price_max=500&is_available=true&in_stock=true
+
+category matches the category and all its subcategories. in_stock means
+something is available to promise: stock_quantity > reserved_quantity.
+
+Facets (?facets=true) describe the products matching the current filters:
+counts per category, per unit and per price bucket. They come from one
+GROUP BY (category, unit, price bucket) query that is folded into the three
+lists in Python; the number of groups is small (categories x units x buckets)
+whatever the number of products. The filter columns are covered by the
+products(supplier_id, category_id, is_available, unit_price) index.
+"""
+from decimal import Decimal
+
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from rest_framework.exceptions import ValidationError
+
+from scp_project import params as query
+
+from . import category_tree
+from .models import Product
+
+
+# границы ценовых диапазонов (₸): [0, 500), [500, 1000), ..., [25000, ∞)
+PRICE_BUCKETS = [Decimal(edge) for edge in (0, 500, 1000, 2500, 5000, 10000, 25000)]
+
+
+def filter_products(queryset, params):
+    """Apply the product list filters from query params."""
+    category_ids = query.ids(params, 'category')
+    if category_ids:
+        # категория вместе со всеми подкатегориями: префикс материализованного пути
+        condition = Q()
+        for category_id in category_ids:
+            path = category_tree.get_path(category_id)
+            # несуществующая категория ничего не добавляет
+            condition |= Q(category__path__startswith=path) if path else Q(pk__in=[])
+        queryset = queryset.filter(condition)
+
+    units = params.get('unit')
+    if units:
+        units = units.split(',')
+        known = {code for code, _ in Product.UNIT_CHOICES}
+        unknown = [unit for unit in units if unit not in known]
+        if unknown:
+            raise ValidationError({'unit': f"Неизвестные единицы: {', '.join(unknown)}."})
+        queryset = queryset.filter(unit__in=units)
+
+    price_min = query.decimal(params, 'price_min')
+    if price_min is not None:
+        queryset = queryset.filter(unit_price__gte=price_min)
+    price_max = query.decimal(params, 'price_max')
+    if price_max is not None:
+        queryset = queryset.filter(unit_price__lte=price_max)
+
+    is_available = query.boolean(params, 'is_available')
+    if is_available is not None:
+        queryset = queryset.filter(is_available=is_available)
+
+    in_stock = query.boolean(params, 'in_stock')
+    if in_stock is not None:
+        # есть что пообещать: остаток за вычетом резервов pending-заказов, как available_quantity
+        in_stock_q = Q(stock_quantity__gt=F('reserved_quantity'))
+        queryset = queryset.filter(in_stock_q if in_stock else ~in_stock_q)
+
+    return queryset
+
+
+def _price_bucket():
+    whens = [
+        When(unit_price__lt=upper, then=Value(index))
+        for index, upper in enumerate(PRICE_BUCKETS[1:])
+    ]
+    return Case(*whens, default=Value(len(PRICE_BUCKETS) - 1), output_field=IntegerField())
+
+
+def product_facets(queryset):
+    """
+    {'categories': [...], 'units': [...], 'price_buckets': [...]} for the
+    products in `queryset`, from a single grouped query.
+    """
+    groups = (
+        queryset
+        .order_by()
+        .annotate(price_bucket=_price_bucket())
+        .values('category_id', 'category__name', 'unit', 'price_bucket')
+        .annotate(count=Count('id'))
+    )
+
+    categories, units, buckets = {}, {}, [0] * len(PRICE_BUCKETS)
+    for row in groups:
+        category = categories.setdefault(
+            row['category_id'],
+            {'id': row['category_id'], 'name': row['category__name'], 'count': 0},
+        )
+        category['count'] += row['count']
+        units[row['unit']] = units.get(row['unit'], 0) + row['count']
+        buckets[row['price_bucket']] += row['count']
+
+    unit_labels = dict(Product.UNIT_CHOICES)
+    return {
+        'categories': sorted(categories.values(), key=lambda item: (-item['count'], item['name'] or '')),
+        'units': [
+            {'unit': unit, 'label': unit_labels.get(unit, unit), 'count': units[unit]}
+            for unit in unit_labels
+            if unit in units
+        ],
+        'price_buckets': [
+            {
+                'min': str(lower),
+                'max': str(PRICE_BUCKETS[index + 1]) if index + 1 < len(PRICE_BUCKETS) else None,
+                'count': buckets[index],
+            }
+            for index, lower in enumerate(PRICE_BUCKETS)
+            if buckets[index]
+        ],
+    }
@@ -0,0 +1,413 @@
+"""
+Bulk stock sync for supplier inventory systems.
+
+A batch of records, each naming a product by `product_id` or `sku` and giving
+either an absolute `stock_quantity` or a signed `delta`:
+
+    [{"sku": "MILK-1", "stock_quantity": "120"}, {"product_id": 7, "delta": "-3"}]
+
+Products are resolved with one query, restricted to the supplier. Records
+for the same product are folded in order: an absolute value resets the
+running result and later deltas add to it. Each product then gets one
+(product_id, stock_quantity or NULL, delta) row.
+
+On PostgreSQL the rows are applied by one UPDATE ... FROM (VALUES ...) per
+chunk. The UPDATE skips rows whose result would fall outside [0, MAX_STOCK];
+RETURNING tells which rows were applied, so deltas are relative to the stock
+at the moment of the update, not to a value read earlier. Other databases
+lock the rows, compute the result in Python and issue one UPDATE with
+CASE WHEN.
+
+Stock held for pending orders is kept on the product, in reserved_quantity
+(the holds themselves are orders.StockHold, see orders/reservations.py).
+Available-to-promise is stock_quantity - reserved_quantity:
+
+  * reserve_stock() adds an order's lines to reserved_quantity if they are
+    available;
+  * decrement_stock() takes the lines of a confirmed order off the stock and
+    drops the order's own holds from reserved_quantity, if the stock not held
+    by other orders covers them;
+  * release_reserved() drops holds that expired or whose order was cancelled;
+  * allocate_stock() tells which of several orders (a bulk confirmation)
+    the stock covers, before decrement_stock() takes them off together.
+
+reserve_stock() and decrement_stock() are all or nothing. On PostgreSQL one
+statement locks the products in id order (so overlapping orders queue up
+instead of deadlocking), reports the lines that aren't covered and updates
+the rest only if there are none. The guarded UPDATE never promises more
+than stock minus other holds.
+
+None of these writes touch Product.updated_at: stock is not catalog data
+(it is left out of catalog snapshots and of incremental sync, see
+catalog/sync.py), so orders and inventory syncs don't make clients
+re-download products.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Product
+
+
+MAX_RECORDS = 10000
+MAX_STOCK = Decimal('99999999.99')  # DecimalField(max_digits=10, decimal_places=2)
+CHUNK_SIZE = 5000  # 3 параметра на строку: 15k из 65535 допустимых в PostgreSQL
+CENT = Decimal('0.01')
+
+
+def _amount(value, signed):
+    if isinstance(value, bool) or value is None:
+        raise ValueError
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError
+    if not number.is_finite() or abs(number) > MAX_STOCK or (number < 0 and not signed):
+        raise ValueError
+    return number.quantize(CENT)
+
+
+def _parse(record):
+    """-> (('id', product_id) or ('sku', sku), stock_quantity or None, delta) or an error message"""
+    if not isinstance(record, dict):
+        return "expected an object"
+
+    has_id, has_sku = record.get('product_id') is not None, record.get('sku') not in (None, '')
+    if has_id == has_sku:
+        return "give exactly one of product_id or sku"
+    if has_id:
+        product_id = record['product_id']
+        if isinstance(product_id, bool) or not isinstance(product_id, (int, str)):
+            return "product_id: expected an integer"
+        try:
+            key = ('id', int(product_id))
+        except ValueError:
+            return "product_id: expected an integer"
+    else:
+        key = ('sku', str(record['sku']))
+
+    has_stock, has_delta = 'stock_quantity' in record, 'delta' in record
+    if has_stock == has_delta:
+        return "give exactly one of stock_quantity or delta"
+    try:
+        if has_stock:
+            return key, _amount(record['stock_quantity'], signed=False), Decimal(0)
+        return key, None, _amount(record['delta'], signed=True)
+    except ValueError:
+        if has_stock:
+            return f"stock_quantity: expected a number from 0 to {MAX_STOCK}"
+        return f"delta: expected a number within ±{MAX_STOCK}"
+
+
+def _fold(changes):
+    """Combine (stock_quantity or None, delta) changes of one product, in order."""
+    absolute, delta = None, Decimal(0)
+    for stock_quantity, change in changes:
+        if stock_quantity is not None:
+            absolute, delta = stock_quantity, Decimal(0)
+        delta += change
+    return absolute, delta
+
+
+UPDATE_SQL = """
+UPDATE products AS p
+SET stock_quantity = coalesce(v.stock_quantity, p.stock_quantity) + v.delta
+FROM (VALUES {rows}) AS v (id, stock_quantity, delta)
+WHERE p.id = v.id
+  AND p.supplier_id = %s
+  AND coalesce(v.stock_quantity, p.stock_quantity) + v.delta BETWEEN 0 AND %s
+RETURNING p.id, p.stock_quantity
+"""
+
+
+def _update_postgres(supplier_id, rows):
+    applied = {}
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), CHUNK_SIZE):
+            chunk = rows[start:start + CHUNK_SIZE]
+            values = ', '.join(['(%s::bigint, %s::numeric, %s::numeric)'] * len(chunk))
+            params = []
+            for row in chunk:
+                params.extend(row)
+            params.extend([supplier_id, MAX_STOCK])
+            cursor.execute(UPDATE_SQL.format(rows=values), params)
+            applied.update(cursor.fetchall())
+    return applied
+
+
+def _update_portable(supplier_id, rows):
+    current = dict(
+        Product.objects.select_for_update()
+        .filter(supplier_id=supplier_id, pk__in=[row[0] for row in rows])
+        .values_list('id', 'stock_quantity')
+    )
+    applied = {}
+    for product_id, stock_quantity, delta in rows:
+        result = (current[product_id] if stock_quantity is None else stock_quantity) + delta
+        if 0 <= result <= MAX_STOCK:
+            applied[product_id] = result
+    if applied:
+        Product.objects.filter(pk__in=applied).update(
+            stock_quantity=Case(
+                *[When(pk=product_id, then=Value(stock)) for product_id, stock in applied.items()],
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+        )
+    return applied
+
+
+def sync_stock(supplier_id, records):
+    """
+    Apply a batch of stock records to the supplier's products.
+    -> {'updated': n, 'errors': n, 'results': [{'index', 'product_id', 'stock_quantity'} or {'index', 'error'}]}
+    """
+    results = [None] * len(records)
+    parsed = {}
+    for index, record in enumerate(records):
+        outcome = _parse(record)
+        if isinstance(outcome, str):
+            results[index] = {'index': index, 'error': outcome}
+        else:
+            parsed[index] = outcome
+
+    ids = {key[1] for key, _, _ in parsed.values() if key[0] == 'id'}
+    skus = {key[1] for key, _, _ in parsed.values() if key[0] == 'sku'}
+    products = Product.objects.filter(supplier_id=supplier_id).filter(Q(pk__in=ids) | Q(sku__in=skus))
+    by_key = {}
+    for product_id, sku in products.values_list('id', 'sku'):
+        by_key[('id', product_id)] = product_id
+        if sku:
+            by_key[('sku', sku)] = product_id
+
+    changes, indexes = {}, {}
+    for index, (key, stock_quantity, delta) in parsed.items():
+        product_id = by_key.get(key)
+        if product_id is None:
+            results[index] = {'index': index, 'error': "product not found"}
+            continue
+        changes.setdefault(product_id, []).append((stock_quantity, delta))
+        indexes.setdefault(product_id, []).append(index)
+
+    rows = [(product_id, *_fold(product_changes)) for product_id, product_changes in changes.items()]
+    applied = {}
+    if rows:
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                applied = _update_postgres(supplier_id, rows)
+            else:
+                applied = _update_portable(supplier_id, rows)
+
+    for product_id, product_indexes in indexes.items():
+        for index in product_indexes:
+            if product_id in applied:
+                results[index] = {
+                    'index': index,
+                    'product_id': product_id,
+                    'stock_quantity': str(applied[product_id]),
+                }
+            else:
+                results[index] = {'index': index, 'product_id': product_id, 'error': "stock would fall out of range"}
+
+    return {
+        'updated': len(applied),
+        'errors': sum('error' in result for result in results),
+        'results': results,
+    }
+
+
+class InsufficientStock(Exception):
+    """
+    Raised by reserve_stock / decrement_stock; `shortfalls` lists the lines
+    that aren't covered: {'product_id', 'name', 'available', 'required'}.
+    """
+
+    def __init__(self, shortfalls):
+        super().__init__(shortfalls)
+        self.shortfalls = shortfalls
+
+
+GUARDED_SQL = """
+WITH v (id, quantity, held) AS (VALUES {rows}),
+locked AS (
+    SELECT p.id, p.name, p.stock_quantity - p.reserved_quantity + v.held AS available, v.quantity, v.held
+    FROM products AS p JOIN v ON v.id = p.id
+    ORDER BY p.id
+    FOR UPDATE OF p
+),
+short AS (
+    SELECT id, name, available, quantity FROM locked WHERE available < quantity
+),
+applied AS (
+    UPDATE products AS p
+    SET {assignments}
+    FROM locked AS l
+    WHERE p.id = l.id
+      AND p.stock_quantity - p.reserved_quantity + l.held >= l.quantity
+      AND NOT EXISTS (SELECT 1 FROM short)
+    RETURNING p.id
+)
+SELECT id, name, available, quantity FROM short ORDER BY id
+"""
+
+# held: резерв этого же заказа, он не мешает списанию
+DECREMENT_ASSIGNMENTS = (
+    "stock_quantity = p.stock_quantity - l.quantity, reserved_quantity = p.reserved_quantity - l.held"
+)
+RESERVE_ASSIGNMENTS = "reserved_quantity = p.reserved_quantity + l.quantity"
+
+
+def _guarded_postgres(assignments, rows):
+    values = ', '.join(['(%s::bigint, %s::numeric, %s::numeric)'] * len(rows))
+    params = []
+    for row in rows:
+        params.extend(row)
+    with connection.cursor() as cursor:
+        cursor.execute(GUARDED_SQL.format(rows=values, assignments=assignments), params)
+        return cursor.fetchall()
+
+
+def _quantity_field():
+    return DecimalField(max_digits=10, decimal_places=2)
+
+
+def _per_product(values):
+    return Case(
+        *[When(pk=product_id, then=Value(value)) for product_id, value in values.items()],
+        output_field=_quantity_field(),
+    )
+
+
+def _guarded_portable(rows, decrement):
+    rows = {product_id: (quantity, held) for product_id, quantity, held in rows}
+    current = (
+        Product.objects.select_for_update()
+        .filter(pk__in=rows)
+        .order_by('id')
+        .values_list('id', 'name', 'stock_quantity', 'reserved_quantity')
+    )
+    short = []
+    for product_id, name, stock, reserved in current:
+        quantity, held = rows[product_id]
+        if stock - reserved + held < quantity:
+            short.append((product_id, name, stock - reserved + held, quantity))
+    if short:
+        return short
+
+    quantities = {product_id: quantity for product_id, (quantity, _) in rows.items()}
+    if decrement:
+        Product.objects.filter(pk__in=rows).update(
+            stock_quantity=F('stock_quantity') - _per_product(quantities),
+            reserved_quantity=F('reserved_quantity') - _per_product(
+                {product_id: held for product_id, (_, held) in rows.items()}
+            ),
+        )
+    else:
+        Product.objects.filter(pk__in=rows).update(
+            reserved_quantity=F('reserved_quantity') + _per_product(quantities),
+        )
+    return short
+
+
+def _shortfall(product_id, name, available, quantity):
+    return {
+        'product_id': product_id,
+        'name': name,
+        'available': str(available),
+        'required': str(quantity),
+    }
+
+
+def _sum_lines(lines):
+    quantities = {}
+    for product_id, quantity in lines:
+        quantities[product_id] = quantities.get(product_id, Decimal(0)) + quantity
+    return quantities
+
+
+def _apply_guarded(lines, held, decrement):
+    quantities = _sum_lines(lines)
+    if not quantities:
+        return
+    held = held or {}
+    rows = [(product_id, quantity, held.get(product_id, Decimal(0))) for product_id, quantity in quantities.items()]
+
+    # ошибка откатывает всю транзакцию вызывающего (заказ), точка сохранения не нужна
+    with transaction.atomic(savepoint=False):
+        if connection.vendor == 'postgresql':
+            assignments = DECREMENT_ASSIGNMENTS if decrement else RESERVE_ASSIGNMENTS
+            short = _guarded_postgres(assignments, rows)
+        else:
+            short = _guarded_portable(rows, decrement)
+        if short:
+            raise InsufficientStock([_shortfall(*row) for row in short])
+
+
+def reserve_stock(lines):
+    """
+    Hold (product_id, quantity) lines for a pending order, all or nothing.
+    Raises InsufficientStock if available-to-promise doesn't cover a product.
+    """
+    _apply_guarded(lines, None, decrement=False)
+
+
+def decrement_stock(lines, held=None):
+    """
+    Take (product_id, quantity) lines off the stock in one transaction,
+    all or nothing. held: {product_id: quantity} the order itself holds,
+    dropped from reserved_quantity at the same time. Raises InsufficientStock
+    if stock not held by other orders doesn't cover a product.
+    """
+    _apply_guarded(lines, held, decrement=True)
+
+
+def allocate_stock(demands):
+    """
+    Decide which of several orders the stock covers, first come first served.
+    demands: [(key, lines, held)] in priority order, lines and held as for
+    decrement_stock. Locks the products (in the same order as
+    decrement_stock) but changes nothing: take the covered demands off with
+    decrement_stock in the same transaction.
+    -> ([covered keys], {key: shortfalls of an uncovered demand})
+    """
+    demands = [(key, _sum_lines(lines), held or {}) for key, lines, held in demands]
+    product_ids = {product_id for _, quantities, _ in demands for product_id in quantities}
+    current = {
+        product_id: [name, stock, reserved]
+        for product_id, name, stock, reserved in (
+            Product.objects.select_for_update().filter(pk__in=product_ids).order_by('id')
+            .values_list('id', 'name', 'stock_quantity', 'reserved_quantity')
+        )
+    }
+
+    covered, short = [], {}
+    for key, quantities, held in demands:
+        missing = []
+        for product_id, quantity in quantities.items():
+            name, stock, reserved = current[product_id]
+            available = stock - reserved + held.get(product_id, Decimal(0))
+            if available < quantity:
+                missing.append(_shortfall(product_id, name, available, quantity))
+        if missing:
+            short[key] = missing
+            continue
+        for product_id, quantity in quantities.items():
+            current[product_id][1] -= quantity
+            current[product_id][2] -= held.get(product_id, Decimal(0))
+        covered.append(key)
+    return covered, short
+
+
+def release_reserved(quantities):
+    """Drop {product_id: quantity} of released holds from reserved_quantity."""
+    if not quantities:
+        return
+    with transaction.atomic(savepoint=False):
+        # тот же порядок блокировок, что и у reserve/decrement: без взаимных блокировок
+        list(Product.objects.select_for_update().filter(pk__in=quantities).order_by('id').values_list('id', flat=True))
+        Product.objects.filter(pk__in=quantities).update(
+            reserved_quantity=Greatest(
+                F('reserved_quantity') - _per_product(quantities), Value(Decimal(0)), output_field=_quantity_field()
+            ),
+        )
@@ -0,0 +1,115 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from accounts.models import SupplierProfile
+from catalog.models import Category, Product
+from catalog.search import search_products
+
+
+WORDS = [
+    'milk', 'cheese', 'butter', 'yogurt', 'kefir', 'cream', 'beef', 'chicken', 'lamb', 'salmon',
+    'tomato', 'potato', 'onion', 'carrot', 'apple', 'banana', 'lemon', 'rice', 'flour', 'sugar',
+    'молоко', 'сыр', 'масло', 'сметана', 'говядина', 'курица', 'картофель', 'лук', 'мука', 'сахар',
+    'fresh', 'organic', 'premium', 'frozen', 'smoked', 'local', 'farm', 'whole', 'sliced', 'extra',
+]
+
+QUERIES = ['milk', 'organic chees', 'говядина', 'tomatoe', 'fresh farm butter', 'SKU-0042', 'смет']
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure product search latency on a synthetic dataset "
+        "(PostgreSQL; default 1M products, removed afterwards unless --keep)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--suppliers', type=int, default=200)
+        parser.add_argument('--linked', type=int, default=20, help="Suppliers a consumer searches across.")
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--keep', action='store_true', help="Keep the generated data.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write(self.style.WARNING(
+                "Not PostgreSQL: this measures the icontains fallback, not the tsvector/pg_trgm search."
+            ))
+
+        rng = random.Random(42)
+        suppliers = self.generate(rng, options)
+        try:
+            linked = [supplier.id for supplier in suppliers[:options['linked']]]
+            queryset = Product.objects.filter(supplier_id__in=linked).defer('search_vector')
+
+            self.stdout.write(f"{'query':<22}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'rows':>8}")
+            worst_p95 = 0.0
+            for text in QUERIES:
+                timings, rows = [], 0
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    rows = len(list(search_products(queryset, text).order_by('-score', 'id')[:options['page_size']]))
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+                worst_p95 = max(worst_p95, p95)
+                self.stdout.write(
+                    f"{text:<22}{statistics.median(timings):>10.1f}{p95:>10.1f}{timings[-1]:>10.1f}{rows:>8}"
+                )
+
+            style = self.style.SUCCESS if worst_p95 < 50 else self.style.WARNING
+            self.stdout.write(style(f"Worst p95: {worst_p95:.1f} ms (target < 50 ms)"))
+        finally:
+            if not options['keep']:
+                self.stdout.write("Removing generated data...")
+                SupplierProfile.objects.filter(pk__in=[supplier.id for supplier in suppliers]).delete()
+                Category.objects.filter(pk__in=[category.id for category in self.parents]).delete()
+
+    def generate(self, rng, options):
+        tag = f"bench-{int(time.time())}"
+        suppliers = SupplierProfile.objects.bulk_create([
+            SupplierProfile(
+                company_name=f"{tag} supplier {i}",
+                city="Almaty",
+                address="Benchmark",
+                registration_number=f"{tag}-{i}",
+            )
+            for i in range(options['suppliers'])
+        ])
+        self.parents = [Category.objects.create(name=f"{tag} {word}") for word in WORDS[:10]]
+        categories = [
+            Category.objects.create(name=f"{word} {parent.name.split()[-1]}", parent=parent)
+            for parent in self.parents
+            for word in WORDS[10:15]
+        ]
+
+        total, batch_size = options['products'], options['batch_size']
+        self.stdout.write(f"Generating {total} products...")
+        started = time.perf_counter()
+        for offset in range(0, total, batch_size):
+            batch = []
+            for i in range(offset, min(offset + batch_size, total)):
+                name = ' '.join(rng.sample(WORDS, 3))
+                batch.append(Product(
+                    supplier=suppliers[i % len(suppliers)],
+                    category=rng.choice(categories),
+                    name=name,
+                    description=' '.join(rng.sample(WORDS, 8)),
+                    sku=f"SKU-{i:07d}",
+                    unit='kg',
+                    unit_price=Decimal(rng.randint(100, 100000)) / 100,
+                    stock_quantity=Decimal(rng.randint(0, 500)),
+                ))
+            with transaction.atomic():
+                Product.objects.bulk_create(batch, batch_size=batch_size)
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE products")
+        self.stdout.write(f"Generated in {time.perf_counter() - started:.0f} s")
+        return suppliers
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import SupplierProfile
+from catalog.models import Product, ProductImage
+from scp_project import images
+
+
+TARGETS = (
+    (Product, 'image', 'image_variants'),
+    (ProductImage, 'image', 'image_variants'),
+    (SupplierProfile, 'logo', 'logo_variants'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Build resized variants (thumb / list / detail, WebP + JPEG, placeholder) for "
+        "product images and supplier logos that don't have up-to-date ones; --all rebuilds every image."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Rebuild variants of every image.")
+
+    def handle(self, *args, **options):
+        for model, field_name, variants_field in TARGETS:
+            rows = (
+                model._default_manager
+                .exclude(**{f'{field_name}__isnull': True})
+                .exclude(**{field_name: ''})
+                .values_list('pk', field_name, variants_field)
+            )
+            built = 0
+            for pk, source, variants in rows.iterator():
+                if options['all'] or (variants or {}).get('source') != source:
+                    images.rebuild(model, pk, field_name, variants_field, force=options['all'])
+                    built += 1
+            self.stdout.write(self.style.SUCCESS(f"{model.__name__}: built variants for {built} image(s)."))
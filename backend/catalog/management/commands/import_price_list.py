@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import SupplierProfile
+from catalog.price_import import PriceListError, import_price_list
+
+
+class Command(BaseCommand):
+    help = "Import a supplier price list (CSV or XLSX) into its products, upserting by SKU."
+
+    def add_arguments(self, parser):
+        parser.add_argument('supplier_id', type=int)
+        parser.add_argument('path', help="Path to a .csv or .xlsx file.")
+        parser.add_argument(
+            '--show-errors', type=int, default=20,
+            help="How many row errors to print (default 20).",
+        )
+
+    def handle(self, *args, **options):
+        supplier_id = options['supplier_id']
+        if not SupplierProfile.objects.filter(pk=supplier_id).exists():
+            raise CommandError(f"Supplier {supplier_id} does not exist.")
+
+        def progress(result):
+            self.stdout.write(f"  {result.rows} rows read, {result.error_count} error(s)")
+
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = import_price_list(supplier_id, fileobj, options['path'], progress=progress)
+        except OSError as exc:
+            raise CommandError(str(exc))
+        except PriceListError as exc:
+            raise CommandError(str(exc))
+
+        for error in result.as_dict()['errors'][:options['show_errors']]:
+            self.stdout.write(self.style.WARNING(f"  line {error['line']} ({error['sku']}): {error['error']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.rows} row(s): {result.created} created, "
+            f"{result.updated} updated, {result.error_count} error(s)."
+        ))
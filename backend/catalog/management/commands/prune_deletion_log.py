@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from catalog import sync
+from catalog.models import DeletionLog
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete sync tombstones older than CATALOG_SYNC_RETENTION_DAYS "
+        "(clients with older tokens get a full reset anyway)."
+    )
+
+    def handle(self, *args, **options):
+        deleted, _ = DeletionLog.objects.filter(deleted_at__lt=timezone.now() - sync.retention()).delete()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} tombstone(s)."))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from catalog import snapshots
+from catalog.models import Catalog
+
+
+class Command(BaseCommand):
+    help = "Build the JSON snapshots of catalogs (all active catalogs by default)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('catalog_ids', nargs='*', type=int, help="Only these catalogs.")
+        parser.add_argument('--stale', action='store_true', help="Skip catalogs whose snapshot is fresh.")
+
+    def handle(self, *args, **options):
+        catalogs = Catalog.objects.all()
+        if options['catalog_ids']:
+            catalogs = catalogs.filter(pk__in=options['catalog_ids'])
+        else:
+            catalogs = catalogs.filter(is_active=True)
+
+        if options['stale']:
+            catalogs = catalogs.filter(
+                Q(snapshot__isnull=True) | Q(snapshot__built_generation__lt=F('snapshot__generation'))
+            )
+
+        built = 0
+        for catalog_id in catalogs.order_by('id').values_list('id', flat=True).iterator():
+            snapshot = snapshots.rebuild(catalog_id)
+            if snapshot is None:
+                continue
+            built += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f"catalog {catalog_id}: {snapshot.size} bytes, etag {snapshot.etag}")
+
+        self.stdout.write(self.style.SUCCESS(f"Built {built} catalog snapshot(s)."))
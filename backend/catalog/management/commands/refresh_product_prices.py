@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from catalog import pricing
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute effective prices whose discount boundary has passed "
+        "(run every minute from cron); --all recomputes every product."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Recompute all products.")
+
+    def handle(self, *args, **options):
+        if options['all']:
+            processed = pricing.refresh_prices()
+        else:
+            processed = pricing.refresh_due_prices()
+        self.stdout.write(self.style.SUCCESS(f"Repriced {processed} product(s)."))
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:12
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# PostgreSQL only: products.search_vector is kept up to date by triggers,
+# GIN indexes back the tsvector match and the pg_trgm fuzzy match on name.
+POSTGRES_FORWARD = [
+    """
+    CREATE OR REPLACE FUNCTION products_search_vector() RETURNS trigger AS $$
+    DECLARE
+        category_names text;
+    BEGIN
+        SELECT concat_ws(' ', c.name, pc.name) INTO category_names
+        FROM categories c
+        LEFT JOIN categories pc ON pc.id = c.parent_id
+        WHERE c.id = NEW.category_id;
+
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.sku, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(category_names, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER products_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, sku, description, category_id ON products
+    FOR EACH ROW EXECUTE FUNCTION products_search_vector()
+    """,
+    # renaming / moving a category re-indexes its products and those of its subcategories
+    """
+    CREATE OR REPLACE FUNCTION categories_refresh_product_search() RETURNS trigger AS $$
+    BEGIN
+        UPDATE products SET category_id = category_id
+        WHERE category_id = NEW.id
+           OR category_id IN (SELECT id FROM categories WHERE parent_id = NEW.id);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER categories_refresh_product_search
+    AFTER UPDATE OF name, parent_id ON categories
+    FOR EACH ROW
+    WHEN (OLD.name IS DISTINCT FROM NEW.name OR OLD.parent_id IS DISTINCT FROM NEW.parent_id)
+    EXECUTE FUNCTION categories_refresh_product_search()
+    """,
+    "UPDATE products SET name = name",
+    "CREATE INDEX products_search_vector_gin ON products USING gin (search_vector)",
+    "CREATE INDEX products_name_trgm_gin ON products USING gin (name gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS products_name_trgm_gin",
+    "DROP INDEX IF EXISTS products_search_vector_gin",
+    "DROP TRIGGER IF EXISTS categories_refresh_product_search ON categories",
+    "DROP FUNCTION IF EXISTS categories_refresh_product_search()",
+    "DROP TRIGGER IF EXISTS products_search_vector_update ON products",
+    "DROP FUNCTION IF EXISTS products_search_vector()",
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_catalog_snapshots'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(run_on_postgres(POSTGRES_FORWARD), run_on_postgres(POSTGRES_BACKWARD)),
+    ]
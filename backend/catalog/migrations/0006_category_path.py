@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:15
+
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    Category = apps.get_model('catalog', 'Category')
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+
+    paths = {}
+
+    def path_of(category_id):
+        if category_id not in paths:
+            chain, current = [], category_id
+            while current is not None and current not in chain:
+                chain.append(current)
+                current = parents.get(current)
+            paths[category_id] = ''.join(f"{node}/" for node in reversed(chain))
+        return paths[category_id]
+
+    for category_id in parents:
+        path = path_of(category_id)
+        Category.objects.filter(pk=category_id).update(path=path, depth=path.count('/') - 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_product_facet_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='categories_path_like_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_prices(apps, schema_editor):
+    from catalog.pricing import compute_prices
+
+    Product = apps.get_model('catalog', 'Product')
+    ProductDiscount = apps.get_model('catalog', 'ProductDiscount')
+    ProductPrice = apps.get_model('catalog', 'ProductPrice')
+
+    at = timezone.now()
+    base_prices = dict(Product.objects.values_list('id', 'unit_price'))
+    windows = ProductDiscount.objects.filter(is_active=True, end_date__gt=at).values_list(
+        'id', 'product_id', 'discount_type', 'value', 'start_date', 'end_date',
+    )
+    ProductPrice.objects.bulk_create(
+        [
+            ProductPrice(
+                product_id=product_id,
+                base_price=base_prices[product_id],
+                effective_price=price,
+                discount_id=discount_id,
+                valid_until=valid_until,
+                computed_at=at,
+            )
+            for product_id, (price, discount_id, valid_until) in compute_prices(base_prices, windows, at).items()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_category_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPrice',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='price', serialize=False, to='catalog.product')),
+                ('base_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('effective_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('valid_until', models.DateTimeField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField()),
+                ('discount', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalog.productdiscount')),
+            ],
+            options={
+                'db_table': 'product_prices',
+                'indexes': [models.Index(fields=['valid_until'], name='product_pri_valid_u_684ea4_idx')],
+            },
+        ),
+        migrations.RunPython(fill_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:19
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def mark_duplicate_skus(apps, schema_editor):
+    """
+    Existing duplicates would block the constraint: every copy but the oldest
+    gets its id appended to the SKU, so nothing is lost and they stay easy to find.
+    """
+    Product = apps.get_model('catalog', 'Product')
+    duplicates = (
+        Product.objects.filter(sku__gt='')
+        .values('supplier_id', 'sku')
+        .annotate(copies=Count('id'))
+        .filter(copies__gt=1)
+    )
+    for row in duplicates:
+        extra = Product.objects.filter(supplier_id=row['supplier_id'], sku=row['sku']).order_by('id')[1:]
+        for product in extra:
+            Product.objects.filter(pk=product.pk).update(sku=f"{row['sku']}-dup-{product.pk}"[:100])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_keyset_pagination_indexes'),
+        ('catalog', '0007_product_prices'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_duplicate_skus, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(condition=models.Q(('sku__gt', '')), fields=('supplier', 'sku'), name='products_supplier_sku_uniq'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_supplier_logo_variants'),
+        ('catalog', '0009_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletionLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('product', 'Product'), ('catalog', 'Catalog'), ('catalog_product', 'Catalog product'), ('discount', 'Product discount'), ('category', 'Category')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'catalog_deletion_log',
+            },
+        ),
+        migrations.AddField(
+            model_name='catalogproduct',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='productdiscount',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='catalog',
+            index=models.Index(fields=['supplier', 'updated_at'], name='catalogs_supplie_12026f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogproduct',
+            index=models.Index(fields=['updated_at'], name='catalog_pro_updated_2799bf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['updated_at'], name='categories_updated_7b87f8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['supplier', 'updated_at'], name='products_supplie_4154df_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productdiscount',
+            index=models.Index(fields=['updated_at'], name='product_dis_updated_61176a_idx'),
+        ),
+        migrations.AddField(
+            model_name='deletionlog',
+            name='supplier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.supplierprofile'),
+        ),
+        migrations.AddIndex(
+            model_name='deletionlog',
+            index=models.Index(fields=['supplier', 'deleted_at'], name='catalog_del_supplie_002e01_idx'),
+        ),
+    ]
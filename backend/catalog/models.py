@@ -1,22 +1,78 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
 from accounts.models import SupplierProfile
 
 class Category(models.Model):
     """
     Product categories (e.g., Vegetables, Meat, Dairy, etc.)
+
+    The tree is also stored as a materialized path of ids, e.g. "1/5/12/",
+    maintained in save() (create, rename, move). All descendants of a category
+    are one indexed prefix query: path LIKE '1/5/%'.
     """
+    PATH_SEPARATOR = '/'
+
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='subcategories')
+    path = models.CharField(max_length=255, blank=True, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'categories'
         verbose_name_plural = 'Categories'
+        indexes = [
+            # инкрементальная синхронизация (catalog/sync.py)
+            models.Index(fields=['updated_at']),
+            # LIKE 'prefix%' по пути; varchar_pattern_ops нужен на PostgreSQL при не-C collation
+            models.Index(fields=['path'], name='categories_path_like_idx', opclasses=['varchar_pattern_ops']),
+        ]
         
     def __str__(self):
         return self.name
 
+    def is_descendant_of(self, other):
+        return bool(other.path) and self.path.startswith(other.path)
+
+    def descendants(self, include_self=True):
+        qs = Category.objects.filter(path__startswith=self.path)
+        return qs if include_self else qs.exclude(pk=self.pk)
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            parent_path = ''
+            if self.parent_id is not None:
+                parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).get()
+
+            old_path = ''
+            if self.pk is not None:
+                old_path = Category.objects.filter(pk=self.pk).values_list('path', flat=True).first() or ''
+                if old_path and parent_path.startswith(old_path):
+                    raise ValueError("A category can't be moved under itself or its subcategory.")
+                # путь в памяти мог устареть (перенос предка), считаем заново
+                self.path = f"{parent_path}{self.pk}{self.PATH_SEPARATOR}"
+                self.depth = self.path.count(self.PATH_SEPARATOR) - 1
+
+            super().save(*args, **kwargs)
+
+            path = f"{parent_path}{self.pk}{self.PATH_SEPARATOR}"
+            depth = path.count(self.PATH_SEPARATOR) - 1
+            if path != old_path:
+                Category.objects.filter(pk=self.pk).update(path=path, depth=depth)
+            if old_path and path != old_path:
+                # перенос: пути и глубины всего поддерева одним UPDATE
+                old_depth = old_path.count(self.PATH_SEPARATOR) - 1
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (depth - old_depth),
+                )
+            self.path, self.depth = path, depth
+
 
 class Product(models.Model):
     """
@@ -44,17 +100,41 @@ class Product(models.Model):
     
     # Stock management
     stock_quantity = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # сумма активных резервов pending-заказов (orders/reservations.py); доступно = stock_quantity - reserved_quantity
+    reserved_quantity = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
     minimum_order_quantity = models.DecimalField(max_digits=10, decimal_places=2, default=1)
     is_available = models.BooleanField(default=True)
     
     # Images
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # уменьшенные копии картинки (scp_project/images.py)
+    image_variants = models.JSONField(blank=True, null=True, editable=False)
+
+    # Full-text search (name, sku, category names, description).
+    # Filled by a database trigger on PostgreSQL, see migration 0004 and catalog/search.py
+    search_vector = SearchVectorField(null=True, editable=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'products'
+        indexes = [
+            # keyset-пагинация товаров поставщика: (name, id)
+            models.Index(fields=['supplier', 'name', 'id']),
+            # фильтры и фасеты списка товаров поставщика (catalog/filters.py)
+            models.Index(fields=['supplier', 'category', 'is_available', 'unit_price']),
+            # инкрементальная синхронизация (catalog/sync.py)
+            models.Index(fields=['supplier', 'updated_at']),
+        ]
+        constraints = [
+            # ключ импорта прайс-листов (catalog/price_import.py); пустой SKU не уникален
+            models.UniqueConstraint(
+                fields=['supplier', 'sku'],
+                condition=models.Q(sku__gt=''),
+                name='products_supplier_sku_uniq',
+            ),
+        ]
         
     def __str__(self):
         return f"{self.name} - {self.supplier.company_name}"
@@ -66,6 +146,7 @@ class ProductImage(models.Model):
     """
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='additional_images')
     image = models.ImageField(upload_to='products/additional/')
+    image_variants = models.JSONField(blank=True, null=True, editable=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -95,14 +176,45 @@ class ProductDiscount(models.Model):
     description = models.CharField(max_length=255, blank=True, null=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'product_discounts'
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
         
     def __str__(self):
         return f"{self.product.name} - {self.value}{' %' if self.discount_type == 'percentage' else ' ₸'}"
 
 
+class ProductPrice(models.Model):
+    """
+    Precomputed effective price of a product: unit_price with the best
+    discount active at computed_at applied. valid_until is the next discount
+    boundary (an active discount ends or a scheduled one starts); the row
+    must be recomputed then. Maintained by catalog/pricing.py.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='price')
+    base_price = models.DecimalField(max_digits=10, decimal_places=2)
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2)
+    discount = models.ForeignKey(
+        ProductDiscount, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    valid_until = models.DateTimeField(null=True, blank=True)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'product_prices'
+        indexes = [
+            # поиск строк, у которых наступила граница скидки
+            models.Index(fields=['valid_until']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.effective_price}"
+
+
 class Catalog(models.Model):
     """
     A catalog is a collection of products that a supplier offers
@@ -118,6 +230,9 @@ class Catalog(models.Model):
     
     class Meta:
         db_table = 'catalogs'
+        indexes = [
+            models.Index(fields=['supplier', 'updated_at']),
+        ]
         
     def __str__(self):
         return f"{self.supplier.company_name} - {self.name}"
@@ -136,16 +251,79 @@ class CatalogProduct(models.Model):
     is_featured = models.BooleanField(default=False)
     
     added_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'catalog_products'
         unique_together = ['catalog', 'product']
         ordering = ['display_order', 'added_at']
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
         
     def __str__(self):
         return f"{self.catalog.name} - {self.product.name}"
 
 
+class CatalogSnapshot(models.Model):
+    """
+    Precompiled gzip JSON of a catalog with its products, served as is by
+    CatalogDetailView. generation is bumped whenever the catalog's content
+    changes; the snapshot is fresh while built_generation == generation.
+    See catalog/snapshots.py.
+    """
+    catalog = models.OneToOneField(Catalog, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    content = models.BinaryField(null=True, editable=False)
+    etag = models.CharField(max_length=64, blank=True)
+    size = models.PositiveIntegerField(default=0)
+
+    generation = models.PositiveBigIntegerField(default=1)
+    built_generation = models.PositiveBigIntegerField(default=0)
+    built_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'catalog_snapshots'
+
+    @property
+    def is_fresh(self):
+        return self.built_generation == self.generation
+
+    def __str__(self):
+        return f"Snapshot of catalog {self.catalog_id}"
+
+
+class DeletionLog(models.Model):
+    """
+    Tombstones for incremental catalog sync (catalog/sync.py): which object
+    of a supplier was deleted and when. supplier is NULL for categories,
+    which are shared by all suppliers. Written by catalog.signals; rows
+    older than CATALOG_SYNC_RETENTION_DAYS are pruned by `manage.py prune_deletion_log`.
+    """
+    OBJECT_TYPE_CHOICES = [
+        ('product', 'Product'),
+        ('catalog', 'Catalog'),
+        ('catalog_product', 'Catalog product'),
+        ('discount', 'Product discount'),
+        ('category', 'Category'),
+    ]
+
+    supplier = models.ForeignKey(
+        SupplierProfile, on_delete=models.CASCADE, null=True, blank=True, related_name='+'
+    )
+    object_type = models.CharField(max_length=20, choices=OBJECT_TYPE_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'catalog_deletion_log'
+        indexes = [
+            models.Index(fields=['supplier', 'deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.object_type} #{self.object_id} deleted at {self.deleted_at}"
+
+
 class DeliveryOption(models.Model):
     """
     Delivery/pickup options offered by suppliers
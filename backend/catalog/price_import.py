@@ -0,0 +1,495 @@
+"""
+Streaming price-list import (CSV / XLSX) keyed by (supplier, sku).
+
+Rows are read one at a time (csv module, openpyxl in read-only mode) and
+checked in Python without DRF serializers. Invalid rows are reported with
+their line number and skipped.
+
+On PostgreSQL the valid rows are streamed with COPY into a temporary staging
+table. Set-based checks run over the staging table: repeated SKUs, unknown
+categories, and new products without name or price.
+Then one INSERT ... SELECT ... ON CONFLICT (supplier_id, sku) DO UPDATE
+upserts everything and returns only the created / updated counts.
+
+Other databases (sqlite in tests) use batches of bulk_update / bulk_create
+with the same rules.
+
+Every product written by an import gets the same updated_at, the import's
+start time. A SKU may appear only once per file: the first row is imported,
+later rows with the same SKU are reported as errors and skipped - within a
+batch by the batch itself, across batches because the product already
+carries this import's updated_at. Bulk writes skip model signals, so
+effective prices and catalog snapshots are refreshed afterwards, reading
+the written products back by that stamp in chunks. Memory use doesn't
+depend on the size of the file on either path.
+
+Empty cells keep the product's current value, so a file with just sku and
+unit_price only updates prices.
+
+Columns (header row, case-insensitive): sku (required), name, description,
+unit, unit_price, stock_quantity, minimum_order_quantity, is_available,
+category_id.
+"""
+import csv
+import io
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import pricing, snapshots
+from .models import Category, Product
+
+try:
+    import openpyxl
+except ImportError:  # XLSX is optional, CSV works without it
+    openpyxl = None
+
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    'sku', 'name', 'description', 'unit', 'unit_price', 'stock_quantity',
+    'minimum_order_quantity', 'is_available', 'category_id',
+)
+HEADER_ALIASES = {
+    'price': 'unit_price',
+    'stock': 'stock_quantity',
+    'min_order': 'minimum_order_quantity',
+    'minimum_order': 'minimum_order_quantity',
+    'available': 'is_available',
+    'category': 'category_id',
+}
+UNITS = {code for code, _ in Product.UNIT_CHOICES}
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'да'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'нет'}
+MAX_AMOUNT = Decimal('99999999.99')  # DecimalField(max_digits=10, decimal_places=2)
+CENT = Decimal('0.01')
+
+MAX_REPORTED_ERRORS = 1000
+PROGRESS_EVERY = 5000
+BATCH_SIZE = 1000
+
+
+class PriceListError(Exception):
+    """The file can't be imported at all (format, header)."""
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, sku, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'sku': sku, 'error': message})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+        }
+
+
+# ---- reading ----
+
+def _header(values):
+    columns = []
+    for value in values:
+        key = str(value or '').strip().lower().replace(' ', '_')
+        key = HEADER_ALIASES.get(key, key)
+        columns.append(key if key in COLUMNS else None)
+    if 'sku' not in columns:
+        raise PriceListError("The header row must contain a 'sku' column.")
+    return columns
+
+
+def _read_csv(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    first = text.readline()
+    # Excel в русской локали сохраняет CSV через ';'
+    delimiter = ';' if first.count(';') > first.count(',') else ','
+    columns = _header(next(csv.reader([first], delimiter=delimiter), []))
+    for line, values in enumerate(csv.reader(text, delimiter=delimiter), start=2):
+        yield line, values, columns
+
+
+def _read_xlsx(fileobj):
+    if openpyxl is None:
+        raise PriceListError("XLSX import needs the openpyxl package; upload a CSV file instead.")
+    try:
+        workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as exc:
+        raise PriceListError(f"Can't read the XLSX file: {exc}")
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        columns = _header(next(rows, ()))
+        for line, values in enumerate(rows, start=2):
+            yield line, values, columns
+    finally:
+        workbook.close()
+
+
+def read_rows(fileobj, filename):
+    """Yield (line number, {column: raw value}) one row at a time."""
+    name = (filename or '').lower()
+    if name.endswith('.xlsx'):
+        source = _read_xlsx(fileobj)
+    elif name.endswith(('.csv', '.txt')):
+        source = _read_csv(fileobj)
+    else:
+        raise PriceListError("Supported formats: .csv, .xlsx")
+
+    for line, values, columns in source:
+        row = {}
+        for column, value in zip(columns, values):
+            if column is None:
+                continue
+            if isinstance(value, str):
+                value = value.strip()
+            row[column] = None if value in ('', None) else value
+        if any(value is not None for value in row.values()):
+            yield line, row
+
+
+# ---- validation ----
+
+def _amount(value, column, errors):
+    if value is None:
+        return None
+    try:
+        number = Decimal(str(value).replace(' ', '').replace(',', '.'))
+    except InvalidOperation:
+        errors.append(f"{column}: not a number")
+        return None
+    if not number.is_finite() or number < 0 or number > MAX_AMOUNT:
+        errors.append(f"{column}: must be between 0 and {MAX_AMOUNT}")
+        return None
+    return number.quantize(CENT)
+
+
+def clean_row(row):
+    """
+    -> (values in COLUMNS order, []) or (None, [error messages])
+    """
+    errors = []
+    sku = row.get('sku')
+    sku = str(sku) if sku is not None else None
+    if isinstance(row.get('sku'), float) and row['sku'].is_integer():
+        sku = str(int(row['sku']))  # Excel хранит числовые артикулы как float
+    if not sku:
+        errors.append("sku: required")
+    elif len(sku) > 100:
+        errors.append("sku: longer than 100 characters")
+
+    name = row.get('name')
+    name = str(name) if name is not None else None
+    if name is not None and len(name) > 255:
+        errors.append("name: longer than 255 characters")
+    description = str(row['description']) if row.get('description') is not None else None
+
+    unit = row.get('unit')
+    if unit is not None:
+        unit = str(unit).lower()
+        if unit not in UNITS:
+            errors.append(f"unit: must be one of {', '.join(sorted(UNITS))}")
+
+    unit_price = _amount(row.get('unit_price'), 'unit_price', errors)
+    stock_quantity = _amount(row.get('stock_quantity'), 'stock_quantity', errors)
+    minimum_order_quantity = _amount(row.get('minimum_order_quantity'), 'minimum_order_quantity', errors)
+
+    is_available = row.get('is_available')
+    if is_available is not None and not isinstance(is_available, bool):
+        flag = str(is_available).lower()
+        if flag in TRUE_VALUES:
+            is_available = True
+        elif flag in FALSE_VALUES:
+            is_available = False
+        else:
+            errors.append("is_available: expected true or false")
+
+    category_id = row.get('category_id')
+    if category_id is not None:
+        try:
+            category_id = int(float(category_id)) if isinstance(category_id, float) else int(category_id)
+        except (TypeError, ValueError):
+            errors.append("category_id: expected a category id")
+
+    if errors:
+        return None, errors
+    return (
+        sku, name, description, unit, unit_price, stock_quantity,
+        minimum_order_quantity, is_available, category_id,
+    ), []
+
+
+def _clean_rows(rows, result, progress):
+    for line, row in rows:
+        result.rows += 1
+        values, errors = clean_row(row)
+        if errors:
+            result.add_error(line, row.get('sku'), '; '.join(errors))
+        else:
+            yield line, values
+        if progress is not None and result.rows % PROGRESS_EVERY == 0:
+            progress(result)
+
+
+# ---- loading: PostgreSQL ----
+
+STAGING_SQL = """
+CREATE TEMP TABLE price_import_staging (
+    line integer NOT NULL,
+    sku varchar(100) NOT NULL,
+    name varchar(255),
+    description text,
+    unit varchar(10),
+    unit_price numeric(10, 2),
+    stock_quantity numeric(10, 2),
+    minimum_order_quantity numeric(10, 2),
+    is_available boolean,
+    category_id bigint
+) ON COMMIT DROP
+"""
+
+COPY_SQL = f"COPY price_import_staging (line, {', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+# повтор SKU: остаётся первая строка файла
+DUPLICATES_SQL = """
+DELETE FROM price_import_staging a
+USING price_import_staging b
+WHERE a.sku = b.sku AND a.line > b.line
+RETURNING a.line, a.sku
+"""
+
+DUPLICATE_MESSAGE = "sku: repeated in the file, only the first row is imported"
+
+UNKNOWN_CATEGORY_SQL = """
+DELETE FROM price_import_staging s
+WHERE s.category_id IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM categories c WHERE c.id = s.category_id)
+RETURNING s.line, s.sku
+"""
+
+INCOMPLETE_NEW_SQL = """
+DELETE FROM price_import_staging s
+WHERE (s.name IS NULL OR s.unit_price IS NULL)
+  AND NOT EXISTS (SELECT 1 FROM products p WHERE p.supplier_id = %(supplier)s AND p.sku = s.sku)
+RETURNING s.line, s.sku
+"""
+
+UPSERT_SQL = """
+WITH upserted AS (
+INSERT INTO products AS p (
+    supplier_id, sku, name, description, unit, unit_price, stock_quantity,
+    minimum_order_quantity, is_available, category_id, reserved_quantity, created_at, updated_at
+)
+SELECT %(supplier)s, s.sku,
+       coalesce(s.name, e.name),
+       coalesce(s.description, e.description),
+       coalesce(s.unit, e.unit, 'kg'),
+       coalesce(s.unit_price, e.unit_price),
+       coalesce(s.stock_quantity, e.stock_quantity, 0),
+       coalesce(s.minimum_order_quantity, e.minimum_order_quantity, 1),
+       coalesce(s.is_available, e.is_available, true),
+       coalesce(s.category_id, e.category_id),
+       0,
+       %(now)s, %(now)s
+FROM price_import_staging s
+LEFT JOIN products e ON e.supplier_id = %(supplier)s AND e.sku = s.sku
+ON CONFLICT (supplier_id, sku) WHERE sku > '' DO UPDATE SET
+    name = EXCLUDED.name,
+    description = EXCLUDED.description,
+    unit = EXCLUDED.unit,
+    unit_price = EXCLUDED.unit_price,
+    stock_quantity = EXCLUDED.stock_quantity,
+    minimum_order_quantity = EXCLUDED.minimum_order_quantity,
+    is_available = EXCLUDED.is_available,
+    category_id = EXCLUDED.category_id,
+    updated_at = EXCLUDED.updated_at
+RETURNING (xmax = 0) AS inserted
+)
+SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM upserted
+"""
+
+
+class _CsvStream(io.RawIOBase):
+    """File-like view of (line, values) rows as CSV text, for COPY FROM STDIN."""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def _encode(self, line, values):
+        out = io.StringIO()
+        csv.writer(out, lineterminator='\n').writerow((line,) + values)
+        return out.getvalue().encode('utf-8')
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer += self._encode(*row)
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def _copy(cursor, rows):
+    stream = _CsvStream(rows)
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):  # psycopg2
+        raw.copy_expert(COPY_SQL, stream, size=64 * 1024)
+    else:  # psycopg 3
+        with raw.copy(COPY_SQL) as copy:
+            while chunk := stream.read(64 * 1024):
+                copy.write(chunk)
+
+
+def _load_postgres(supplier_id, rows, result, now):
+    params = {'supplier': supplier_id, 'now': now}
+    with connection.cursor() as cursor:
+        cursor.execute(STAGING_SQL)
+        _copy(cursor, rows)
+        cursor.execute("ANALYZE price_import_staging")
+
+        checks = (
+            (DUPLICATES_SQL, DUPLICATE_MESSAGE),
+            (UNKNOWN_CATEGORY_SQL, "category_id: category does not exist"),
+            (INCOMPLETE_NEW_SQL, "name and unit_price are required for a new product"),
+        )
+        for sql, message in checks:
+            cursor.execute(sql, params)
+            for line, sku in cursor.fetchall():
+                result.add_error(line, sku, message)
+
+        cursor.execute(UPSERT_SQL, params)
+        created, updated = cursor.fetchone()
+        result.created += created
+        result.updated += updated
+
+
+# ---- loading: other databases ----
+
+UPDATABLE = COLUMNS[1:]
+
+
+def _flush_batch(supplier_id, batch, result, now):
+    existing = {
+        product.sku: product
+        for product in Product.objects.filter(supplier_id=supplier_id, sku__in=batch)
+    }
+    category_ids = {values[8] for _, values in batch.values() if values[8] is not None}
+    known_categories = set(Category.objects.filter(pk__in=category_ids).values_list('id', flat=True))
+
+    to_update, to_create = [], []
+    for sku, (line, values) in batch.items():
+        fields = dict(zip(COLUMNS, values))
+        product = existing.get(sku)
+        if product is not None and product.updated_at == now:
+            # товар уже записан этим импортом из предыдущей пачки
+            result.add_error(line, sku, DUPLICATE_MESSAGE)
+            continue
+        if fields['category_id'] is not None and fields['category_id'] not in known_categories:
+            result.add_error(line, sku, "category_id: category does not exist")
+            continue
+        if product is None:
+            if fields['name'] is None or fields['unit_price'] is None:
+                result.add_error(line, sku, "name and unit_price are required for a new product")
+                continue
+            to_create.append(Product(
+                supplier_id=supplier_id,
+                **{column: value for column, value in fields.items() if value is not None},
+            ))
+        else:
+            for column in UPDATABLE:
+                if fields[column] is not None:
+                    setattr(product, column, fields[column])
+            product.updated_at = now
+            to_update.append(product)
+
+    if to_update:
+        Product.objects.bulk_update(to_update, list(UPDATABLE) + ['updated_at'])
+    if to_create:
+        Product.objects.bulk_create(to_create)
+        # bulk_create ставит updated_at сам (auto_now): метка импорта нужна и новым товарам
+        Product.objects.filter(pk__in=[product.pk for product in to_create]).update(updated_at=now)
+    result.updated += len(to_update)
+    result.created += len(to_create)
+
+
+def _load_portable(supplier_id, rows, result, now):
+    batch = {}
+    for line, values in rows:
+        sku = values[0]
+        if sku in batch:
+            result.add_error(line, sku, DUPLICATE_MESSAGE)
+            continue
+        batch[sku] = (line, values)
+        if len(batch) >= BATCH_SIZE:
+            _flush_batch(supplier_id, batch, result, now)
+            batch = {}
+    if batch:
+        _flush_batch(supplier_id, batch, result, now)
+
+
+def _refresh_written(supplier_id, now):
+    # массовая запись идёт мимо сигналов: цены и снимки каталогов обновляем сами, пачками
+    written = (
+        Product.objects.filter(supplier_id=supplier_id, updated_at=now)
+        .order_by('id').values_list('id', flat=True).iterator(chunk_size=pricing.BATCH_SIZE)
+    )
+    batch = []
+    for product_id in written:
+        batch.append(product_id)
+        if len(batch) >= pricing.BATCH_SIZE:
+            pricing.refresh_prices(batch)
+            snapshots.mark_products_changed(batch)
+            batch = []
+    if batch:
+        pricing.refresh_prices(batch)
+        snapshots.mark_products_changed(batch)
+
+
+# ---- entry point ----
+
+def import_price_list(supplier_id, fileobj, filename, progress=None):
+    """
+    Import a CSV / XLSX price list into the supplier's products.
+    `progress(result)` is called every PROGRESS_EVERY rows.
+    Raises PriceListError if the file can't be read at all.
+    """
+    result = ImportResult()
+    rows = _clean_rows(read_rows(fileobj, filename), result, progress)
+
+    now = timezone.now()
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            _load_postgres(supplier_id, rows, result, now)
+        else:
+            _load_portable(supplier_id, rows, result, now)
+        _refresh_written(supplier_id, now)
+
+    logger.info(
+        "Price list %s for supplier %s: %s rows, %s created, %s updated, %s errors",
+        filename, supplier_id, result.rows, result.created, result.updated, result.error_count,
+    )
+    if progress is not None:
+        progress(result)
+    return result
@@ -0,0 +1,158 @@
+"""
+Effective product prices.
+
+ProductDiscount windows are applied ahead of time into the product_prices
+table (ProductPrice), so readers never scan discounts:
+
+  * catalog payloads join the table (ProductSerializer.effective_price and
+    the json_agg rendering);
+  * order creation prices all lines with one lookup, get_effective_prices().
+
+Prices are computed for a batch of products at once: one query for the
+products, one for every discount window of the batch that hasn't ended, and
+one upsert. Among the discounts active at that moment the lowest resulting
+price wins. Each row stores valid_until, the next boundary (an active window
+ends or a scheduled one starts).
+
+Rows are refreshed when a product's unit_price or its discounts change (see
+catalog.signals) and when a boundary passes: `manage.py refresh_product_prices`
+(run it every minute from cron) recomputes the rows that are due.
+get_effective_prices() also recomputes due or missing rows inline, so orders
+are always priced correctly; catalog payloads may lag by the cron interval.
+"""
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import snapshots
+from .models import Product, ProductDiscount, ProductPrice
+
+
+BATCH_SIZE = 2000
+CENT = Decimal('0.01')
+
+
+def apply_discount(base_price, discount_type, value):
+    if discount_type == 'percentage':
+        price = base_price * (Decimal(100) - value) / Decimal(100)
+    else:
+        price = base_price - value
+    return max(price, Decimal(0)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def compute_prices(base_prices, windows, at):
+    """
+    base_prices: {product_id: unit_price}
+    windows: iterable of (discount_id, product_id, discount_type, value, start, end)
+             for discounts that end after `at`
+    -> {product_id: (effective_price, discount_id or None, valid_until or None)}
+    """
+    best = {product_id: (price, None) for product_id, price in base_prices.items()}
+    boundaries = defaultdict(list)
+
+    for discount_id, product_id, discount_type, value, start, end in windows:
+        if product_id not in best:
+            continue
+        if start <= at < end:
+            price = apply_discount(base_prices[product_id], discount_type, value)
+            if price < best[product_id][0]:
+                best[product_id] = (price, discount_id)
+            boundaries[product_id].append(end)
+        elif start > at:
+            boundaries[product_id].append(start)
+
+    return {
+        product_id: (price, discount_id, min(boundaries[product_id], default=None))
+        for product_id, (price, discount_id) in best.items()
+    }
+
+
+def _refresh_batch(product_ids, at):
+    base_prices = dict(Product.objects.filter(pk__in=product_ids).values_list('id', 'unit_price'))
+    windows = ProductDiscount.objects.filter(
+        product_id__in=base_prices, is_active=True, end_date__gt=at,
+    ).values_list('id', 'product_id', 'discount_type', 'value', 'start_date', 'end_date')
+
+    computed = compute_prices(base_prices, windows, at)
+    previous = dict(
+        ProductPrice.objects.filter(product_id__in=base_prices).values_list('product_id', 'effective_price')
+    )
+
+    ProductPrice.objects.bulk_create(
+        [
+            ProductPrice(
+                product_id=product_id,
+                base_price=base_prices[product_id],
+                effective_price=price,
+                discount_id=discount_id,
+                valid_until=valid_until,
+                computed_at=at,
+            )
+            for product_id, (price, discount_id, valid_until) in computed.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['base_price', 'effective_price', 'discount', 'valid_until', 'computed_at'],
+    )
+
+    changed = [product_id for product_id, (price, _, _) in computed.items() if previous.get(product_id) != price]
+    if changed:
+        # effective_price входит в данные товара: для синхронизации (catalog/sync.py) товар изменился
+        Product.objects.filter(pk__in=changed).update(updated_at=timezone.now())
+        snapshots.mark_products_changed(changed)
+    return computed
+
+
+def refresh_prices(product_ids=None, at=None):
+    """
+    Recompute prices of the given products (all products if None).
+    Returns the number of products processed.
+    """
+    at = at or timezone.now()
+    if product_ids is None:
+        product_ids = Product.objects.order_by('id').values_list('id', flat=True).iterator()
+
+    processed, batch = 0, []
+    for product_id in product_ids:
+        batch.append(product_id)
+        if len(batch) >= BATCH_SIZE:
+            with transaction.atomic():
+                processed += len(_refresh_batch(batch, at))
+            batch = []
+    if batch:
+        with transaction.atomic():
+            processed += len(_refresh_batch(batch, at))
+    return processed
+
+
+def refresh_due_prices(at=None):
+    """Recompute rows whose discount boundary has passed."""
+    at = at or timezone.now()
+    due = ProductPrice.objects.filter(valid_until__lte=at).values_list('product_id', flat=True)
+    return refresh_prices(list(due), at)
+
+
+def get_effective_prices(product_ids):
+    """
+    {product_id: effective price} for the given products, one lookup.
+    Missing or outdated rows are recomputed first.
+    """
+    at = timezone.now()
+    product_ids = set(product_ids)
+    rows = ProductPrice.objects.filter(product_id__in=product_ids).values_list(
+        'product_id', 'effective_price', 'valid_until',
+    )
+    prices = {
+        product_id: price
+        for product_id, price, valid_until in rows
+        if valid_until is None or valid_until > at
+    }
+    stale = product_ids - prices.keys()
+    if stale:
+        with transaction.atomic():
+            computed = _refresh_batch(list(stale), at)
+        for product_id, (price, _, _) in computed.items():
+            prices[product_id] = price
+    return prices
@@ -0,0 +1,112 @@
+"""
+Database-side rendering of the nested product payload of catalogs.
+
+On PostgreSQL the products of a whole page of catalogs are built by the
+database in one query: catalog_products JOIN products, categories and
+product_prices, with json_agg per catalog ordered by (display_order,
+added_at). Python only parses the JSON and turns stored image names (and
+image variants) into URLs, no Product / Category instances or serializer
+fields are created per row.
+
+The payload has the same shape as ProductInCatalogSerializer output (no
+stock columns, they change with every order and live outside the snapshots).
+Elsewhere (sqlite in tests) CatalogWithProductsSerializer falls back to
+ProductInCatalogSerializer over a single select_related query.
+"""
+import json
+
+from django.db import connection
+from django.utils import timezone
+
+from scp_project import images
+
+from .models import Product
+
+
+def _timestamp(column):
+    # как DRF DateTimeField в UTC: ISO 8601, микросекунды только если не ноль, 'Z'
+    return (
+        f"to_char({column} AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS')"
+        f" || CASE WHEN extract(microseconds FROM {column})::bigint %% 1000000 = 0 THEN ''"
+        f" ELSE to_char({column} AT TIME ZONE 'UTC', '.US') END || 'Z'"
+    )
+
+
+CATALOG_PRODUCTS_SQL = f"""
+SELECT cp.catalog_id,
+       json_agg(
+           json_build_object(
+               'id', p.id,
+               'category', CASE WHEN c.id IS NULL THEN NULL ELSE json_build_object(
+                   'id', c.id,
+                   'name', c.name,
+                   'description', c.description,
+                   'parent', c.parent_id,
+                   'parent_id', pc.id,
+                   'parent_name', pc.name,
+                   'created_at', {_timestamp('c.created_at')}
+               ) END,
+               'effective_price', pp.effective_price::text,
+               'name', p.name,
+               'description', p.description,
+               'sku', p.sku,
+               'unit', p.unit,
+               'unit_price', p.unit_price::text,
+               'minimum_order_quantity', p.minimum_order_quantity::text,
+               'is_available', p.is_available,
+               'image', NULLIF(p.image, ''),
+               'image_variants', p.image_variants,
+               'created_at', {_timestamp('p.created_at')},
+               'updated_at', {_timestamp('p.updated_at')},
+               'supplier', p.supplier_id
+           )
+           ORDER BY cp.display_order, cp.added_at, cp.id
+       )::text
+FROM catalog_products cp
+JOIN products p ON p.id = cp.product_id
+LEFT JOIN categories c ON c.id = p.category_id
+LEFT JOIN categories pc ON pc.id = c.parent_id
+LEFT JOIN product_prices pp ON pp.product_id = p.id
+WHERE cp.catalog_id = ANY(%s)
+GROUP BY cp.catalog_id
+"""
+
+
+def database_renders_json():
+    """
+    True when the catalog payload can be built by the database.
+    The SQL formats timestamps in UTC, which is what DRF does with TIME_ZONE = 'UTC'.
+    """
+    return connection.vendor == 'postgresql' and timezone.get_current_timezone_name() == 'UTC'
+
+
+def _finish(products, request):
+    storage = Product._meta.get_field('image').storage
+    for product in products:
+        if product['image']:
+            url = storage.url(product['image'])
+            product['image'] = request.build_absolute_uri(url) if request is not None else url
+        product['image_variants'] = images.variant_urls(product['image_variants'], request, storage)
+
+        category = product['category']
+        if category is not None and category['parent_id'] is None:
+            # CategorySerializer пропускает parent.id / parent.name у корневых категорий
+            del category['parent_id']
+            del category['parent_name']
+    return products
+
+
+def render_catalog_products(catalog_ids, request=None):
+    """
+    {catalog_id: [product payload, ...]} for the given catalogs, one query.
+    """
+    catalog_ids = list(catalog_ids)
+    rendered = {catalog_id: [] for catalog_id in catalog_ids}
+    if not catalog_ids:
+        return rendered
+
+    with connection.cursor() as cursor:
+        cursor.execute(CATALOG_PRODUCTS_SQL, [catalog_ids])
+        for catalog_id, payload in cursor.fetchall():
+            rendered[catalog_id] = _finish(json.loads(payload), request)
+    return rendered
@@ -0,0 +1,82 @@
+"""
+Product search over name, sku, category names and description.
+
+On PostgreSQL products.search_vector is maintained by triggers (migration
+0004) with weights A (name, sku), B (category and parent category names) and
+C (description), using the language-neutral 'simple' configuration since
+product names mix Russian, Kazakh and English. A query matches when
+
+  * every term is a prefix of a word in the vector (GIN on search_vector), or
+  * the whole query is word-similar to the name (pg_trgm GIN on name),
+    which tolerates typos;
+
+and is ranked by ts_rank + trigram word similarity. The score is a double so
+it can be used as a keyset (-score, id).
+
+Other databases get a plain icontains match with a coarse score, enough for
+tests and local development.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+
+
+SEARCH_CONFIG = 'simple'
+MAX_TERMS = 8
+
+_TERM_RE = re.compile(r'\w+')
+
+
+def search_terms(text):
+    """Lower-cased words of the query; tsquery operators never get through."""
+    return _TERM_RE.findall(text.lower())[:MAX_TERMS]
+
+
+def search_products(queryset, text):
+    """
+    `queryset` filtered to products matching `text`, annotated with `score`.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset.none().annotate(score=Value(0.0, output_field=FloatField()))
+    if connection.vendor == 'postgresql':
+        return _search_postgres(queryset, text, terms)
+    return _search_portable(queryset, terms)
+
+
+def _search_postgres(queryset, text, terms):
+    tsquery = SearchQuery(
+        ' & '.join(f'{term}:*' for term in terms),
+        search_type='raw',
+        config=SEARCH_CONFIG,
+    )
+    return queryset.filter(
+        Q(search_vector=tsquery) | Q(name__trigram_word_similar=text)
+    ).annotate(
+        score=Cast(
+            SearchRank(F('search_vector'), tsquery) + TrigramWordSimilarity(text, 'name'),
+            FloatField(),
+        )
+    )
+
+
+def _search_portable(queryset, terms):
+    condition = Q()
+    score = Value(0.0, output_field=FloatField())
+    for term in terms:
+        condition &= (
+            Q(name__icontains=term)
+            | Q(sku__icontains=term)
+            | Q(category__name__icontains=term)
+            | Q(category__parent__name__icontains=term)
+            | Q(description__icontains=term)
+        )
+        score = score + Case(
+            When(name__icontains=term, then=Value(1.0)),
+            default=Value(0.1),
+            output_field=FloatField(),
+        )
+    return queryset.filter(condition).annotate(score=score)
@@ -1,4 +1,9 @@
+from decimal import Decimal
+
 from rest_framework import serializers
+
+from scp_project.fieldsets import SparseFieldsetMixin
+from scp_project.images import ImageVariantsField
 from .models import (
     Category,
     Product,
@@ -8,9 +13,18 @@ from .models import (
     CatalogProduct,
     DeliveryOption,
 )
+from .rendering import database_renders_json, render_catalog_products
+
+
+def available_quantity(stock_quantity, reserved_quantity):
+    """
+    Сколько можно пообещать: остаток минус резервы, не меньше нуля (учётная система
+    поставщика может выставить остаток ниже уже зарезервированного, см. catalog/inventory.py).
+    """
+    return str(max(stock_quantity - reserved_quantity, Decimal('0.00')))
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     parent_id = serializers.IntegerField(source="parent.id", read_only=True)
     parent_name = serializers.CharField(source="parent.name", read_only=True)
 
@@ -26,14 +40,71 @@ class CategorySerializer(serializers.ModelSerializer):
             "created_at"
         ]
 
-class ProductSerializer(serializers.ModelSerializer):
+    def validate_parent(self, parent):
+        if parent is not None and self.instance is not None and (
+            parent.pk == self.instance.pk or parent.is_descendant_of(self.instance)
+        ):
+            raise serializers.ValidationError("Категорию нельзя вложить в саму себя или в её подкатегорию.")
+        return parent
+
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Товар. Списки понимают ?fields= и ?expand=category (scp_project/fieldsets.py).
+    """
     category = CategorySerializer(read_only=True)
-    
+    # цена со скидкой из таблицы product_prices (catalog/pricing.py); select_related('price')
+    effective_price = serializers.DecimalField(
+        source='price.effective_price', max_digits=10, decimal_places=2, read_only=True
+    )
+    # уменьшенные копии image: thumb / list / detail (WebP и JPEG) + placeholder
+    image_variants = ImageVariantsField()
+    # остаток за вычетом резервов pending-заказов (orders/reservations.py)
+    available_quantity = serializers.SerializerMethodField()
+
+    method_field_sources = {'available_quantity': ['stock_quantity', 'reserved_quantity']}
+
     class Meta:
         model = Product
+        exclude = ['search_vector']
+
+    def get_available_quantity(self, obj):
+        return available_quantity(obj.stock_quantity, obj.reserved_quantity)
+
+
+class ProductInCatalogSerializer(ProductSerializer):
+    """
+    Товар внутри каталога — без остатков: stock_quantity / reserved_quantity меняются с каждым
+    заказом, а каталог хранится снимком (catalog/snapshots.py) и раздаётся инкрементально
+    (catalog/sync.py). Остатки — в CatalogAvailabilityView.
+    """
+    available_quantity = None
+
+    class Meta(ProductSerializer.Meta):
+        exclude = ['search_vector', 'stock_quantity', 'reserved_quantity']
+
+
+class ProductSearchSerializer(ProductSerializer):
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(ProductSerializer.Meta):
+        pass
+
+
+class ProductDiscountSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductDiscount
         fields = '__all__'
 
 
+class CatalogSerializer(serializers.ModelSerializer):
+    """
+    Каталог без товаров (инкрементальная синхронизация, catalog/sync.py).
+    """
+    class Meta:
+        model = Catalog
+        fields = ['id', 'name', 'description', 'supplier', 'is_active', 'created_at', 'updated_at']
+
+
 class DeliveryOptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = DeliveryOption
@@ -52,6 +123,9 @@ class CatalogProductSerializer(serializers.ModelSerializer):
 class CatalogWithProductsSerializer(serializers.ModelSerializer):
     """
     Каталог + вложенный список продуктов.
+    Продукты всех каталогов страницы загружаются одним запросом (см. catalog/rendering.py).
+    Вложенные продукты не зависят от запроса (ссылки на картинки относительные),
+    поэтому каталог можно хранить готовым снимком (см. catalog/snapshots.py).
     """
     products = serializers.SerializerMethodField()
 
@@ -60,7 +134,29 @@ class CatalogWithProductsSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'supplier', 'is_active', 'created_at', 'products']
 
     def get_products(self, obj):
-        # берём все записи CatalogProduct для данного каталога
-        catalog_products = CatalogProduct.objects.select_related('product').filter(catalog=obj)
-        products = [cp.product for cp in catalog_products]
-        return ProductSerializer(products, many=True).data
+        root = self.root
+        products = getattr(root, '_catalog_products', None)
+        if products is None:
+            # все каталоги, которые сериализуются вместе с этим (список или один объект)
+            catalogs = root.instance if isinstance(root, serializers.ListSerializer) else [obj]
+            products = root._catalog_products = self.load_products([catalog.id for catalog in catalogs])
+        if obj.id not in products:
+            products.update(self.load_products([obj.id]))
+        return products[obj.id]
+
+    def load_products(self, catalog_ids):
+        if database_renders_json():
+            return render_catalog_products(catalog_ids)
+
+        entries = list(
+            CatalogProduct.objects
+            .filter(catalog_id__in=catalog_ids)
+            .select_related('product__category__parent', 'product__price')
+            .order_by('display_order', 'added_at', 'id')
+        )
+        data = ProductInCatalogSerializer([entry.product for entry in entries], many=True).data
+
+        products = {catalog_id: [] for catalog_id in catalog_ids}
+        for entry, item in zip(entries, data):
+            products[entry.catalog_id].append(item)
+        return products
@@ -0,0 +1,134 @@
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from scp_project import images
+
+from . import category_tree, pricing, snapshots
+from .models import Catalog, CatalogProduct, Category, DeletionLog, Product, ProductDiscount, ProductImage
+
+
+# ---- catalog snapshots ----
+
+@receiver(post_save, sender=Catalog)
+def catalog_changed(sender, instance, created, **kwargs):
+    if not created:
+        snapshots.mark_catalogs_changed([instance.id])
+
+
+@receiver(post_save, sender=CatalogProduct)
+@receiver(post_delete, sender=CatalogProduct)
+def catalog_entry_changed(sender, instance, **kwargs):
+    snapshots.mark_catalogs_changed([instance.catalog_id])
+
+
+@receiver(post_save, sender=Product)
+def product_changed(sender, instance, created, **kwargs):
+    # новый товар ещё не входит ни в один каталог
+    if not created:
+        snapshots.mark_products_changed([instance.id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # pre_delete: после удаления у товаров уже category = NULL, каталоги не найти
+    snapshots.mark_category_changed(instance.id)
+
+
+# ---- category tree cache ----
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_tree_changed(sender, **kwargs):
+    category_tree.invalidate()
+
+
+# ---- effective prices (снимки каталогов помечаются в pricing, если цена изменилась) ----
+
+@receiver(post_init, sender=Product)
+def remember_unit_price(sender, instance, **kwargs):
+    instance._loaded_unit_price = instance.__dict__.get('unit_price')
+
+
+@receiver(post_save, sender=Product)
+def reprice_product(sender, instance, created, **kwargs):
+    if created or instance.unit_price != instance._loaded_unit_price:
+        pricing.refresh_prices([instance.id])
+    instance._loaded_unit_price = instance.unit_price
+
+
+@receiver(post_save, sender=ProductDiscount)
+@receiver(post_delete, sender=ProductDiscount)
+def reprice_discounted_product(sender, instance, origin=None, **kwargs):
+    # при каскадном удалении товара пересчитывать нечего
+    if origin is not None and not isinstance(origin, ProductDiscount) and getattr(origin, 'model', None) is not ProductDiscount:
+        return
+    pricing.refresh_prices([instance.product_id])
+
+
+# ---- image derivatives ----
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+def queue_image_variants(sender, instance, **kwargs):
+    images.queue_if_changed(instance, 'image', 'image_variants')
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+def delete_image_variants(sender, instance, **kwargs):
+    images.delete_for(instance, 'image', 'image_variants')
+
+
+@receiver(images.derivatives_built, sender=Product)
+def product_variants_built(sender, pk, **kwargs):
+    # варианты сохраняются через QuerySet.update, мимо post_save
+    Product.objects.filter(pk=pk).update(updated_at=timezone.now())
+    snapshots.mark_products_changed([pk])
+
+
+# ---- tombstones for incremental sync (catalog/sync.py) ----
+
+def _deleted_directly(origin, model):
+    # каскадные удаления клиент выводит сам: нет товара - нет его скидок и строк каталогов
+    return origin is None or isinstance(origin, model) or getattr(origin, 'model', None) is model
+
+
+@receiver(post_delete, sender=Product)
+def log_product_deletion(sender, instance, **kwargs):
+    DeletionLog.objects.create(supplier_id=instance.supplier_id, object_type='product', object_id=instance.id)
+
+
+@receiver(post_delete, sender=Catalog)
+def log_catalog_deletion(sender, instance, **kwargs):
+    DeletionLog.objects.create(supplier_id=instance.supplier_id, object_type='catalog', object_id=instance.id)
+
+
+@receiver(post_delete, sender=CatalogProduct)
+def log_catalog_entry_deletion(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(origin, CatalogProduct):
+        supplier_id = Catalog.objects.filter(pk=instance.catalog_id).values_list('supplier_id', flat=True).first()
+        DeletionLog.objects.create(supplier_id=supplier_id, object_type='catalog_product', object_id=instance.id)
+
+
+@receiver(post_delete, sender=ProductDiscount)
+def log_discount_deletion(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(origin, ProductDiscount):
+        supplier_id = Product.objects.filter(pk=instance.product_id).values_list('supplier_id', flat=True).first()
+        DeletionLog.objects.create(supplier_id=supplier_id, object_type='discount', object_id=instance.id)
+
+
+@receiver(post_delete, sender=Category)
+def log_category_deletion(sender, instance, **kwargs):
+    DeletionLog.objects.create(supplier=None, object_type='category', object_id=instance.id)
+
+
+@receiver(pre_delete, sender=Category)
+def touch_products_of_deleted_category(sender, instance, origin=None, **kwargs):
+    # category у товаров станет NULL через UPDATE без сигналов; отмечаем их изменёнными
+    if isinstance(origin, Category) and origin.pk != instance.pk:
+        return  # поддерево уже обработано при удалении корня
+    categories = Q(category__path__startswith=instance.path) if instance.path else Q(category_id=instance.pk)
+    Product.objects.filter(categories).update(updated_at=timezone.now())
@@ -0,0 +1,175 @@
+"""
+Materialized catalog snapshots.
+
+Every catalog has a CatalogSnapshot row: the CatalogWithProductsSerializer
+JSON of the catalog, gzip-compressed, with a sha256 content hash used as a
+strong ETag. CatalogDetailView sends the stored bytes as they are, so a read
+of an unchanged catalog costs one indexed lookup and no serializer work, and a
+client that already has the current version gets 304 Not Modified.
+
+Freshness is tracked with two counters. Changes to a Product, CatalogProduct,
+ProductDiscount, Category or Catalog (see catalog.signals) bump
+`generation` of the affected snapshots inside the writing transaction and,
+after commit, queue a rebuild on a small thread pool. A snapshot is only
+served while built_generation == generation; a stale one is rebuilt inline
+by the reader, so a response never reflects pre-commit data.
+
+Bulk writes that skip model signals (QuerySet.update, raw SQL) must call
+mark_products_changed() / mark_catalogs_changed() themselves.
+
+Stock is not part of a snapshot: stock_quantity / reserved_quantity change
+with every order, so catalog/inventory.py and orders/reservations.py don't
+mark snapshots, and clients read availability from CatalogAvailabilityView.
+"""
+import gzip
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import Catalog, CatalogSnapshot
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _workers():
+    return getattr(settings, 'CATALOG_SNAPSHOT_WORKERS', 2)
+
+
+def render(catalog):
+    """Uncompressed JSON bytes of a catalog with its products."""
+    from .serializers import CatalogWithProductsSerializer
+
+    return JSONRenderer().render(CatalogWithProductsSerializer(catalog).data)
+
+
+def rebuild(catalog_id):
+    """
+    Build and store the snapshot of one catalog.
+    Returns the CatalogSnapshot, or None if the catalog no longer exists.
+    """
+    catalog = Catalog.objects.filter(pk=catalog_id).first()
+    if catalog is None:
+        return None
+    snapshot, _ = CatalogSnapshot.objects.get_or_create(catalog=catalog)
+    generation = snapshot.generation
+
+    payload = render(catalog)
+    snapshot.content = gzip.compress(payload, mtime=0)
+    snapshot.etag = hashlib.sha256(payload).hexdigest()
+    snapshot.size = len(payload)
+    snapshot.built_generation = generation
+    snapshot.built_at = timezone.now()
+
+    # если за время сборки каталог снова изменился, снимок остаётся устаревшим
+    CatalogSnapshot.objects.filter(pk=catalog_id, generation=generation).update(
+        content=snapshot.content,
+        etag=snapshot.etag,
+        size=snapshot.size,
+        built_generation=generation,
+        built_at=snapshot.built_at,
+    )
+    return snapshot
+
+
+def _rebuild_in_worker(catalog_id):
+    with _lock:
+        _pending.discard(catalog_id)
+    try:
+        rebuild(catalog_id)
+    except Exception:
+        logger.exception("Catalog snapshot rebuild failed for catalog %s", catalog_id)
+    finally:
+        connections.close_all()
+
+
+def _schedule(catalog_ids):
+    global _executor
+
+    if _workers() <= 0:
+        for catalog_id in catalog_ids:
+            rebuild(catalog_id)
+        return
+
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='catalog-snapshot')
+        queued = [catalog_id for catalog_id in catalog_ids if catalog_id not in _pending]
+        _pending.update(queued)
+    for catalog_id in queued:
+        _executor.submit(_rebuild_in_worker, catalog_id)
+
+
+def mark_catalogs_changed(catalog_ids):
+    """
+    Mark snapshots of the given catalogs stale and rebuild them after commit.
+    """
+    catalog_ids = {catalog_id for catalog_id in catalog_ids if catalog_id is not None}
+    if not catalog_ids:
+        return
+    CatalogSnapshot.objects.filter(catalog_id__in=catalog_ids).update(generation=F('generation') + 1)
+    transaction.on_commit(lambda: _schedule(sorted(catalog_ids)))
+
+
+def _mark_snapshots(condition):
+    catalog_ids = list(CatalogSnapshot.objects.filter(condition).values_list('catalog_id', flat=True))
+    mark_catalogs_changed(catalog_ids)
+
+
+def mark_products_changed(product_ids):
+    """Snapshots of every catalog that contains one of the products."""
+    product_ids = [product_id for product_id in product_ids if product_id is not None]
+    if product_ids:
+        _mark_snapshots(Q(catalog__catalog_products__product_id__in=product_ids))
+
+
+def mark_category_changed(category_id):
+    """
+    Snapshots of catalogs with products in the category or a direct subcategory
+    (the product payload carries the parent category name too).
+    """
+    if category_id is not None:
+        _mark_snapshots(
+            Q(catalog__catalog_products__product__category_id=category_id)
+            | Q(catalog__catalog_products__product__category__parent_id=category_id)
+        )
+
+
+def get_fresh(queryset, catalog_id, with_content=True):
+    """
+    (etag, gzip content) of the current snapshot of a catalog visible in
+    `queryset`, or None if there is no fresh one. content is None unless
+    with_content, so a conditional request can be answered without it.
+    """
+    fields = ('etag', 'content') if with_content else ('etag',)
+    row = (
+        CatalogSnapshot.objects
+        .filter(catalog_id=catalog_id, catalog__in=queryset, built_generation=F('generation'))
+        .values_list(*fields)
+        .first()
+    )
+    if row is None:
+        return None
+    return row[0], bytes(row[1]) if with_content and row[1] is not None else None
+
+
+def get_content(catalog_id, etag):
+    """Stored gzip bytes of the snapshot, if it is still the given version."""
+    content = (
+        CatalogSnapshot.objects
+        .filter(catalog_id=catalog_id, etag=etag, built_generation=F('generation'))
+        .values_list('content', flat=True)
+        .first()
+    )
+    return bytes(content) if content is not None else None
@@ -0,0 +1,142 @@
+"""
+Incremental catalog sync for offline-capable clients.
+
+    GET /api/catalog/suppliers/<id>/changes/?since=<token>
+
+returns what changed in the supplier's catalog since the token was issued:
+
+    {"token": "...", "reset": false,
+     "products": [...], "catalogs": [...], "catalog_products": [...],
+     "discounts": [...], "categories": [...],
+     "deleted": {"products": [ids], "catalogs": [...], "catalog_products": [...],
+                 "discounts": [...], "categories": [...]}}
+
+Rows are full objects, rendered by the same serializers as the rest of the
+API. The client upserts them by id and drops the deleted ids. Cascade
+deletes are not logged separately: a product tombstone also drops the
+product's discounts and catalog entries, and a catalog tombstone drops the
+catalog's entries.
+
+Changes are found through indexed updated_at columns. Writes that bypass
+save() bump updated_at themselves: price import, price refresh, image
+variants, and products of a deleted category. Stock is left out, as in
+catalog snapshots: product rows carry no stock_quantity / reserved_quantity /
+available_quantity, and stock syncs and reservations don't bump updated_at,
+so orders don't make every client re-download the products they touch.
+Clients read stock from the catalog availability endpoint. Deletions are recorded
+in DeletionLog by catalog.signals.
+
+The token is the server time at which the response was built. Changes are
+selected from SYNC_OVERLAP before it, so a transaction that was still open
+when the previous token was issued is picked up on the next sync; a client
+may get a few rows twice, which upserts make harmless. Without a token, or
+with one older than the deletion-log retention, the response is the full
+catalog with "reset": true and the client replaces its copy.
+
+Product rows embed their category (and its parent's name), so a changed
+category also resends its products and its direct subcategories.
+Consumers don't see inactive catalogs: a catalog that was deactivated comes
+back as a tombstone.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Catalog, CatalogProduct, Category, DeletionLog, Product, ProductDiscount
+from .serializers import (
+    CatalogProductSerializer,
+    CatalogSerializer,
+    CategorySerializer,
+    ProductDiscountSerializer,
+    ProductInCatalogSerializer,
+)
+
+
+SYNC_OVERLAP = timedelta(seconds=60)
+
+DELETED_KEYS = {
+    'product': 'products',
+    'catalog': 'catalogs',
+    'catalog_product': 'catalog_products',
+    'discount': 'discounts',
+    'category': 'categories',
+}
+
+
+def retention():
+    return timedelta(days=getattr(settings, 'CATALOG_SYNC_RETENTION_DAYS', 90))
+
+
+def make_token(moment):
+    return str(int(moment.timestamp() * 1_000_000))
+
+
+def parse_token(token):
+    """Token -> aware datetime; ValueError if it isn't one of ours."""
+    if not token.isdigit():
+        raise ValueError(token)
+    return datetime.fromtimestamp(int(token) / 1_000_000, tz=dt_timezone.utc)
+
+
+def changes_since(supplier_id, since=None, include_inactive=False, request=None):
+    """
+    Changes of the supplier's catalog since `since` (a datetime from
+    parse_token, or None for everything). include_inactive: staff view,
+    inactive catalogs are sent as rows instead of tombstones.
+    """
+    now = timezone.now()
+    reset = since is None or since < now - retention()
+    after = None if reset else since - SYNC_OVERLAP
+
+    def changed(queryset, field='updated_at'):
+        return queryset if after is None else queryset.filter(**{f'{field}__gte': after})
+
+    # категории общие для всех поставщиков; подкатегории зависят от имени родителя
+    categories = Category.objects.select_related('parent').order_by('id')
+    if after is not None:
+        categories = categories.filter(Q(updated_at__gte=after) | Q(parent__updated_at__gte=after))
+    categories = list(categories)
+
+    products = Product.objects.filter(supplier_id=supplier_id).select_related('category__parent', 'price')
+    if after is not None:
+        products = products.filter(Q(updated_at__gte=after) | Q(category_id__in=[c.id for c in categories]))
+
+    catalogs = list(changed(Catalog.objects.filter(supplier_id=supplier_id)).order_by('id'))
+    hidden_catalogs = [] if include_inactive else [catalog.id for catalog in catalogs if not catalog.is_active]
+    if hidden_catalogs:
+        catalogs = [catalog for catalog in catalogs if catalog.is_active]
+
+    entries = CatalogProduct.objects.filter(catalog__supplier_id=supplier_id)
+    if not include_inactive:
+        entries = entries.filter(catalog__is_active=True)
+    if after is not None:
+        # каталог снова стал активным: клиенту нужны все его строки
+        entries = entries.filter(Q(updated_at__gte=after) | Q(catalog_id__in=[catalog.id for catalog in catalogs]))
+
+    discounts = ProductDiscount.objects.filter(product__supplier_id=supplier_id)
+    discounts = discounts.filter(end_date__gt=now) if after is None else changed(discounts)
+
+    deleted = {key: [] for key in DELETED_KEYS.values()}
+    if after is not None:
+        tombstones = (
+            DeletionLog.objects
+            .filter(Q(supplier_id=supplier_id) | Q(supplier__isnull=True), deleted_at__gte=after)
+            .values_list('object_type', 'object_id')
+        )
+        for object_type, object_id in tombstones:
+            deleted[DELETED_KEYS[object_type]].append(object_id)
+        deleted['catalogs'].extend(hidden_catalogs)
+
+    context = {'request': request}
+    return {
+        'token': make_token(now),
+        'reset': reset,
+        'products': ProductInCatalogSerializer(products.order_by('id'), many=True, context=context).data,
+        'catalogs': CatalogSerializer(catalogs, many=True, context=context).data,
+        'catalog_products': CatalogProductSerializer(entries.order_by('id'), many=True, context=context).data,
+        'discounts': ProductDiscountSerializer(discounts.order_by('id'), many=True, context=context).data,
+        'categories': CategorySerializer(categories, many=True, context=context).data,
+        'deleted': deleted,
+    }
@@ -1,3 +1,891 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import SupplierProfile
+from accounts.tests import ScopeFixtureMixin
+from orders.models import Order, OrderItem
+
+from . import category_tree, price_import, pricing, sync
+from .inventory import decrement_stock, release_reserved, reserve_stock, sync_stock
+from .price_import import openpyxl
+from .models import Catalog, CatalogProduct, CatalogSnapshot, Category, DeletionLog, Product, ProductDiscount, ProductPrice
+from .rendering import database_renders_json, render_catalog_products
+from .serializers import ProductInCatalogSerializer
+
+
+class CatalogRenderingTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        root = Category.objects.create(name="Bakery")
+        self.products.append(
+            Product.objects.create(
+                supplier=self.supplier, category=root, name="Bread", unit='pcs', unit_price=Decimal('3.50')
+            )
+        )
+        self.products.append(
+            Product.objects.create(supplier=self.supplier, name="Ice", unit='kg', unit_price=Decimal('1.00'))
+        )
+        self.catalogs = [
+            Catalog.objects.create(supplier=self.supplier, name=f"Catalog {i}") for i in range(3)
+        ]
+        for catalog in self.catalogs:
+            for order, product in enumerate(reversed(self.products)):
+                CatalogProduct.objects.create(catalog=catalog, product=product, display_order=order)
+
+    def expected(self, catalog):
+        products = [entry.product for entry in catalog.catalog_products.order_by('display_order', 'added_at')]
+        return ProductInCatalogSerializer(products, many=True).data
+
+    def test_catalog_list_runs_fixed_number_of_queries(self):
+        self.authenticate(self.consumer_user)
+        url = reverse('supplier-catalogs', args=[self.supplier.id])
+        # scope + accepted links + catalogs + products of all catalogs
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+
+        for catalog in self.catalogs[:2]:
+            CatalogProduct.objects.filter(catalog=catalog).delete()
+        self.assertEqual(self.client.get(url).data[0]['products'], [])
+
+    def test_catalog_detail_payload(self):
+        self.authenticate(self.owner)
+        catalog = self.catalogs[0]
+        response = self.client.get(reverse('catalog-detail', args=[catalog.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        self.assertEqual(
+            [item['id'] for item in data['products']],
+            [product.id for product in reversed(self.products)],
+        )
+        self.assertEqual(data['products'], json.loads(JSONRenderer().render(self.expected(catalog))))
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "json_agg rendering is PostgreSQL only")
+    def test_database_json_matches_serializer(self):
+        self.assertTrue(database_renders_json())
+        ids = [catalog.id for catalog in self.catalogs]
+        with self.assertNumQueries(1):
+            rendered = render_catalog_products(ids)
+        for catalog in self.catalogs:
+            self.assertEqual(rendered[catalog.id], self.expected(catalog))
+
+
+class CatalogSnapshotTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.catalog = Catalog.objects.create(supplier=self.supplier, name="Main")
+        for order, product in enumerate(self.products):
+            CatalogProduct.objects.create(catalog=self.catalog, product=product, display_order=order)
+        self.url = reverse('catalog-detail', args=[self.catalog.id])
+
+    def get(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def test_served_from_snapshot_with_etag(self):
+        self.authenticate(self.owner)
+        first = self.get()
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertTrue(CatalogSnapshot.objects.get(pk=self.catalog.id).is_fresh)
+
+        # только снимок: профиль уже загружен, сериализаторы и товары не нужны
+        with self.assertNumQueries(1):
+            second = self.get()
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second['Cache-Control'], 'private, no-cache')
+        self.assertEqual(json.loads(second.content)['name'], "Main")
+
+        with self.assertNumQueries(1):
+            not_modified = self.get(if_none_match=first['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], first['ETag'])
+
+    def test_gzip_representation(self):
+        self.authenticate(self.owner)
+        plain = self.get()
+        packed = self.get(accept_encoding='gzip, deflate')
+        self.assertEqual(packed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(packed.content), plain.content)
+        self.assertNotEqual(packed['ETag'], plain['ETag'])
+        self.assertEqual(self.get(accept_encoding='gzip', if_none_match=plain['ETag']).status_code, 200)
+        self.assertEqual(self.get(accept_encoding='gzip', if_none_match=packed['ETag']).status_code, 304)
+
+    def test_changes_rebuild_snapshot(self):
+        self.authenticate(self.owner)
+        self.get()
+
+        changes = [
+            lambda: Product.objects.get(pk=self.products[0].pk).save(),
+            lambda: Category.objects.get(name="Food").save(),
+            lambda: ProductDiscount.objects.create(
+                product=self.products[1], discount_type='fixed', value=Decimal('1'),
+                start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=1),
+            ),
+            lambda: CatalogProduct.objects.filter(product=self.products[2]).delete(),
+            lambda: Catalog.objects.get(pk=self.catalog.pk).save(),
+        ]
+        for change in changes:
+            generation = CatalogSnapshot.objects.get(pk=self.catalog.id).generation
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            snapshot = CatalogSnapshot.objects.get(pk=self.catalog.id)
+            self.assertEqual(snapshot.generation, generation + 1)
+            # пересобран сразу после commit
+            self.assertTrue(snapshot.is_fresh)
+
+    def test_new_content_gets_new_etag(self):
+        self.authenticate(self.owner)
+        etag = self.get()['ETag']
+        category = Category.objects.get(name="Food")
+        category.name = "Groceries"
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+
+        response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        products = json.loads(response.content)['products']
+        self.assertEqual(products[0]['category']['parent_name'], "Groceries")
+
+    def test_stale_snapshot_is_rebuilt_on_read(self):
+        self.authenticate(self.owner)
+        self.get()
+        # изменение без commit-колбэков: снимок только помечен устаревшим
+        Product.objects.filter(pk=self.products[0].pk).update(name="Kefir")
+        Product.objects.get(pk=self.products[0].pk).save()
+        self.assertFalse(CatalogSnapshot.objects.get(pk=self.catalog.id).is_fresh)
+        names = [item['name'] for item in json.loads(self.get().content)['products']]
+        self.assertIn("Kefir", names)
+
+    def test_stock_changes_keep_snapshot(self):
+        self.authenticate(self.owner)
+        first = self.get()
+        self.assertNotIn('stock_quantity', json.loads(first.content)['products'][0])
+        generation = CatalogSnapshot.objects.get(pk=self.catalog.id).generation
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock([(self.products[0].id, Decimal('30'))])
+            sync_stock(self.supplier.id, [{'product_id': self.products[1].id, 'delta': '-10'}])
+        self.assertEqual(CatalogSnapshot.objects.get(pk=self.catalog.id).generation, generation)
+        self.assertEqual(self.get(if_none_match=first['ETag']).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(reverse('catalog-availability', args=[self.catalog.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        available = {item['id']: item['available_quantity'] for item in response.data['products']}
+        self.assertEqual(
+            [available[product.id] for product in self.products], ['70.00', '90.00', '100.00']
+        )
+
+    def test_availability_is_never_negative(self):
+        # учётная система выставила остаток ниже уже зарезервированного
+        reserve_stock([(self.products[0].id, Decimal('30'))])
+        sync_stock(self.supplier.id, [{'product_id': self.products[0].id, 'stock_quantity': '10'}])
+        self.authenticate(self.owner)
+        response = self.client.get(reverse('catalog-availability', args=[self.catalog.id]))
+        available = {item['id']: item['available_quantity'] for item in response.data['products']}
+        self.assertEqual(available[self.products[0].id], '0.00')
+        product = self.client.get(reverse('supplier-products', args=[self.supplier.id])).data[0]
+        self.assertEqual((product['id'], product['available_quantity']), (self.products[0].id, '0.00'))
+
+    def test_access_rules(self):
+        foreign = Catalog.objects.create(supplier=self.other_supplier, name="Foreign")
+        call_command('rebuild_catalog_snapshots', verbosity=0, stdout=io.StringIO())
+        self.assertTrue(CatalogSnapshot.objects.get(pk=foreign.id).is_fresh)
+
+        self.authenticate(self.consumer_user)
+        self.assertEqual(self.get().status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('catalog-detail', args=[foreign.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        availability = self.client.get(reverse('catalog-availability', args=[foreign.id]))
+        self.assertEqual(availability.status_code, status.HTTP_404_NOT_FOUND)
+
+        Catalog.objects.filter(pk=self.catalog.pk).update(is_active=False)
+        self.assertEqual(self.get().status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ProductSearchTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.foreign = Product.objects.create(
+            supplier=self.other_supplier, name="Milk foreign", unit='l', unit_price=Decimal('9.00')
+        )
+        self.cheese = Product.objects.create(
+            supplier=self.supplier, name="Cheese", sku="CH-1", unit='kg', unit_price=Decimal('30.00'),
+            description="Made from fresh milk",
+        )
+        self.url = reverse('product-search')
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return response.data
+
+    def test_consumer_searches_linked_suppliers_only(self):
+        self.authenticate(self.consumer_user)
+        data = self.search(q="milk")
+        ids = [item['id'] for item in data['results']]
+        self.assertNotIn(self.foreign.id, ids)
+        self.assertEqual(set(ids), {product.id for product in self.products} | {self.cheese.id})
+        # совпадение в названии выше, чем в описании
+        self.assertEqual(ids[-1], self.cheese.id)
+        self.assertIn('score', data['results'][0])
+
+    def test_matches_sku_and_category(self):
+        self.authenticate(self.consumer_user)
+        self.assertEqual([item['id'] for item in self.search(q="ch-1")['results']], [self.cheese.id])
+        self.assertEqual(len(self.search(q="dairy")['results']), 3)
+        self.assertEqual(len(self.search(q="food milk")['results']), 3)
+
+    def test_ranked_pages(self):
+        self.authenticate(self.consumer_user)
+        expected = [item['id'] for item in self.search(q="milk")['results']]
+        ids, next_url = [], f"{self.url}?q=milk&page_size=1"
+        while next_url:
+            data = self.client.get(next_url).data
+            ids.extend(item['id'] for item in data['results'])
+            next_url = data['next']
+        self.assertEqual(ids, expected)
+
+    def test_staff_and_filters(self):
+        self.authenticate(self.owner)
+        self.assertEqual(len(self.search(q="milk", supplier=self.other_supplier.id)['results']), 0)
+        self.assertEqual(
+            len(self.search(q="milk", supplier=f"{self.other_supplier.id},{self.supplier.id}")['results']), 4,
+        )
+        response = self.client.get(self.url, {'q': 'milk', 'supplier': '1,x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('supplier', response.data)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search(q="!!!")['results'], [])
+
+
+class ProductFacetTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        bakery = Category.objects.create(name="Bakery")
+        Product.objects.create(
+            supplier=self.supplier, category=bakery, name="Bread", unit='pcs', unit_price=Decimal('700'),
+            stock_quantity=Decimal('0'),
+        )
+        Product.objects.create(
+            supplier=self.supplier, category=bakery, name="Cake", unit='pcs', unit_price=Decimal('30000'),
+            is_available=False, stock_quantity=Decimal('5'),
+        )
+        self.url = reverse('supplier-products', args=[self.supplier.id])
+        self.authenticate(self.consumer_user)
+
+    def names(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return sorted(item['name'] for item in response.data)
+
+    def test_filters(self):
+        dairy = Category.objects.get(name="Dairy")
+        self.assertEqual(self.names(category=dairy.id), ["Milk 0", "Milk 1", "Milk 2"])
+        self.assertEqual(self.names(unit='pcs,kg'), ["Bread", "Cake"])
+        self.assertEqual(self.names(price_min='500', price_max='1000'), ["Bread"])
+        self.assertEqual(self.names(is_available='false'), ["Cake"])
+        self.assertEqual(self.names(in_stock='false'), ["Bread"])
+        self.assertEqual(self.names(unit='pcs', in_stock='true', is_available='true'), [])
+
+        for params in ({'price_min': 'abc'}, {'unit': 'ton'}, {'in_stock': 'maybe'}, {'category': 'x'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_in_stock_ignores_reserved_stock(self):
+        milk = Product.objects.get(name="Milk 0")
+        reserve_stock([(milk.id, milk.stock_quantity)])
+        self.assertEqual(self.names(in_stock='false'), ["Bread", "Milk 0"])
+        self.assertEqual(self.names(in_stock='true', unit='l'), ["Milk 1", "Milk 2"])
+
+    def test_category_missing_from_process_tree(self):
+        dairy = Category.objects.get(name="Dairy")
+        category_tree.get_tree()
+        # дерево этого процесса ещё не знает о категории (её создал другой процесс)
+        category_tree._state['nodes'].pop(dairy.id)
+        self.assertEqual(self.names(category=dairy.id), ["Milk 0", "Milk 1", "Milk 2"])
+        self.assertEqual(self.names(category=0), [])
+
+    def test_facets_in_one_query(self):
+        # scope + accepted links + page + facets
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, {'facets': 'true', 'page_size': 2, 'is_available': 'true'})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+        facets = response.data['facets']
+        self.assertEqual(
+            [(item['name'], item['count']) for item in facets['categories']],
+            [("Dairy", 3), ("Bakery", 1)],
+        )
+        self.assertEqual(
+            [(item['unit'], item['count']) for item in facets['units']],
+            [('l', 3), ('pcs', 1)],
+        )
+        self.assertEqual(
+            [(item['min'], item['max'], item['count']) for item in facets['price_buckets']],
+            [('0', '500', 3), ('500', '1000', 1)],
+        )
+
+    def test_facets_without_pagination(self):
+        data = self.client.get(self.url, {'facets': '1'}).data
+        self.assertEqual(len(data['results']), 5)
+        self.assertEqual(data['facets']['price_buckets'][-1], {'min': '25000', 'max': None, 'count': 1})
+
+
+class CategoryTreeTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.food = Category.objects.get(name="Food")
+        self.dairy = Category.objects.get(name="Dairy")
+        self.cheese = Category.objects.create(name="Cheese", parent=self.dairy)
+        self.drinks = Category.objects.create(name="Drinks")
+        Product.objects.create(
+            supplier=self.supplier, category=self.cheese, name="Brie", unit='kg', unit_price=Decimal('50')
+        )
+
+    def test_paths_follow_moves(self):
+        self.assertEqual(self.cheese.path, f"{self.food.id}/{self.dairy.id}/{self.cheese.id}/")
+        self.assertEqual(self.cheese.depth, 2)
+
+        self.dairy.parent = self.drinks
+        self.dairy.save()
+        self.cheese.refresh_from_db()
+        self.assertEqual(self.cheese.path, f"{self.drinks.id}/{self.dairy.id}/{self.cheese.id}/")
+        self.assertEqual(
+            set(self.drinks.descendants().values_list('name', flat=True)), {"Drinks", "Dairy", "Cheese"}
+        )
+
+        self.dairy.parent = None
+        self.dairy.save()
+        self.cheese.refresh_from_db()
+        self.assertEqual((self.cheese.path, self.cheese.depth), (f"{self.dairy.id}/{self.cheese.id}/", 1))
+
+    def test_cycles_are_rejected(self):
+        self.food.parent = self.cheese
+        with self.assertRaises(ValueError):
+            self.food.save()
+
+        self.authenticate(self.owner)
+        response = self.client.patch(
+            reverse('category-detail', args=[self.food.id]), {'parent': self.cheese.id}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tree_is_served_from_cache(self):
+        self.authenticate(self.owner)
+        url = reverse('category-tree')
+        tree = self.client.get(url).data
+        self.assertEqual([node['name'] for node in tree], ["Drinks", "Food"])
+        self.assertEqual(tree[1]['children'][0]['children'][0]['name'], "Cheese")
+
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('category-detail', args=[self.cheese.id]), {'name': "Cheeses"}, format='json')
+        tree = self.client.get(url).data
+        self.assertEqual(tree[1]['children'][0]['children'][0]['name'], "Cheeses")
+
+    def test_category_filter_includes_subcategories(self):
+        self.authenticate(self.consumer_user)
+        url = reverse('supplier-products', args=[self.supplier.id])
+        names = sorted(item['name'] for item in self.client.get(url, {'category': self.food.id}).data)
+        self.assertEqual(names, ["Brie", "Milk 0", "Milk 1", "Milk 2"])
+        names = [item['name'] for item in self.client.get(url, {'category': self.cheese.id}).data]
+        self.assertEqual(names, ["Brie"])
+
+
+class PricingTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.milk = self.products[0]
+
+    def discount(self, kind, value, start_days, end_days, product=None):
+        return ProductDiscount.objects.create(
+            product=product or self.milk,
+            discount_type=kind,
+            value=Decimal(value),
+            start_date=self.now + timedelta(days=start_days),
+            end_date=self.now + timedelta(days=end_days),
+        )
+
+    def test_best_active_discount_and_next_boundary(self):
+        self.discount('percentage', '15', -1, 3)
+        best = self.discount('fixed', '2', -2, 5)
+        self.discount('percentage', '50', 1, 2)   # ещё не началась
+        self.discount('fixed', '9', -5, -1)       # уже закончилась
+
+        price = ProductPrice.objects.get(product=self.milk)
+        self.assertEqual(price.effective_price, Decimal('8.00'))
+        self.assertEqual(price.discount_id, best.id)
+        # ближайшая граница: старт будущей скидки
+        self.assertEqual(price.valid_until, self.now + timedelta(days=1))
+
+        pricing.refresh_due_prices(at=self.now + timedelta(days=1, hours=1))
+        price.refresh_from_db()
+        self.assertEqual(price.effective_price, Decimal('5.00'))
+        self.assertEqual(price.valid_until, self.now + timedelta(days=2))
+
+    def test_price_follows_product_and_discount_changes(self):
+        discount = self.discount('percentage', '10', -1, 1)
+        self.assertEqual(ProductPrice.objects.get(product=self.milk).effective_price, Decimal('9.00'))
+
+        self.milk.unit_price = Decimal('20.00')
+        self.milk.save()
+        self.assertEqual(ProductPrice.objects.get(product=self.milk).effective_price, Decimal('18.00'))
+
+        discount.delete()
+        self.assertEqual(ProductPrice.objects.get(product=self.milk).effective_price, Decimal('20.00'))
+
+        product = Product.objects.create(supplier=self.supplier, name="Temp", unit_price=Decimal('5'))
+        self.discount('fixed', '1', -1, 1, product=product)
+        product.delete()
+        self.assertFalse(ProductPrice.objects.filter(product_id=product.id).exists())
+
+    def test_payload_and_order_use_effective_price(self):
+        self.discount('percentage', '20', -1, 1)
+        self.authenticate(self.consumer_user)
+
+        products = self.client.get(reverse('supplier-products', args=[self.supplier.id])).data
+        prices = {item['id']: item['effective_price'] for item in products}
+        self.assertEqual(prices[self.milk.id], '8.00')
+        self.assertEqual(prices[self.products[1].id], '10.00')
+
+        response = self.client.post(
+            reverse('order-list-create'),
+            {
+                'supplier_id': self.supplier.id,
+                'items': [
+                    {'product_id': self.milk.id, 'quantity': '2', 'unit_price': '0.01'},
+                    {'product_id': self.products[1].id, 'quantity': '1'},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        self.assertEqual([item['unit_price'] for item in response.data['items']], ['8.00', '10.00'])
+        self.assertEqual(response.data['total_amount'], '26.00')
+
+    def test_outdated_rows_are_recomputed_on_lookup(self):
+        ProductPrice.objects.filter(product=self.milk).update(
+            effective_price=Decimal('1.00'), valid_until=self.now - timedelta(minutes=1)
+        )
+        ProductPrice.objects.filter(product=self.products[1]).delete()
+        prices = pricing.get_effective_prices([product.id for product in self.products])
+        self.assertEqual(set(prices.values()), {Decimal('10.00')})
+
+
+class PriceImportTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.milk = self.products[0]
+        self.milk.sku = 'MILK-0'
+        self.milk.save()
+        self.url = reverse('supplier-products-import', args=[self.supplier.id])
+
+    def upload(self, content, name='prices.csv', **data):
+        fileobj = io.BytesIO(content if isinstance(content, bytes) else content.encode('utf-8'))
+        fileobj.name = name
+        return self.client.post(self.url, {'file': fileobj, **data}, format='multipart')
+
+    def test_csv_creates_updates_and_reports_bad_rows(self):
+        self.authenticate(self.owner)
+        response = self.upload(
+            "SKU;Name;Unit;Price;Stock;Category\n"
+            "MILK-0;;;12,50;;\n"                              # только цена
+            "KEF-1;Kefir;l;7.00;20;\n"
+            "BAD-1;Broken;l;abc;;\n"
+            "NEW-1;No price;kg;;;\n"
+            "CAT-1;Lost;kg;1;;999999\n"
+            f"KEF-1;Kefir 1%;l;8.00;20;{self.milk.category_id}\n"                     # повтор: отклоняется
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(
+            {key: response.data[key] for key in ('rows', 'created', 'updated', 'error_count')},
+            {'rows': 6, 'created': 1, 'updated': 1, 'error_count': 4},
+        )
+        self.assertEqual([error['line'] for error in response.data['errors']], [4, 5, 6, 7])
+
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.unit_price, Decimal('12.50'))
+        self.assertEqual(self.milk.name, 'Milk 0')
+        self.assertEqual(self.milk.stock_quantity, Decimal('100'))
+        self.assertEqual(ProductPrice.objects.get(product=self.milk).effective_price, Decimal('12.50'))
+
+        kefir = Product.objects.get(supplier=self.supplier, sku='KEF-1')
+        self.assertEqual((kefir.name, kefir.unit_price, kefir.category_id), ('Kefir', Decimal('7.00'), None))
+        self.assertEqual(ProductPrice.objects.get(product=kefir).effective_price, Decimal('7.00'))
+
+    def test_repeated_sku_in_a_later_batch_is_rejected(self):
+        self.authenticate(self.owner)
+        rows = "".join(f"FILL-{i},Filler,1\n" for i in range(3))
+        with mock.patch.object(price_import, 'BATCH_SIZE', 2):
+            response = self.upload(f"sku,name,unit_price\nMILK-0,,11\n{rows}MILK-0,Renamed,99\n")
+        self.assertEqual(
+            {key: response.data[key] for key in ('rows', 'created', 'updated', 'error_count')},
+            {'rows': 5, 'created': 3, 'updated': 1, 'error_count': 1},
+        )
+        self.assertEqual(response.data['errors'][0]['line'], 6)
+        self.milk.refresh_from_db()
+        self.assertEqual((self.milk.name, self.milk.unit_price), ('Milk 0', Decimal('11.00')))
+
+    def test_import_marks_catalog_snapshots(self):
+        catalog = Catalog.objects.create(supplier=self.supplier, name="Main")
+        CatalogProduct.objects.create(catalog=catalog, product=self.milk)
+        call_command('rebuild_catalog_snapshots', verbosity=0, stdout=io.StringIO())
+        self.assertTrue(CatalogSnapshot.objects.get(catalog=catalog).is_fresh)
+
+        self.authenticate(self.owner)
+        self.upload("sku,unit_price\nMILK-0,11\n")
+        self.assertFalse(CatalogSnapshot.objects.get(catalog=catalog).is_fresh)
+
+    @unittest.skipIf(openpyxl is None, "openpyxl is not installed")
+    def test_xlsx(self):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(['sku', 'name', 'unit_price', 'is_available'])
+        sheet.append(['MILK-0', None, 9.9, 'no'])
+        sheet.append([1001, 'Cheese', 30, None])
+        content = io.BytesIO()
+        workbook.save(content)
+
+        self.authenticate(self.owner)
+        response = self.upload(content.getvalue(), name='prices.xlsx')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual((response.data['created'], response.data['updated']), (1, 1))
+        self.milk.refresh_from_db()
+        self.assertEqual((self.milk.unit_price, self.milk.is_available), (Decimal('9.90'), False))
+        self.assertTrue(Product.objects.filter(supplier=self.supplier, sku='1001', name='Cheese').exists())
+
+    def test_progress_and_command(self):
+        self.authenticate(self.owner)
+        self.upload("sku,unit_price\nMILK-0,11\n", import_id='abc')
+        progress = self.client.get(self.url, {'import_id': 'abc'}).data
+        self.assertEqual(progress, {'rows': 1, 'created': 0, 'updated': 1, 'error_count': 0, 'done': True})
+
+        path = self.create_temp_csv("sku,name,unit_price\nCMD-1,From command,3\n")
+        out = io.StringIO()
+        call_command('import_price_list', self.supplier.id, path, stdout=out)
+        self.assertIn("1 created", out.getvalue())
+        self.assertTrue(Product.objects.filter(supplier=self.supplier, sku='CMD-1').exists())
+
+    def create_temp_csv(self, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'prices.csv')
+        with open(path, 'w', encoding='utf-8') as fileobj:
+            fileobj.write(content)
+        return path
+
+    def test_permissions_and_bad_files(self):
+        self.authenticate(self.consumer_user)
+        self.assertEqual(self.upload("sku\n").status_code, status.HTTP_403_FORBIDDEN)
+
+        self.url = reverse('supplier-products-import', args=[self.other_supplier.id])
+        self.authenticate(self.owner)
+        self.assertEqual(self.upload("sku\n").status_code, status.HTTP_403_FORBIDDEN)
+
+        self.url = reverse('supplier-products-import', args=[self.supplier.id])
+        self.assertEqual(self.upload("name,price\nx,1\n").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.upload("sku\n", name='prices.pdf').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class InventorySyncTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.milk = self.products[0]
+        self.milk.sku = 'MILK-0'
+        self.milk.save()
+        self.url = reverse('supplier-inventory-sync', args=[self.supplier.id])
+
+    def sync(self, records):
+        return self.client.post(self.url, records, format='json')
+
+    def test_batch_applies_absolute_values_and_deltas(self):
+        foreign = Product.objects.create(supplier=self.other_supplier, name="Foreign", unit_price=Decimal('1'))
+        self.authenticate(self.owner)
+        response = self.sync([
+            {'sku': 'MILK-0', 'stock_quantity': '50'},
+            {'product_id': self.milk.id, 'delta': '-5.5'},
+            {'product_id': self.products[1].id, 'delta': -30},
+            {'product_id': self.products[2].id, 'delta': '-101'},
+            {'product_id': foreign.id, 'stock_quantity': 1},
+            {'sku': 'MILK-0', 'stock_quantity': '-1'},
+            {'sku': 'MILK-0'},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual((response.data['updated'], response.data['errors']), (2, 4))
+
+        results = response.data['results']
+        self.assertEqual(results[0]['stock_quantity'], '44.50')
+        self.assertEqual(results[1]['stock_quantity'], '44.50')
+        self.assertEqual(results[2]['stock_quantity'], '70.00')
+        self.assertEqual(results[3]['error'], "stock would fall out of range")
+        self.assertEqual(results[4]['error'], "product not found")
+        self.assertIn('stock_quantity', results[5]['error'])
+        self.assertIn('exactly one', results[6]['error'])
+
+        stock = dict(Product.objects.filter(supplier=self.supplier).values_list('id', 'stock_quantity'))
+        self.assertEqual(
+            [stock[product.id] for product in self.products],
+            [Decimal('44.50'), Decimal('70.00'), Decimal('100.00')],
+        )
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.stock_quantity, Decimal('0'))
+
+    def test_queries_do_not_grow_with_batch(self):
+        self.authenticate(self.owner)
+        self.sync([{'product_id': self.milk.id, 'delta': '1'}])
+        products = Product.objects.bulk_create(
+            Product(supplier=self.supplier, name=f"Bulk {i}", unit_price=Decimal('1')) for i in range(50)
+        )
+        # поставщик, резолв, блокировка, UPDATE + savepoint'ы транзакции; снимки каталогов не трогаются
+        with self.assertNumQueries(6):
+            response = self.sync([{'product_id': product.id, 'stock_quantity': '5'} for product in products])
+        self.assertEqual(response.data['updated'], 50)
+
+    def test_permissions_and_bad_payloads(self):
+        self.authenticate(self.consumer_user)
+        self.assertEqual(self.sync([]).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.authenticate(self.owner)
+        other = reverse('supplier-inventory-sync', args=[self.other_supplier.id])
+        self.assertEqual(self.client.post(other, [], format='json').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.sync({'items': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.sync({'items': []}).data, {'updated': 0, 'errors': 0, 'results': []})
+
+
+class ImageVariantsTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        super().setUp()
+        self.milk = self.products[0]
+
+    def upload(self, name, size=(2000, 1000), mode='RGB'):
+        content = io.BytesIO()
+        Image.new(mode, size, (200, 30, 30, 128)[:len(mode)]).save(content, 'PNG')
+        return SimpleUploadedFile(name, content.getvalue(), content_type='image/png')
+
+    def test_variants_are_built_after_upload(self):
+        self.milk.image = self.upload('milk.png', mode='RGBA')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.milk.save()
+
+        variants = Product.objects.get(pk=self.milk.pk).image_variants
+        self.assertEqual(variants['source'], self.milk.image.name)
+        self.assertEqual(
+            {name: (variants[name]['width'], variants[name]['height']) for name in ('thumb', 'list', 'detail')},
+            {'thumb': (160, 80), 'list': (480, 240), 'detail': (1200, 600)},
+        )
+        self.assertTrue(variants['placeholder'].startswith('data:image/jpeg;base64,'))
+        storage = Product._meta.get_field('image').storage
+        with storage.open(variants['thumb']['webp']) as fileobj:
+            self.assertEqual(Image.open(fileobj).format, 'WEBP')
+        with storage.open(variants['detail']['jpeg']) as fileobj:
+            self.assertEqual(Image.open(fileobj).size, (1200, 600))
+
+        self.authenticate(self.consumer_user)
+        item = self.client.get(reverse('supplier-products', args=[self.supplier.id])).data[0]
+        self.assertEqual(item['id'], self.milk.id)
+        self.assertTrue(item['image_variants']['list']['webp'].startswith('http://testserver/media/derivatives/'))
+        self.assertEqual(item['image_variants']['placeholder'], variants['placeholder'])
+
+    def test_replaced_image_drops_old_files(self):
+        storage = Product._meta.get_field('image').storage
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                supplier=self.supplier, name="Cheese", unit_price=Decimal('5'), image=self.upload('first.png'),
+            )
+        first = Product.objects.get(pk=product.pk).image_variants
+
+        product = Product.objects.get(pk=product.pk)
+        product.image = self.upload('second.png', size=(100, 50))
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        second = Product.objects.get(pk=product.pk).image_variants
+        self.assertFalse(storage.exists(first['thumb']['webp']))
+        self.assertTrue(storage.exists(second['thumb']['webp']))
+        # маленькую картинку не увеличиваем
+        self.assertEqual((second['detail']['width'], second['detail']['height']), (100, 50))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=product.pk).delete()
+        self.assertFalse(storage.exists(second['thumb']['jpeg']))
+
+    def test_replaced_image_keeps_thumbs_of_order_lines(self):
+        storage = Product._meta.get_field('image').storage
+        self.milk.image = self.upload('milk.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.milk.save()
+        first = Product.objects.get(pk=self.milk.pk).image_variants
+        order = Order.objects.create(consumer=self.consumer, supplier=self.supplier, total_amount=Decimal('10'))
+        item = OrderItem.objects.create(
+            order=order, product=Product.objects.get(pk=self.milk.pk), quantity=Decimal('1'),
+            unit_price=Decimal('10'), line_total=Decimal('10'),
+        )
+        self.assertEqual(item.product_thumb['jpeg'], first['thumb']['jpeg'])
+
+        product = Product.objects.get(pk=self.milk.pk)
+        product.image = self.upload('milk-new.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        # снимок строки заказа по-прежнему показывает старую картинку
+        self.assertTrue(storage.exists(first['thumb']['webp']))
+        self.assertTrue(storage.exists(first['thumb']['jpeg']))
+        self.assertFalse(storage.exists(first['list']['webp']))
+        self.assertNotEqual(Product.objects.get(pk=self.milk.pk).image_variants['thumb']['jpeg'], first['thumb']['jpeg'])
+
+    def test_supplier_logo_and_backfill_command(self):
+        # файл уже лежит в хранилище, вариантов ещё нет (как у старых записей)
+        name = SupplierProfile._meta.get_field('logo').storage.save('supplier_logos/logo.png', self.upload('logo.png'))
+        SupplierProfile.objects.filter(pk=self.supplier.pk).update(logo=name)
+
+        call_command('build_image_derivatives', stdout=io.StringIO())
+        supplier = next(
+            item for item in self.client.get(reverse('supplier-list')).data if item['id'] == self.supplier.id
+        )
+        self.assertEqual(supplier['logo_variants']['thumb']['width'], 160)
+
+        broken = SupplierProfile._meta.get_field('logo').storage.save('supplier_logos/broken.png', io.BytesIO(b'nope'))
+        SupplierProfile.objects.filter(pk=self.other_supplier.pk).update(logo=broken)
+        with self.assertLogs('scp_project.images', 'WARNING'):
+            call_command('build_image_derivatives', stdout=io.StringIO())
+        self.assertIn('error', SupplierProfile.objects.get(pk=self.other_supplier.pk).logo_variants)
+
+
+class CatalogSyncTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.catalog = Catalog.objects.create(supplier=self.supplier, name="Main")
+        self.entries = [CatalogProduct.objects.create(catalog=self.catalog, product=p) for p in self.products]
+        self.url = reverse('supplier-catalog-changes', args=[self.supplier.id])
+        # всё, что было до синхронизации, давно не менялось
+        hour_ago = timezone.now() - timedelta(hours=1)
+        for model in (Product, Category, Catalog, CatalogProduct, ProductDiscount):
+            model.objects.update(updated_at=hour_ago)
+        DeletionLog.objects.update(deleted_at=hour_ago)
+
+    def sync(self, token=None):
+        return self.client.get(self.url, {'since': token} if token else {})
+
+    def test_full_then_incremental(self):
+        self.authenticate(self.consumer_user)
+        full = self.sync().data
+        self.assertTrue(full['reset'])
+        self.assertEqual(len(full['products']), 3)
+        self.assertEqual(len(full['catalog_products']), 3)
+        self.assertEqual({c['name'] for c in full['categories']}, {"Food", "Dairy"})
+
+        warm = self.sync(full['token']).data
+        self.assertFalse(warm['reset'])
+        for key in ('products', 'catalogs', 'catalog_products', 'discounts', 'categories'):
+            self.assertEqual(warm[key], [], key)
+            self.assertEqual(warm['deleted'][key], [], key)
+
+        milk = Product.objects.get(pk=self.products[0].pk)
+        milk.name = "Milk 3.2%"
+        milk.save()
+        removed_entry = self.entries[1].id
+        self.entries[1].delete()
+        discount = ProductDiscount.objects.create(
+            product=self.products[2], discount_type='fixed', value=Decimal('1'),
+            start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=1),
+        )
+        temp = Product.objects.create(supplier=self.supplier, name="Temp", unit_price=Decimal('1'))
+        temp_id = temp.id
+        temp.delete()
+
+        changes = self.sync(warm['token']).data
+        # товар со скидкой тоже изменился: у него новая effective_price
+        self.assertEqual(
+            {(p['id'], p['effective_price']) for p in changes['products']},
+            {(milk.id, '10.00'), (self.products[2].id, '9.00')},
+        )
+        self.assertEqual([d['id'] for d in changes['discounts']], [discount.id])
+        self.assertEqual(changes['deleted']['catalog_products'], [removed_entry])
+        self.assertEqual(changes['deleted']['products'], [temp_id])
+        self.assertEqual(changes['catalogs'], [])
+
+    def test_stock_changes_are_not_resent(self):
+        self.authenticate(self.consumer_user)
+        full = self.sync().data
+        self.assertNotIn('stock_quantity', full['products'][0])
+        self.assertNotIn('available_quantity', full['products'][0])
+
+        milk, kefir = self.products[0].id, self.products[1].id
+        reserve_stock([(milk, Decimal('5'))])
+        decrement_stock([(milk, Decimal('2'))], held={milk: Decimal('2')})
+        release_reserved({milk: Decimal('3')})
+        sync_stock(self.supplier.id, [{'product_id': kefir, 'delta': '-10'}])
+        self.assertEqual(self.sync(full['token']).data['products'], [])
+
+    def test_category_rename_and_catalog_visibility(self):
+        self.authenticate(self.consumer_user)
+        token = self.sync().data['token']
+
+        food = Category.objects.get(name="Food")
+        food.name = "Groceries"
+        food.save()
+        self.catalog.is_active = False
+        self.catalog.save()
+
+        changes = self.sync(token).data
+        # у подкатегории и товаров в ней поменялось имя родителя
+        self.assertEqual({c['name'] for c in changes['categories']}, {"Groceries", "Dairy"})
+        self.assertEqual(len(changes['products']), 3)
+        self.assertEqual(changes['products'][0]['category']['parent_name'], "Groceries")
+        self.assertEqual(changes['catalogs'], [])
+        self.assertEqual(changes['deleted']['catalogs'], [self.catalog.id])
+
+        self.authenticate(self.owner)
+        staff = self.sync(token).data
+        self.assertEqual([c['is_active'] for c in staff['catalogs']], [False])
+
+        Category.objects.get(name="Dairy").delete()
+        changes = self.sync(token).data
+        self.assertIn(self.products[0].category_id, changes['deleted']['categories'])
+        self.assertEqual({p['category'] for p in changes['products']}, {None})
+
+    def test_tokens_and_access(self):
+        self.authenticate(self.consumer_user)
+        self.assertEqual(self.sync('nonsense').status_code, status.HTTP_400_BAD_REQUEST)
+        stale = sync.make_token(timezone.now() - timedelta(days=365))
+        self.assertTrue(self.sync(stale).data['reset'])
+
+        other = reverse('supplier-catalog-changes', args=[self.other_supplier.id])
+        self.assertEqual(self.client.get(other).status_code, status.HTTP_403_FORBIDDEN)
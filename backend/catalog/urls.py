@@ -1,11 +1,16 @@
 from django.urls import path
 from .views import (
     SupplierProductListView,
+    ProductSearchView,
     SupplierCatalogListView,
     CatalogDetailView,
+    CatalogAvailabilityView,
     ProductCreateView,
     ProductUpdateView,
     ProductDeleteView,
+    ProductImportView,
+    InventorySyncView,
+    CatalogChangesView,
     CategoryViewSet,
 )
 from rest_framework.routers import DefaultRouter
@@ -19,6 +24,22 @@ urlpatterns = [
         SupplierProductListView.as_view(),
         name='supplier-products'
     ),
+    path(
+        'suppliers/<int:supplier_id>/products/import/',
+        ProductImportView.as_view(),
+        name='supplier-products-import'
+    ),
+    path(
+        'suppliers/<int:supplier_id>/inventory/',
+        InventorySyncView.as_view(),
+        name='supplier-inventory-sync'
+    ),
+    path(
+        'suppliers/<int:supplier_id>/changes/',
+        CatalogChangesView.as_view(),
+        name='supplier-catalog-changes'
+    ),
+    path('search/', ProductSearchView.as_view(), name='product-search'),
     path(
         'suppliers/<int:supplier_id>/catalogs/',
         SupplierCatalogListView.as_view(),
@@ -29,6 +50,11 @@ urlpatterns = [
         CatalogDetailView.as_view(),
         name='catalog-detail'
     ),
+    path(
+        'catalogs/<int:pk>/availability/',
+        CatalogAvailabilityView.as_view(),
+        name='catalog-availability'
+    ),
     # Product CRUD
     path('products/create/', ProductCreateView.as_view(), name='product-create'),
     path('products/<int:pk>/update/', ProductUpdateView.as_view(), name='product-update'),
@@ -1,71 +1,144 @@
+import gzip
+import re
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
 from rest_framework import generics, permissions, status
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from rest_framework.generics import CreateAPIView, UpdateAPIView, DestroyAPIView
 from rest_framework.permissions import BasePermission
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
 from .models import Category
 from .serializers import CategorySerializer
 
-from .models import Product, Catalog, Category
+from .models import Product, Catalog, CatalogProduct, Category
 from .serializers import (
     ProductSerializer,
+    ProductSearchSerializer,
     CatalogWithProductsSerializer,
     CategorySerializer,
+    available_quantity,
 )
 
-from accounts.models import (
-    SupplierProfile,
-    SupplierStaff,
-    ConsumerProfile,
-    ConsumerSupplierLink,
-)
+from accounts.models import SupplierProfile
+from accounts.scope import get_access_scope
+from scp_project import params as query
+from scp_project.fieldsets import SparseFieldsetViewMixin
+from scp_project.pagination import KeysetPagination
+from . import category_tree, snapshots, sync
+from .filters import filter_products, product_facets
+from .inventory import MAX_RECORDS as MAX_INVENTORY_RECORDS, sync_stock
+from .price_import import PriceListError, import_price_list
+from .search import search_products
 
 
 
-class SupplierProductListView(generics.ListAPIView):
+class SupplierProductListView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     Список всех продуктов конкретного поставщика.
     Доступ:
       - superuser
       - staff этого поставщика
       - consumer с accepted-линком к этому поставщику
+
+    Фильтры: ?category=&unit=&price_min=&price_max=&is_available=&in_stock=
+    Компактные строки: ?fields=id,name,effective_price&expand= (scp_project/fieldsets.py).
+    С ?facets=true в ответе ещё и счётчики по категориям, единицам и ценам
+    (см. catalog/filters.py): {"results": [...], "facets": {...}}.
     """
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('name', 'id')
 
     def get_queryset(self):
         supplier_id = self.kwargs.get('supplier_id')
-        user = self.request.user
+        scope = get_access_scope(self.request)
 
-        base_qs = Product.objects.filter(supplier_id=supplier_id).select_related('category')
+        base_qs = Product.objects.filter(supplier_id=supplier_id).select_related('category__parent', 'price')
 
         # 1) суперюзер видит всё
-        if user.is_superuser:
+        if scope.is_superuser:
             return base_qs
 
         # 2) staff этого поставщика
-        if SupplierStaff.objects.filter(user=user, supplier_id=supplier_id).exists():
+        if scope.is_staff_of(supplier_id):
             return base_qs
 
         # 3) consumer с accepted-линком
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
+        if not scope.is_consumer:
             raise PermissionDenied("У вас нет доступа к каталогу этого поставщика (нет ConsumerProfile).")
 
-        has_link = ConsumerSupplierLink.objects.filter(
-            consumer=consumer_profile,
-            supplier_id=supplier_id,
-            status='accepted',
-        ).exists()
-
-        if not has_link:
+        if not scope.has_accepted_link(supplier_id):
             raise PermissionDenied("Нет одобренной связи с этим поставщиком.")
 
         return base_qs
 
+    def filter_queryset(self, queryset):
+        return filter_products(super().filter_queryset(queryset), self.request.query_params)
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if request.query_params.get('facets', '').lower() in ('1', 'true', 'yes'):
+            if isinstance(response.data, list):
+                response.data = {'results': response.data}
+            response.data['facets'] = product_facets(self.filter_queryset(self.get_queryset()))
+        return response
+
+
+class ProductSearchPagination(KeysetPagination):
+    opt_in = False
+    page_size = 20
+    max_page_size = 100
+
+
+class ProductSearchView(SparseFieldsetViewMixin, generics.ListAPIView):
+    """
+    Поиск товаров по всем поставщикам, доступным пользователю.
+    GET /api/catalog/search/?q=молоко&supplier=<id,...>
+
+    Ищет по названию, SKU, категориям и описанию (catalog/search.py),
+    результаты отсортированы по релевантности, страницы — через cursor.
+    Доступ:
+      - superuser: все поставщики
+      - staff: свои поставщики
+      - consumer: поставщики с accepted-линком
+    """
+    serializer_class = ProductSearchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ProductSearchPagination
+    keyset_ordering = ('-score', 'id')
+    max_query_length = 200
+
+    def get_queryset(self):
+        text = self.request.query_params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': 'Укажите строку поиска.'})
+        text = text[:self.max_query_length]
+
+        scope = get_access_scope(self.request)
+        qs = Product.objects.select_related('category__parent', 'price').defer('search_vector')
+
+        if scope.is_superuser:
+            pass
+        elif scope.supplier_ids:
+            qs = qs.filter(supplier_id__in=scope.supplier_ids)
+        elif scope.is_consumer:
+            qs = qs.filter(supplier_id__in=scope.accepted_supplier_ids)
+        else:
+            qs = qs.none()
+
+        supplier_ids = query.ids(self.request.query_params, 'supplier')
+        if supplier_ids:
+            qs = qs.filter(supplier_id__in=supplier_ids)
+
+        return search_products(qs, text)
+
 
 class SupplierCatalogListView(generics.ListAPIView):
     """
@@ -77,81 +150,148 @@ class SupplierCatalogListView(generics.ListAPIView):
 
     def get_queryset(self):
         supplier_id = self.kwargs.get('supplier_id')
-        user = self.request.user
+        scope = get_access_scope(self.request)
 
         base_qs = Catalog.objects.filter(supplier_id=supplier_id, is_active=True)
 
         # 1) суперюзер
-        if user.is_superuser:
+        if scope.is_superuser:
             return base_qs
 
         # 2) staff этого поставщика
-        if SupplierStaff.objects.filter(user=user, supplier_id=supplier_id).exists():
+        if scope.is_staff_of(supplier_id):
             return base_qs
 
         # 3) consumer с accepted-линком
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
+        if not scope.is_consumer:
             raise PermissionDenied("У вас нет доступа к каталогам этого поставщика (нет ConsumerProfile).")
 
-        has_link = ConsumerSupplierLink.objects.filter(
-            consumer=consumer_profile,
-            supplier_id=supplier_id,
-            status='accepted',
-        ).exists()
-
-        if not has_link:
+        if not scope.has_accepted_link(supplier_id):
             raise PermissionDenied("Нет одобренной связи с этим поставщиком.")
 
         return base_qs
 
 
 
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
 class CatalogDetailView(generics.RetrieveAPIView):
     """
     Один каталог + вложенные продукты.
     Доступ только если пользователь имеет право видеть каталоги этого поставщика.
+    Ответ — готовый снимок каталога (catalog/snapshots.py) со строгим ETag.
     """
     serializer_class = CatalogWithProductsSerializer
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = 'pk'
 
     def get_queryset(self):
-        user = self.request.user
+        scope = get_access_scope(self.request)
         base_qs = Catalog.objects.all().select_related('supplier')
 
         # 1) суперюзер
-        if user.is_superuser:
+        if scope.is_superuser:
             return base_qs
 
-        # 2) staff: собираем supplier_id для этого пользователя
-        staff_supplier_ids = SupplierStaff.objects.filter(
-            user=user
-        ).values_list('supplier_id', flat=True)
+        # 2) staff: supplier_id этого пользователя
+        if scope.supplier_ids:
+            return base_qs.filter(supplier_id__in=scope.supplier_ids)
 
-        if staff_supplier_ids:
-            return base_qs.filter(supplier_id__in=staff_supplier_ids)
-
-        # 3) consumer: собираем поставщиков, с которыми есть accepted-линк
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
+        # 3) consumer: поставщики, с которыми есть accepted-линк
+        if not scope.is_consumer:
             # вообще ничего не видит
             return Catalog.objects.none()
 
-        accepted_supplier_ids = ConsumerSupplierLink.objects.filter(
-            consumer=consumer_profile,
-            status='accepted',
-        ).values_list('supplier_id', flat=True)
+        return base_qs.filter(supplier_id__in=scope.accepted_supplier_ids, is_active=True)
+
+    def retrieve(self, request, *args, **kwargs):
+        catalog_id = self.kwargs[self.lookup_field]
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+
+        # свежий снимок видимого пользователю каталога; для условного запроса — только etag
+        snapshot = snapshots.get_fresh(self.get_queryset(), catalog_id, with_content=if_none_match is None)
+        if snapshot is None:
+            # снимка нет или он устарел: проверяем доступ (404) и собираем заново
+            built = snapshots.rebuild(self.get_object().id)
+            snapshot = (built.etag, built.content)
+        etag, content = snapshot
+
+        use_gzip = bool(ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+        if if_none_match is not None:
+            tags = parse_etags(if_none_match)
+            if '*' in tags or self.snapshot_etag(etag, use_gzip) in tags:
+                return self.with_cache_headers(HttpResponseNotModified(), etag, use_gzip)
+
+        if content is None:
+            content = snapshots.get_content(catalog_id, etag)
+        if content is None:
+            # каталог изменился между запросами
+            built = snapshots.rebuild(catalog_id)
+            etag, content = built.etag, built.content
+
+        if use_gzip:
+            response = HttpResponse(content, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(content), content_type='application/json')
+        return self.with_cache_headers(response, etag, use_gzip)
+
+    @staticmethod
+    def snapshot_etag(etag, use_gzip):
+        # у сжатого и несжатого представления разные строгие ETag
+        return quote_etag(f"{etag}-gzip" if use_gzip else etag)
+
+    def with_cache_headers(self, response, etag, use_gzip):
+        response['ETag'] = self.snapshot_etag(etag, use_gzip)
+        patch_vary_headers(response, ['Accept-Encoding'])
+        # клиент хранит копию, но каждый раз сверяет ETag (доступ зависит от пользователя)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class CatalogAvailabilityView(CatalogDetailView):
+    """
+    Остатки товаров каталога: GET /api/catalog/catalogs/<id>/availability/
+    {"catalog": id, "products": [{"id", "available_quantity", "is_available"}, ...]}
+    В снимке каталога остатков нет (они меняются с каждым заказом), клиент берёт их здесь.
+    Доступ как у CatalogDetailView.
+    """
 
-        return base_qs.filter(supplier_id__in=accepted_supplier_ids, is_active=True)
+    def retrieve(self, request, *args, **kwargs):
+        catalog = self.get_object()
+        rows = (
+            CatalogProduct.objects
+            .filter(catalog=catalog)
+            .order_by('display_order', 'added_at', 'id')
+            .values_list('product_id', 'product__stock_quantity', 'product__reserved_quantity', 'product__is_available')
+        )
+        return Response({
+            'catalog': catalog.id,
+            'products': [
+                {
+                    'id': product_id,
+                    'available_quantity': available_quantity(stock, reserved),
+                    'is_available': is_available,
+                }
+                for product_id, stock, reserved, is_available in rows
+            ],
+        })
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.all().order_by("name")
+    queryset = Category.objects.all().select_related('parent').order_by("name")
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('name', 'id')
+
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """
+        Всё дерево категорий с вложенными children.
+        Отдаётся из кэша процесса (catalog/category_tree.py), без запросов к БД.
+        """
+        return Response(category_tree.get_tree())
 
 
 class IsSupplierManagerOrOwner(BasePermission):
@@ -165,10 +305,10 @@ class ProductCreateView(CreateAPIView):
     permission_classes = [IsSupplierManagerOrOwner]
 
     def perform_create(self, serializer):
-        user = self.request.user
+        scope = get_access_scope(self.request)
         supplier_id = self.request.data.get('supplier')
         # Only allow managers/owners to add products for their supplier
-        if not user.is_superuser and not SupplierStaff.objects.filter(user=user, supplier_id=supplier_id).exists():
+        if not scope.is_superuser and not scope.is_staff_of(supplier_id):
             raise PermissionDenied('You can only add products for your own supplier.')
         serializer.save()
 
@@ -179,8 +319,8 @@ class ProductUpdateView(UpdateAPIView):
 
     def get_object(self):
         obj = super().get_object()
-        user = self.request.user
-        if not user.is_superuser and not SupplierStaff.objects.filter(user=user, supplier=obj.supplier).exists():
+        scope = get_access_scope(self.request)
+        if not scope.is_superuser and not scope.is_staff_of(obj.supplier_id):
             raise PermissionDenied('You can only edit products for your own supplier.')
         return obj
 
@@ -191,7 +331,127 @@ class ProductDeleteView(DestroyAPIView):
 
     def get_object(self):
         obj = super().get_object()
-        user = self.request.user
-        if not user.is_superuser and not SupplierStaff.objects.filter(user=user, supplier=obj.supplier).exists():
+        scope = get_access_scope(self.request)
+        if not scope.is_superuser and not scope.is_staff_of(obj.supplier_id):
             raise PermissionDenied('You can only delete products for your own supplier.')
         return obj
+
+def check_supplier_staff(request, supplier_id):
+    """Только staff этого поставщика или superuser; поставщик должен существовать."""
+    scope = get_access_scope(request)
+    if not scope.is_superuser and not scope.is_staff_of(supplier_id):
+        raise PermissionDenied('You can only manage products of your own supplier.')
+    if not SupplierProfile.objects.filter(pk=supplier_id).exists():
+        raise NotFound('Supplier not found.')
+
+
+class ProductImportView(APIView):
+    """
+    Импорт прайс-листа поставщика (CSV или XLSX), см. catalog/price_import.py.
+
+    POST multipart: file=<прайс-лист>, import_id=<любая строка, необязательно>
+      -> {"rows", "created", "updated", "error_count", "errors": [{"line", "sku", "error"}]}
+    Строки с ошибками пропускаются, остальные импортируются.
+
+    Пока импорт идёт, GET ?import_id=<тот же id> отдаёт прогресс
+    ({"rows", "created", "updated", "error_count", "done"}).
+    """
+    permission_classes = [IsSupplierManagerOrOwner]
+    parser_classes = [MultiPartParser]
+    progress_timeout = 60 * 60
+
+    @staticmethod
+    def progress_key(supplier_id, import_id):
+        return f'catalog:price-import:{supplier_id}:{import_id}'
+
+    def get(self, request, supplier_id):
+        check_supplier_staff(request, supplier_id)
+        import_id = request.query_params.get('import_id')
+        progress = cache.get(self.progress_key(supplier_id, import_id)) if import_id else None
+        if progress is None:
+            raise NotFound('Import not found.')
+        return Response(progress)
+
+    def post(self, request, supplier_id):
+        check_supplier_staff(request, supplier_id)
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': 'Нужен файл прайс-листа (.csv или .xlsx).'})
+
+        import_id = request.data.get('import_id')
+        report = self.progress_reporter(supplier_id, import_id) if import_id else None
+        try:
+            result = import_price_list(supplier_id, upload.file, upload.name, progress=report)
+        except PriceListError as exc:
+            raise ValidationError({'file': str(exc)})
+        if report is not None:
+            report(result, done=True)
+        return Response(result.as_dict())
+
+    def progress_reporter(self, supplier_id, import_id):
+        """progress(result, done=False) для import_price_list: пишет счётчики в кэш."""
+        key = self.progress_key(supplier_id, import_id)
+
+        def progress(result, done=False):
+            cache.set(key, {
+                'rows': result.rows,
+                'created': result.created,
+                'updated': result.updated,
+                'error_count': result.error_count,
+                'done': done,
+            }, self.progress_timeout)
+
+        return progress
+
+
+class InventorySyncView(APIView):
+    """
+    Массовая синхронизация остатков из учётной системы поставщика
+    (см. catalog/inventory.py).
+
+    POST [{"sku": "A-1", "stock_quantity": "120"}, {"product_id": 7, "delta": "-3"}, ...]
+    (или {"items": [...]}), до 10 000 записей.
+      -> {"updated": n, "errors": n,
+          "results": [{"index", "product_id", "stock_quantity"} | {"index", "error"}]}
+    Права проверяются один раз на весь пакет.
+    """
+    permission_classes = [IsSupplierManagerOrOwner]
+
+    def post(self, request, supplier_id):
+        check_supplier_staff(request, supplier_id)
+        records = request.data.get('items') if isinstance(request.data, dict) else request.data
+        if not isinstance(records, list):
+            raise ValidationError({'items': 'Ожидается список записей.'})
+        if len(records) > MAX_INVENTORY_RECORDS:
+            raise ValidationError({'items': f'Не больше {MAX_INVENTORY_RECORDS} записей за запрос.'})
+        return Response(sync_stock(supplier_id, records))
+
+
+class CatalogChangesView(APIView):
+    """
+    Изменения каталога поставщика для офлайн-клиентов (catalog/sync.py).
+
+    GET ?since=<token из прошлого ответа>
+      -> товары, каталоги, строки каталогов, скидки и категории, изменённые
+         после токена, плюс id удалённых ("deleted") и новый "token".
+    Без since (или со слишком старым) — полный каталог и "reset": true.
+    Доступ: как к списку товаров поставщика.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, supplier_id):
+        scope = get_access_scope(request)
+        if not scope.can_view_supplier(supplier_id):
+            raise PermissionDenied("Нет доступа к каталогу этого поставщика.")
+
+        since = request.query_params.get('since')
+        if since:
+            try:
+                since = sync.parse_token(since)
+            except (ValueError, OverflowError, OSError):
+                raise ValidationError({'since': 'Неверный токен синхронизации.'})
+        else:
+            since = None
+
+        include_inactive = scope.is_superuser or scope.is_staff_of(supplier_id)
+        return Response(sync.changes_since(supplier_id, since, include_inactive, request=request))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_keyset_pagination_indexes'),
+        ('chat', '0002_conversation_assigned_staff'),
+        ('orders', '0002_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['supplier', '-updated_at', 'id'], name='chat_conver_supplie_1f18ca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['consumer', '-updated_at', 'id'], name='chat_conver_consume_3b937a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'sent_at', 'id'], name='chat_messag_convers_d550b1_idx'),
+        ),
+    ]
@@ -56,6 +56,12 @@ class Conversation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['supplier', '-updated_at', 'id']),
+            models.Index(fields=['consumer', '-updated_at', 'id']),
+        ]
+
     def __str__(self):
         base = f"Conversation #{self.id} with supplier {self.supplier}"
         if self.consumer:
@@ -89,5 +95,17 @@ class Message(models.Model):
     sent_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # keyset-пагинация сообщений диалога: (sent_at, id)
+            models.Index(fields=['conversation', 'sent_at', 'id']),
+            # проверка доступа к вложению по имени файла (scp_project/media.py)
+            models.Index(
+                fields=['attachment'],
+                name='chat_message_attachment_idx',
+                condition=models.Q(attachment__gt=''),
+            ),
+        ]
+
     def __str__(self):
         return f"Message #{self.id} in conv {self.conversation_id}"
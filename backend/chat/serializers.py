@@ -1,8 +1,10 @@
 from rest_framework import serializers
+
+from scp_project.fieldsets import SparseFieldsetMixin
 from .models import Conversation, Message
 
 
-class ConversationSerializer(serializers.ModelSerializer):
+class ConversationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     supplier_name = serializers.SerializerMethodField()
     consumer_name = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
@@ -28,6 +30,14 @@ class ConversationSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_by', 'created_at', 'updated_at', 'supplier_name', 'consumer_name', 'last_message', 'last_message_at', 'unread_count']
 
+    # что читают method-поля: для ?fields= (scp_project/fieldsets.py)
+    method_field_sources = {
+        'supplier_name': ['supplier.company_name'],
+        'consumer_name': ['consumer.business_name'],
+        'last_message': ['last_message_text'],
+        'unread_count': ['unread_messages'],
+    }
+
     def get_supplier_name(self, obj):
         return obj.supplier.company_name if obj.supplier else None
 
@@ -37,10 +47,15 @@ class ConversationSerializer(serializers.ModelSerializer):
         return None
 
     def get_last_message(self, obj):
+        # список диалогов аннотирует last_message_text, чтобы не делать запрос на каждый диалог
+        if hasattr(obj, 'last_message_text'):
+            return obj.last_message_text
         last_msg = obj.messages.order_by('-sent_at').first()
         return last_msg.text if last_msg else None
 
     def get_unread_count(self, obj):
+        if hasattr(obj, 'unread_messages'):
+            return obj.unread_messages
         request = self.context.get('request')
         if request and request.user:
             return obj.messages.filter(is_read=False).exclude(sender=request.user).count()
@@ -3,15 +3,57 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.exceptions import PermissionDenied
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 from .models import Conversation, Message
 from .serializers import ConversationSerializer, MessageSerializer
-from accounts.models import ConsumerProfile, SupplierStaff, SupplierProfile
+from accounts.models import SupplierStaff
 from accounts.models import ConsumerSupplierLink
+from accounts.scope import get_access_scope
+from scp_project.fieldsets import SparseFieldsetViewMixin
 from orders.models import Order
 
 
-class ConversationListCreateView(generics.ListCreateAPIView):
+def annotate_conversation_summary(queryset, user):
+    """
+    Добавляет last_message_text и unread_messages подзапросами,
+    чтобы список диалогов не делал 2 запроса на каждый диалог.
+    """
+    messages = Message.objects.filter(conversation=OuterRef('pk'))
+    unread = (
+        messages.filter(is_read=False)
+        .exclude(sender=user)
+        .values('conversation')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    return queryset.annotate(
+        last_message_text=Subquery(messages.order_by('-sent_at').values('text')[:1]),
+        unread_messages=Coalesce(Subquery(unread), 0),
+    )
+
+
+def is_conversation_participant(scope, conv: Conversation):
+    """
+    superuser, staff поставщика диалога или consumer этого диалога.
+    """
+    if scope.is_superuser:
+        return True
+    if scope.is_staff_of(conv.supplier_id):
+        return True
+    return scope.is_consumer and conv.consumer_id == scope.consumer_id
+
+
+def can_read_attachment(scope, name):
+    """
+    Вложение сообщения (scp_project/media.py) видят только участники диалога.
+    """
+    message = Message.objects.filter(attachment=name).select_related('conversation').first()
+    return message is not None and is_conversation_participant(scope, message.conversation)
+
+
+class ConversationListCreateView(SparseFieldsetViewMixin, generics.ListCreateAPIView):
     """
     GET:
       - consumer: диалоги, где он участник
@@ -23,50 +65,43 @@ class ConversationListCreateView(generics.ListCreateAPIView):
     """
     serializer_class = ConversationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('-updated_at', 'id')
 
     def get_queryset(self):
-        user = self.request.user
-        base_qs = Conversation.objects.select_related(
-            'supplier', 'consumer', 'order'
-        ).order_by('-updated_at')
+        scope = get_access_scope(self.request)
+        base_qs = Conversation.objects.select_related('supplier', 'consumer', 'order').order_by('-updated_at')
+        fieldset = self.get_fieldset()
+        if fieldset is None or fieldset.includes('last_message') or fieldset.includes('unread_count'):
+            base_qs = annotate_conversation_summary(base_qs, self.request.user)
 
-        if user.is_superuser:
+        if scope.is_superuser:
             return base_qs
 
         # staff поставщика
-        staff_supplier_ids = SupplierStaff.objects.filter(
-            user=user
-        ).values_list('supplier_id', flat=True)
-        
-        if staff_supplier_ids:
-            qs = base_qs.filter(supplier_id__in=staff_supplier_ids)
-            
+        if scope.supplier_ids:
+            qs = base_qs.filter(supplier_id__in=scope.supplier_ids)
+
             # If user is sales rep, only show assigned conversations
-            if user.user_type == 'supplier_sales':
-                qs = qs.filter(assigned_staff__user=user)
-                
+            if scope.role == 'sales':
+                qs = qs.filter(assigned_staff_id=scope.staff.id)
+
             return qs
 
         # consumer
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
+        if not scope.is_consumer:
             return Conversation.objects.none()
 
-        return base_qs.filter(consumer=consumer_profile)
+        return base_qs.filter(consumer_id=scope.consumer_id)
 
     def perform_create(self, serializer):
         user = self.request.user
+        scope = get_access_scope(self.request)
 
         # consumer?
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
-            consumer_profile = None
+        consumer_profile = scope.consumer_profile
 
         # staff?
-        staff_links = SupplierStaff.objects.filter(user=user)
-        is_staff = staff_links.exists()
+        is_staff = scope.is_staff_member
 
         supplier = serializer.validated_data.get('supplier')
         conversation_type = serializer.validated_data.get('conversation_type', 'supplier_consumer')
@@ -82,12 +117,7 @@ class ConversationListCreateView(generics.ListCreateAPIView):
         # consumer создаёт supplier_consumer диалог
         if consumer_profile and not is_staff:
             # проверяем accepted-линк
-            has_link = ConsumerSupplierLink.objects.filter(
-                consumer=consumer_profile,
-                supplier=supplier,
-                status='accepted',
-            ).exists()
-            if not has_link:
+            if not scope.has_accepted_link(supplier.id):
                 raise PermissionDenied("Нет одобренной связи с этим поставщиком, нельзя открыть чат.")
 
             # Routing logic: Assign to sales rep
@@ -144,42 +174,30 @@ class MessageListCreateView(generics.ListCreateAPIView):
     """
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('sent_at', 'id')
 
     def get_conversation(self):
         conv_id = self.kwargs.get('conversation_id')
         try:
-            conv = Conversation.objects.select_related('supplier', 'consumer').get(pk=conv_id)
+            conv = Conversation.objects.get(pk=conv_id)
         except Conversation.DoesNotExist:
             raise PermissionDenied("Conversation not found.")
         return conv
 
-    def check_participant(self, user, conv: Conversation):
-        if user.is_superuser:
-            return
-
-        # staff поставщика
-        if SupplierStaff.objects.filter(user=user, supplier=conv.supplier).exists():
-            return
-
-        # consumer
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
-            raise PermissionDenied("Вы не участник этого диалога.")
-
-        if conv.consumer != consumer_profile:
+    def check_participant(self, scope, conv: Conversation):
+        if not is_conversation_participant(scope, conv):
             raise PermissionDenied("Вы не участник этого диалога.")
 
     def get_queryset(self):
-        user = self.request.user
+        scope = get_access_scope(self.request)
         conv = self.get_conversation()
-        self.check_participant(user, conv)
+        self.check_participant(scope, conv)
         return conv.messages.select_related('sender').order_by('sent_at')
 
     def perform_create(self, serializer):
         user = self.request.user
         conv = self.get_conversation()
-        self.check_participant(user, conv)
+        self.check_participant(get_access_scope(self.request), conv)
 
         serializer.save(
             conversation=conv,
@@ -197,24 +215,14 @@ class MarkConversationReadView(APIView):
     def post(self, request, conversation_id):
         user = request.user
         try:
-            conv = Conversation.objects.select_related('supplier', 'consumer').get(pk=conversation_id)
+            conv = Conversation.objects.get(pk=conversation_id)
         except Conversation.DoesNotExist:
             return Response({"detail": "Conversation not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        # проверяем участие (та же логика, что выше)
-        # переиспользуем кусочек из MessageListCreateView
-        if not user.is_superuser:
-            if SupplierStaff.objects.filter(user=user, supplier=conv.supplier).exists():
-                pass
-            else:
-                try:
-                    consumer_profile = ConsumerProfile.objects.get(user=user)
-                except ConsumerProfile.DoesNotExist:
-                    return Response({"detail": "Вы не участник этого диалога."},
-                                    status=status.HTTP_403_FORBIDDEN)
-                if conv.consumer != consumer_profile:
-                    return Response({"detail": "Вы не участник этого диалога."},
-                                    status=status.HTTP_403_FORBIDDEN)
+        # проверяем участие (та же логика, что в MessageListCreateView)
+        if not is_conversation_participant(get_access_scope(request), conv):
+            return Response({"detail": "Вы не участник этого диалога."},
+                            status=status.HTTP_403_FORBIDDEN)
 
         # помечаем сообщения других пользователей как прочитанные
         updated = Message.objects.filter(
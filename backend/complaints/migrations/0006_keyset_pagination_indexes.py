@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_keyset_pagination_indexes'),
+        ('complaints', '0005_alter_complaintescalation_from_level_and_more'),
+        ('orders', '0002_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['supplier', '-created_at', 'id'], name='complaints__supplie_ea7c5a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['consumer', '-created_at', 'id'], name='complaints__consume_82bd34_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incident',
+            index=models.Index(fields=['supplier', '-created_at', 'id'], name='complaints__supplie_e4e2b9_idx'),
+        ),
+    ]
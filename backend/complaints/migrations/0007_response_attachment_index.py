@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0006_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='complaintresponse',
+            index=models.Index(condition=models.Q(('attachment__gt', '')), fields=['attachment'], name='complaint_resp_attachment_idx'),
+        ),
+    ]
@@ -133,6 +133,9 @@ class Complaint(models.Model):
             models.Index(fields=['supplier', 'status']),
             models.Index(fields=['consumer', 'status']),
             models.Index(fields=['escalation_level', 'status']),
+            # keyset pagination: (-created_at, id)
+            models.Index(fields=['supplier', '-created_at', 'id']),
+            models.Index(fields=['consumer', '-created_at', 'id']),
         ]
 
     def __str__(self):
@@ -186,6 +189,14 @@ class ComplaintResponse(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # attachment access checks look responses up by file name (scp_project/media.py)
+            models.Index(
+                fields=['attachment'],
+                name='complaint_resp_attachment_idx',
+                condition=models.Q(attachment__gt=''),
+            ),
+        ]
 
     def __str__(self):
         return f"Response to Complaint #{self.complaint.id} by {self.user}"
@@ -295,6 +306,10 @@ class Incident(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # keyset pagination: (-created_at, id)
+            models.Index(fields=['supplier', '-created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"Incident #{self.id} - {self.title} ({self.status})"
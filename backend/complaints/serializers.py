@@ -1,8 +1,10 @@
 from rest_framework import serializers
+
+from scp_project.fieldsets import SparseFieldsetMixin
 from .models import Complaint, ComplaintResponse, ComplaintEscalation, Incident
 
 
-class ComplaintResponseSerializer(serializers.ModelSerializer):
+class ComplaintResponseSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for complaint responses"""
     user_email = serializers.EmailField(source='user.email', read_only=True)
     user_type = serializers.CharField(source='user.user_type', read_only=True)
@@ -23,7 +25,7 @@ class ComplaintResponseSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'created_at']
 
 
-class ComplaintEscalationSerializer(serializers.ModelSerializer):
+class ComplaintEscalationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for escalation history"""
     escalated_by_email = serializers.EmailField(source='escalated_by.email', read_only=True)
     
@@ -42,7 +44,7 @@ class ComplaintEscalationSerializer(serializers.ModelSerializer):
         read_only_fields = ['escalated_by', 'escalated_at']
 
 
-class ComplaintSerializer(serializers.ModelSerializer):
+class ComplaintSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for reading/creating complaints with escalation support.
     """
@@ -102,6 +104,12 @@ class ComplaintSerializer(serializers.ModelSerializer):
             'escalated_at',
         ]
     
+    # Model attributes read by the method fields (for ?fields=, see scp_project/fieldsets.py)
+    method_field_sources = {
+        'can_escalate': ['escalation_level'],
+        'next_escalation_level': ['escalation_level'],
+    }
+
     def get_can_escalate(self, obj):
         """Check if complaint can be escalated"""
         return obj.can_escalate()
@@ -111,7 +119,7 @@ class ComplaintSerializer(serializers.ModelSerializer):
         return obj.get_next_escalation_level()
 
 
-class ComplaintListSerializer(serializers.ModelSerializer):
+class ComplaintListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Lightweight serializer for listing complaints (without nested data).
     """
@@ -139,6 +147,8 @@ class ComplaintListSerializer(serializers.ModelSerializer):
             'can_escalate',
         ]
     
+    method_field_sources = {'can_escalate': ['escalation_level']}
+
     def get_can_escalate(self, obj):
         return obj.can_escalate()
 
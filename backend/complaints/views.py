@@ -14,36 +14,32 @@ from .serializers import (
     IncidentSerializer,
     IncidentStatusUpdateSerializer,
 )
-from accounts.models import ConsumerProfile, SupplierStaff, SupplierProfile, ConsumerSupplierLink
+from accounts.models import ConsumerSupplierLink
+from accounts.scope import get_access_scope
+from scp_project.fieldsets import SparseFieldsetViewMixin
 
 
-def get_user_role(user, supplier):
+def get_user_role(scope, supplier_id):
     """
     Determine user's role in the supplier organization.
     Returns: 'owner', 'manager', 'sales', or None
     """
-    if user.user_type == 'supplier_owner':
-        try:
-            staff = SupplierStaff.objects.get(user=user, supplier=supplier)
-            return 'owner'
-        except SupplierStaff.DoesNotExist:
-            return None
-    elif user.user_type == 'supplier_manager':
-        try:
-            staff = SupplierStaff.objects.get(user=user, supplier=supplier)
-            return 'manager'
-        except SupplierStaff.DoesNotExist:
-            return None
-    elif user.user_type == 'supplier_sales':
-        try:
-            staff = SupplierStaff.objects.get(user=user, supplier=supplier)
-            return 'sales'
-        except SupplierStaff.DoesNotExist:
-            return None
-    return None
+    return scope.role_for(supplier_id)
+
 
+def filter_by_escalation_role(queryset, role):
+    """
+    Restrict staff complaint querysets by escalation level:
+    sales sees sales-level, manager sees sales and manager level, owner sees all.
+    """
+    if role == 'sales':
+        return queryset.filter(escalation_level='sales')
+    if role == 'manager':
+        return queryset.filter(escalation_level__in=['sales', 'manager'])
+    return queryset
 
-def can_user_handle_complaint(user, complaint):
+
+def can_user_handle_complaint(scope, complaint):
     """
     Check if user can handle complaint at its current escalation level.
     
@@ -52,7 +48,7 @@ def can_user_handle_complaint(user, complaint):
     - Manager can handle 'sales' and 'manager' level complaints
     - Owner can handle all levels
     """
-    role = get_user_role(user, complaint.supplier)
+    role = get_user_role(scope, complaint.supplier_id)
     
     if not role:
         return False
@@ -67,7 +63,22 @@ def can_user_handle_complaint(user, complaint):
     return False
 
 
-class ComplaintListCreateView(generics.ListCreateAPIView):
+def can_read_attachment(scope, name):
+    """
+    Attachment of a complaint response (served by scp_project/media.py):
+    the same visibility as ComplaintResponseListView.
+    """
+    response = ComplaintResponse.objects.filter(attachment=name).select_related('complaint').first()
+    if response is None:
+        return False
+    if scope.is_superuser:
+        return True
+    if scope.is_consumer and response.complaint.consumer_id == scope.consumer_id:
+        return not response.is_internal
+    return can_user_handle_complaint(scope, response.complaint)
+
+
+class ComplaintListCreateView(SparseFieldsetViewMixin, generics.ListCreateAPIView):
     """
     GET:
       - consumer: their own complaints
@@ -77,42 +88,32 @@ class ComplaintListCreateView(generics.ListCreateAPIView):
       - only consumer (user with ConsumerProfile)
     """
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('-created_at', 'id')
 
     def get_queryset(self):
-        user = self.request.user
+        scope = get_access_scope(self.request)
 
         base_qs = Complaint.objects.select_related(
             'consumer', 'supplier', 'order', 'assigned_to', 'escalated_by'
-        ).prefetch_related('responses', 'escalation_history').order_by('-created_at')
+        ).order_by('-created_at')
+        if self.request.method != 'GET':
+            base_qs = base_qs.prefetch_related('responses', 'escalation_history')
 
         # Superuser sees all
-        if user.is_superuser:
+        if scope.is_superuser:
             return base_qs
 
-        # Supplier staff sees complaints for their supplier
-        staff_links = SupplierStaff.objects.filter(user=user).values_list('supplier_id', flat=True)
-        if staff_links:
-            queryset = base_qs.filter(supplier_id__in=staff_links)
-            
-            # Filter based on role and escalation level
-            role = user.user_type
-            if role == 'supplier_sales':
-                # Sales only sees sales-level complaints
-                queryset = queryset.filter(escalation_level='sales')
-            elif role == 'supplier_manager':
-                # Manager sees sales and manager level
-                queryset = queryset.filter(escalation_level__in=['sales', 'manager'])
-            # Owner sees all (no additional filter)
-            
-            return queryset
+        # Supplier staff sees complaints for their supplier,
+        # filtered by role and escalation level (owner sees all)
+        if scope.supplier_ids:
+            queryset = base_qs.filter(supplier_id__in=scope.supplier_ids)
+            return filter_by_escalation_role(queryset, scope.role)
 
         # Consumer sees their own complaints
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
+        if not scope.is_consumer:
             return Complaint.objects.none()
 
-        return base_qs.filter(consumer=consumer_profile)
+        return base_qs.filter(consumer_id=scope.consumer_id)
     
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -125,11 +126,11 @@ class ComplaintListCreateView(generics.ListCreateAPIView):
         Automatically assigns to sales representative if available.
         """
         user = self.request.user
+        scope = get_access_scope(self.request)
 
         # Check that user has ConsumerProfile
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
+        consumer_profile = scope.consumer_profile
+        if consumer_profile is None:
             raise PermissionDenied("Only consumers can create complaints.")
 
         supplier = serializer.validated_data.get('supplier')
@@ -143,13 +144,7 @@ class ComplaintListCreateView(generics.ListCreateAPIView):
             raise PermissionDenied("Supplier must be specified.")
 
         # Check for accepted link between consumer and supplier
-        has_link = ConsumerSupplierLink.objects.filter(
-            consumer=consumer_profile,
-            supplier=supplier,
-            status='accepted',
-        ).exists()
-
-        if not has_link:
+        if not scope.has_accepted_link(supplier.id):
             raise PermissionDenied("No approved link with this supplier. Complaint cannot be created.")
 
         # Try to auto-assign to sales rep
@@ -175,7 +170,7 @@ class ComplaintListCreateView(generics.ListCreateAPIView):
         )
 
 
-class ComplaintDetailView(generics.RetrieveAPIView):
+class ComplaintDetailView(SparseFieldsetViewMixin, generics.RetrieveAPIView):
     """
     Details of a single complaint.
     Access:
@@ -188,33 +183,23 @@ class ComplaintDetailView(generics.RetrieveAPIView):
     lookup_field = 'pk'
 
     def get_queryset(self):
-        user = self.request.user
+        scope = get_access_scope(self.request)
         base_qs = Complaint.objects.select_related(
             'consumer', 'supplier', 'order', 'assigned_to', 'escalated_by'
         ).prefetch_related('responses', 'escalation_history')
 
-        if user.is_superuser:
+        if scope.is_superuser:
             return base_qs
 
-        staff_links = SupplierStaff.objects.filter(user=user).values_list('supplier_id', flat=True)
-        if staff_links:
-            queryset = base_qs.filter(supplier_id__in=staff_links)
-            
+        if scope.supplier_ids:
+            queryset = base_qs.filter(supplier_id__in=scope.supplier_ids)
             # Apply role-based filtering
-            role = user.user_type
-            if role == 'supplier_sales':
-                queryset = queryset.filter(escalation_level='sales')
-            elif role == 'supplier_manager':
-                queryset = queryset.filter(escalation_level__in=['sales', 'manager'])
-            
-            return queryset
+            return filter_by_escalation_role(queryset, scope.role)
 
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
+        if not scope.is_consumer:
             return Complaint.objects.none()
 
-        return base_qs.filter(consumer=consumer_profile)
+        return base_qs.filter(consumer_id=scope.consumer_id)
 
 
 class ComplaintStatusUpdateView(APIView):
@@ -236,12 +221,13 @@ class ComplaintStatusUpdateView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            complaint = Complaint.objects.select_related('supplier').get(pk=pk)
+            complaint = Complaint.objects.get(pk=pk)
         except Complaint.DoesNotExist:
             return Response({"detail": "Complaint not found."}, status=status.HTTP_404_NOT_FOUND)
 
         # Check if user can handle this complaint
-        if not user.is_superuser and not can_user_handle_complaint(user, complaint):
+        scope = get_access_scope(request)
+        if not scope.is_superuser and not can_user_handle_complaint(scope, complaint):
             return Response(
                 {"detail": "You do not have permission to update this complaint."},
                 status=status.HTTP_403_FORBIDDEN
@@ -297,12 +283,13 @@ class ComplaintEscalateView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            complaint = Complaint.objects.select_related('supplier').get(pk=pk)
+            complaint = Complaint.objects.get(pk=pk)
         except Complaint.DoesNotExist:
             return Response({"detail": "Complaint not found."}, status=status.HTTP_404_NOT_FOUND)
 
         # Check if user can handle this complaint at current level
-        if not user.is_superuser and not can_user_handle_complaint(user, complaint):
+        scope = get_access_scope(request)
+        if not scope.is_superuser and not can_user_handle_complaint(scope, complaint):
             return Response(
                 {"detail": "You do not have permission to escalate this complaint."},
                 status=status.HTTP_403_FORBIDDEN
@@ -369,26 +356,22 @@ class ComplaintResponseCreateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         user = self.request.user
+        scope = get_access_scope(self.request)
         complaint_id = self.kwargs.get('complaint_id')
 
         try:
-            complaint = Complaint.objects.select_related('consumer', 'supplier').get(pk=complaint_id)
+            complaint = Complaint.objects.get(pk=complaint_id)
         except Complaint.DoesNotExist:
             raise ValidationError("Complaint not found.")
 
         # Check permissions
-        is_consumer = False
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-            is_consumer = complaint.consumer == consumer_profile
-        except ConsumerProfile.DoesNotExist:
-            pass
+        is_consumer = scope.is_consumer and complaint.consumer_id == scope.consumer_id
 
         is_supplier_staff = False
         if not is_consumer:
-            is_supplier_staff = can_user_handle_complaint(user, complaint)
+            is_supplier_staff = can_user_handle_complaint(scope, complaint)
 
-        if not user.is_superuser and not is_consumer and not is_supplier_staff:
+        if not scope.is_superuser and not is_consumer and not is_supplier_staff:
             raise PermissionDenied("You do not have permission to respond to this complaint.")
 
         # Consumers cannot add internal notes
@@ -413,32 +396,29 @@ class ComplaintResponseListView(generics.ListAPIView):
     """
     serializer_class = ComplaintResponseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('created_at', 'id')
 
     def get_queryset(self):
-        user = self.request.user
+        scope = get_access_scope(self.request)
         complaint_id = self.kwargs.get('complaint_id')
 
         try:
-            complaint = Complaint.objects.select_related('consumer', 'supplier').get(pk=complaint_id)
+            complaint = Complaint.objects.get(pk=complaint_id)
         except Complaint.DoesNotExist:
             return ComplaintResponse.objects.none()
 
         base_qs = ComplaintResponse.objects.filter(complaint=complaint).select_related('user')
 
         # Superuser sees all
-        if user.is_superuser:
+        if scope.is_superuser:
             return base_qs
 
         # Consumer sees only non-internal responses
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-            if complaint.consumer == consumer_profile:
-                return base_qs.filter(is_internal=False)
-        except ConsumerProfile.DoesNotExist:
-            pass
+        if scope.is_consumer and complaint.consumer_id == scope.consumer_id:
+            return base_qs.filter(is_internal=False)
 
         # Supplier staff sees all if they have permission
-        if can_user_handle_complaint(user, complaint):
+        if can_user_handle_complaint(scope, complaint):
             return base_qs
 
         return ComplaintResponse.objects.none()
@@ -457,30 +437,26 @@ class IncidentListCreateView(generics.ListCreateAPIView):
     """
     serializer_class = IncidentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('-created_at', 'id')
 
     def get_queryset(self):
-        user = self.request.user
+        scope = get_access_scope(self.request)
         base_qs = Incident.objects.select_related(
             'supplier', 'order', 'complaint', 'created_by'
         ).order_by('-created_at')
 
-        if user.is_superuser:
+        if scope.is_superuser:
             return base_qs
 
         # Supplier staff
-        staff_supplier_ids = SupplierStaff.objects.filter(
-            user=user
-        ).values_list('supplier_id', flat=True)
-        if staff_supplier_ids:
-            return base_qs.filter(supplier_id__in=staff_supplier_ids)
+        if scope.supplier_ids:
+            return base_qs.filter(supplier_id__in=scope.supplier_ids)
 
         # Consumer – incidents related to their orders
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
+        if not scope.is_consumer:
             return Incident.objects.none()
 
-        return base_qs.filter(order__consumer=consumer_profile)
+        return base_qs.filter(order__consumer_id=scope.consumer_id)
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -490,8 +466,7 @@ class IncidentListCreateView(generics.ListCreateAPIView):
             if user.user_type not in ['supplier_manager', 'supplier_owner']:
                 raise PermissionDenied("Only Managers and Owners can create incidents.")
 
-        staff_links = SupplierStaff.objects.filter(user=user)
-        if not staff_links.exists() and not user.is_superuser:
+        if not get_access_scope(self.request).is_staff_member and not user.is_superuser:
             raise PermissionDenied("Only supplier staff or admin can create incidents.")
 
         supplier = serializer.validated_data.get('supplier')
@@ -524,24 +499,19 @@ class IncidentDetailView(generics.RetrieveAPIView):
     lookup_field = 'pk'
 
     def get_queryset(self):
-        user = self.request.user
+        scope = get_access_scope(self.request)
         base_qs = Incident.objects.select_related('supplier', 'order', 'complaint', 'created_by')
 
-        if user.is_superuser:
+        if scope.is_superuser:
             return base_qs
 
-        staff_supplier_ids = SupplierStaff.objects.filter(
-            user=user
-        ).values_list('supplier_id', flat=True)
-        if staff_supplier_ids:
-            return base_qs.filter(supplier_id__in=staff_supplier_ids)
+        if scope.supplier_ids:
+            return base_qs.filter(supplier_id__in=scope.supplier_ids)
 
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
+        if not scope.is_consumer:
             return Incident.objects.none()
 
-        return base_qs.filter(order__consumer=consumer_profile)
+        return base_qs.filter(order__consumer_id=scope.consumer_id)
 
 
 class IncidentStatusUpdateView(APIView):
@@ -559,7 +529,7 @@ class IncidentStatusUpdateView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            incident = Incident.objects.select_related('supplier').get(pk=pk)
+            incident = Incident.objects.get(pk=pk)
         except Incident.DoesNotExist:
             return Response({"detail": "Incident not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -571,8 +541,7 @@ class IncidentStatusUpdateView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
 
-            staff_links = SupplierStaff.objects.filter(user=user, supplier=incident.supplier)
-            if not staff_links.exists():
+            if not get_access_scope(request).is_staff_of(incident.supplier_id):
                 return Response(
                     {"detail": "You cannot update incidents for this supplier."},
                     status=status.HTTP_403_FORBIDDEN
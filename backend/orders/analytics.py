@@ -0,0 +1,289 @@
+"""
+Daily order rollups for supplier dashboards.
+
+Three tables (orders.models), one row per supplier and day:
+
+  * SupplierDailyStats (supplier, day): orders created that day, how many of
+    them are in each status now, and the revenue of the booked ones
+    (confirmed, in delivery, completed);
+  * ProductDailyStats (supplier, product, day): quantity, revenue and number
+    of booked orders per product;
+  * ConsumerDailyStats (supplier, consumer, day): orders, booked orders and
+    revenue per consumer.
+
+The day is the local date (TIME_ZONE) on which the order was created; an
+order confirmed a week later adds its revenue to the day it was placed.
+
+The rows are kept up to date incrementally, in the transaction that writes
+OrderStatusHistory. record_changes() gets (order_id, old_status, new_status)
+for a batch of orders (old_status '' for a new order), takes each order's
+contribution off under its old status and adds it under the new one. The
+sums are applied with one INSERT ... ON CONFLICT DO UPDATE SET x = x +
+excluded.x per table, so concurrent writers add to the same row without
+reading it first.
+
+Changes that bypass the order API (admin edits, deleted orders, raw
+updates) are not tracked. `manage.py rebuild_order_rollups` recomputes a
+range of days from the orders, in chunks of days on a thread pool; run it
+once to backfill and after such changes. On PostgreSQL a rebuilt day is
+locked (advisory lock, exclusive) for its transaction, and incremental
+updates take the same lock shared, so an order confirmed during a rebuild
+is neither lost nor counted twice.
+
+Dashboards read these tables only (see the Supplier*StatsView views).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, connections, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from scp_project.params import day_start
+
+from .models import ConsumerDailyStats, Order, OrderItem, ProductDailyStats, SupplierDailyStats
+
+
+BOOKED_STATUSES = ('confirmed', 'in_delivery', 'completed')
+STATUS_COLUMNS = {status: f'{status}_count' for status, _ in Order.STATUS_CHOICES}
+UPSERT_BATCH_SIZE = 500
+REBUILD_CHUNK_DAYS = 7
+# первый ключ advisory-блокировок сводок, второй — день (date.toordinal())
+ROLLUP_LOCK_CLASS = 0x524f4c4c
+
+UPSERT_SQL = """
+INSERT INTO {table} ({columns}) VALUES {rows}
+ON CONFLICT ({keys}) DO UPDATE SET {increments}
+"""
+
+
+def order_day(created_at):
+    return timezone.localdate(created_at)
+
+
+def _booked(status):
+    return 1 if status in BOOKED_STATUSES else 0
+
+
+def _lock_days(days, shared):
+    """Advisory locks on the days, in day order (no deadlocks); PostgreSQL only."""
+    if connection.vendor != 'postgresql' or not days:
+        return
+    function = 'pg_advisory_xact_lock_shared' if shared else 'pg_advisory_xact_lock'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {function}(%s, day) FROM unnest(%s::int[]) AS day",
+            [ROLLUP_LOCK_CLASS, sorted({day.toordinal() for day in days})],
+        )
+
+
+def _add(rows, key, **values):
+    row = rows.setdefault(key, {})
+    for column, value in values.items():
+        if value:
+            row[column] = row.get(column, 0) + value
+
+
+def _adapt(value):
+    if isinstance(value, Decimal):
+        return connection.ops.adapt_decimalfield_value(value)
+    if hasattr(value, 'toordinal'):
+        return connection.ops.adapt_datefield_value(value)
+    return value
+
+
+def _upsert(model, keys, rows):
+    """Add {key tuple: {column: delta}} to the model's rows, creating missing ones."""
+    rows = {key: values for key, values in rows.items() if values}
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    # все счётчики модели: значения по умолчанию есть только в Python, не в таблице
+    columns = [
+        field.column for field in model._meta.concrete_fields
+        if not field.primary_key and field.column not in keys
+    ]
+    sql_columns = ', '.join(quote(column) for column in list(keys) + columns)
+    increments = ', '.join(f"{quote(column)} = {table}.{quote(column)} + excluded.{quote(column)}" for column in columns)
+    placeholder = '(' + ', '.join(['%s'] * (len(keys) + len(columns))) + ')'
+
+    # строки в порядке ключа: параллельные транзакции блокируют их в одном порядке
+    ordered = sorted(rows.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(ordered), UPSERT_BATCH_SIZE):
+            batch = ordered[start:start + UPSERT_BATCH_SIZE]
+            params = []
+            for key, values in batch:
+                params.extend(_adapt(value) for value in key)
+                params.extend(_adapt(values.get(column, 0)) for column in columns)
+            cursor.execute(
+                UPSERT_SQL.format(
+                    table=table,
+                    columns=sql_columns,
+                    rows=', '.join([placeholder] * len(batch)),
+                    keys=', '.join(quote(key) for key in keys),
+                    increments=increments,
+                ),
+                params,
+            )
+
+
+ORDER_FIELDS = ('id', 'supplier_id', 'consumer_id', 'created_at', 'total_amount')
+
+
+def record_changes(changes, orders=None):
+    """
+    Apply status changes [(order_id, old_status, new_status)] to the
+    rollups; old_status '' for a created order. Call it in the transaction
+    that changes the orders. orders: {order_id: {ORDER_FIELDS}} the caller
+    already has, read otherwise.
+    """
+    changes = [(order_id, old, new) for order_id, old, new in changes if old != new]
+    if not changes:
+        return
+    if orders is None:
+        orders = {
+            order['id']: order
+            for order in Order.objects.filter(pk__in={order_id for order_id, _, _ in changes}).values(*ORDER_FIELDS)
+        }
+
+    # строки нужны только заказам, которые начали или перестали давать выручку
+    rebooked = {order_id for order_id, old, new in changes if _booked(old) != _booked(new)}
+    lines = {}
+    if rebooked:
+        for order_id, product_id, quantity, line_total in (
+            OrderItem.objects.filter(order_id__in=rebooked).values_list('order_id', 'product_id', 'quantity', 'line_total')
+        ):
+            product = lines.setdefault(order_id, {}).setdefault(product_id, [Decimal(0), Decimal(0)])
+            product[0] += quantity
+            product[1] += line_total
+
+    supplier_rows, product_rows, consumer_rows = {}, {}, {}
+    days = set()
+    for order_id, old, new in changes:
+        order = orders.get(order_id)
+        if order is None:
+            continue
+        supplier_id, day = order['supplier_id'], order_day(order['created_at'])
+        days.add(day)
+        created = 0 if old else 1
+        sign = _booked(new) - _booked(old)
+
+        _add(
+            supplier_rows, (supplier_id, day),
+            orders_count=created, booked_count=sign, revenue=sign * order['total_amount'],
+            **{STATUS_COLUMNS[new]: 1},
+        )
+        if old:
+            _add(supplier_rows, (supplier_id, day), **{STATUS_COLUMNS[old]: -1})
+        _add(
+            consumer_rows, (supplier_id, order['consumer_id'], day),
+            orders_count=created, booked_count=sign, revenue=sign * order['total_amount'],
+        )
+        if sign:
+            for product_id, (quantity, revenue) in lines.get(order_id, {}).items():
+                _add(
+                    product_rows, (supplier_id, product_id, day),
+                    orders_count=sign, quantity=sign * quantity, revenue=sign * revenue,
+                )
+
+    with transaction.atomic(savepoint=False):
+        _lock_days(days, shared=True)
+        _upsert(SupplierDailyStats, ['supplier_id', 'day'], supplier_rows)
+        _upsert(ConsumerDailyStats, ['supplier_id', 'consumer_id', 'day'], consumer_rows)
+        _upsert(ProductDailyStats, ['supplier_id', 'product_id', 'day'], product_rows)
+
+
+def rebuild(start, end, supplier_ids=None):
+    """
+    Recompute the rollups of days start..end (inclusive) from the orders,
+    for all suppliers or the given ones. Returns the number of day rows of
+    SupplierDailyStats written.
+    """
+    tz = timezone.get_current_timezone()
+    since = day_start(start)
+    until = day_start(end + timedelta(days=1))
+    orders = Order.objects.filter(created_at__gte=since, created_at__lt=until)
+    items = OrderItem.objects.filter(
+        order__created_at__gte=since, order__created_at__lt=until, order__status__in=BOOKED_STATUSES,
+    )
+    stats = [SupplierDailyStats, ProductDailyStats, ConsumerDailyStats]
+    if supplier_ids is not None:
+        orders = orders.filter(supplier_id__in=supplier_ids)
+        items = items.filter(order__supplier_id__in=supplier_ids)
+
+    booked = Q(status__in=BOOKED_STATUSES)
+    day = TruncDate('created_at', tzinfo=tz)
+    with transaction.atomic():
+        _lock_days([start + timedelta(days=offset) for offset in range((end - start).days + 1)], shared=False)
+        for model in stats:
+            existing = model.objects.filter(day__gte=start, day__lte=end)
+            if supplier_ids is not None:
+                existing = existing.filter(supplier_id__in=supplier_ids)
+            existing.delete()
+
+        supplier_rows = [
+            SupplierDailyStats(**row)
+            for row in orders.annotate(day=day).values('supplier_id', 'day').order_by().annotate(
+                orders_count=Count('id'),
+                booked_count=Count('id', filter=booked),
+                revenue=Sum('total_amount', filter=booked, default=Decimal(0)),
+                **{column: Count('id', filter=Q(status=status)) for status, column in STATUS_COLUMNS.items()},
+            )
+        ]
+        SupplierDailyStats.objects.bulk_create(supplier_rows, batch_size=UPSERT_BATCH_SIZE)
+        ConsumerDailyStats.objects.bulk_create(
+            [
+                ConsumerDailyStats(**row)
+                for row in orders.annotate(day=day).values('supplier_id', 'consumer_id', 'day').order_by().annotate(
+                    orders_count=Count('id'),
+                    booked_count=Count('id', filter=booked),
+                    revenue=Sum('total_amount', filter=booked, default=Decimal(0)),
+                )
+            ],
+            batch_size=UPSERT_BATCH_SIZE,
+        )
+        ProductDailyStats.objects.bulk_create(
+            [
+                ProductDailyStats(supplier_id=row.pop('order__supplier_id'), **row)
+                for row in items.annotate(day=TruncDate('order__created_at', tzinfo=tz))
+                .values('order__supplier_id', 'product_id', 'day').order_by().annotate(
+                    orders_count=Count('order_id', distinct=True),
+                    quantity=Sum('quantity'),
+                    revenue=Sum('line_total'),
+                )
+            ],
+            batch_size=UPSERT_BATCH_SIZE,
+        )
+    return len(supplier_rows)
+
+
+def _rebuild_in_worker(start, end, supplier_ids):
+    try:
+        return rebuild(start, end, supplier_ids)
+    finally:
+        connections.close_all()
+
+
+def rebuild_range(start, end, supplier_ids=None, workers=4, chunk_days=REBUILD_CHUNK_DAYS):
+    """
+    rebuild() start..end in chunks of `chunk_days`, each in its own
+    transaction, `workers` chunks at a time. Returns the rows written.
+    """
+    chunks = []
+    while start <= end:
+        chunk_end = min(start + timedelta(days=chunk_days - 1), end)
+        chunks.append((start, chunk_end))
+        start = chunk_end + timedelta(days=1)
+
+    if workers <= 1:
+        return sum(rebuild(chunk_start, chunk_end, supplier_ids) for chunk_start, chunk_end in chunks)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='order-rollups') as executor:
+        futures = [
+            executor.submit(_rebuild_in_worker, chunk_start, chunk_end, supplier_ids)
+            for chunk_start, chunk_end in chunks
+        ]
+        return sum(future.result() for future in futures)
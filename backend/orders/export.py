@@ -0,0 +1,156 @@
+"""
+Streaming export of orders and order lines (CSV / XLSX) for accounting.
+
+Two kinds of file:
+
+  * orders - one row per order;
+  * lines  - one row per order line, with the order's columns repeated.
+
+Rows come from values_list() querysets read with .iterator(chunk_size=...):
+on PostgreSQL a server-side cursor, so only one chunk of rows is in memory
+at a time. Product columns come from the lines' own snapshot
+(OrderItem.product_*), so nothing is joined beyond the supplier and
+consumer names.
+
+CSV is generated row by row into a StreamingHttpResponse (or a file, for
+`manage.py export_orders`); it starts with a UTF-8 BOM so Excel detects the
+encoding. XLSX uses an openpyxl write-only workbook, which keeps rows in a
+temporary file instead of memory; the zip container can only be finished
+at the end, so the file is built first and then streamed from disk.
+openpyxl is optional, CSV works without it.
+"""
+import csv
+import tempfile
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from scp_project.params import day_start
+
+from .models import OrderItem
+
+try:
+    import openpyxl
+except ImportError:  # XLSX is optional, CSV works without it
+    openpyxl = None
+
+
+EXPORT_CHUNK_SIZE = 2000
+# сколько строк CSV склеивать в один кусок ответа
+CSV_ROWS_PER_CHUNK = 500
+CSV_BOM = '\ufeff'
+
+ORDER_COLUMNS = [
+    ('order_id', 'id'),
+    ('created_at', 'created_at'),
+    ('status', 'status'),
+    ('supplier_id', 'supplier_id'),
+    ('supplier', 'supplier__company_name'),
+    ('consumer_id', 'consumer_id'),
+    ('consumer', 'consumer__business_name'),
+    ('requested_delivery_date', 'requested_delivery_date'),
+    ('delivery_address', 'delivery_address'),
+    ('total_amount', 'total_amount'),
+    ('notes', 'notes'),
+]
+LINE_COLUMNS = [
+    ('order_id', 'order_id'),
+    ('created_at', 'order__created_at'),
+    ('status', 'order__status'),
+    ('supplier_id', 'order__supplier_id'),
+    ('supplier', 'order__supplier__company_name'),
+    ('consumer_id', 'order__consumer_id'),
+    ('consumer', 'order__consumer__business_name'),
+    ('line_id', 'id'),
+    ('product_id', 'product_id'),
+    ('product_name', 'product_name'),
+    ('sku', 'product_sku'),
+    ('unit', 'product_unit'),
+    ('quantity', 'quantity'),
+    ('unit_price', 'unit_price'),
+    ('line_total', 'line_total'),
+    ('remark', 'remark'),
+]
+KINDS = ('orders', 'lines')
+FORMATS = ('csv', 'xlsx')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class ExportError(Exception):
+    """The export can't be produced (format not available)."""
+
+
+def filter_orders(orders, start=None, end=None, statuses=None):
+    """Orders created on local days start..end (inclusive), in the given statuses."""
+    if start is not None:
+        orders = orders.filter(created_at__gte=day_start(start))
+    if end is not None:
+        orders = orders.filter(created_at__lt=day_start(end + timedelta(days=1)))
+    if statuses:
+        orders = orders.filter(status__in=statuses)
+    return orders
+
+
+def rows(orders, kind):
+    """Header, then one tuple per order (kind 'orders') or order line ('lines')."""
+    if kind == 'orders':
+        columns = ORDER_COLUMNS
+        queryset = orders.order_by('created_at', 'id')
+    else:
+        columns = LINE_COLUMNS
+        queryset = OrderItem.objects.filter(order__in=orders.values('id')).order_by('order__created_at', 'order_id', 'id')
+    yield tuple(header for header, _ in columns)
+    yield from queryset.values_list(*[lookup for _, lookup in columns]).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _local(value):
+    # в файле — местное время без смещения, как его ждут в Excel
+    if isinstance(value, datetime):
+        return timezone.localtime(value).replace(tzinfo=None) if timezone.is_aware(value) else value
+    return value
+
+
+class _Echo:
+    """File-like object for csv.writer that returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    """CSV text of `rows`, in chunks of CSV_ROWS_PER_CHUNK rows."""
+    writer = csv.writer(_Echo())
+    chunk = [CSV_BOM]
+    for row in rows:
+        chunk.append(writer.writerow([_local(value) for value in row]))
+        if len(chunk) >= CSV_ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def write_xlsx(rows, fileobj, title='Export'):
+    """Write `rows` to `fileobj` as a one-sheet workbook (write-only, rows on disk)."""
+    if openpyxl is None:
+        raise ExportError("XLSX export needs the openpyxl package; export CSV instead.")
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    for row in rows:
+        sheet.append([_local(value) for value in row])
+    workbook.save(fileobj)
+
+
+def xlsx_file(rows, title='Export'):
+    """The workbook in a temporary file, rewound; it is deleted when closed."""
+    fileobj = tempfile.TemporaryFile()
+    try:
+        write_xlsx(rows, fileobj, title)
+    except BaseException:
+        fileobj.close()
+        raise
+    fileobj.seek(0)
+    return fileobj
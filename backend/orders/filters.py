@@ -0,0 +1,99 @@
+"""
+Filters and search for the order lists.
+
+    ?status=pending,confirmed&created_from=2026-10-01&created_to=2026-10-31
+    &delivery_from=&delivery_to=&consumer=<id,...>&delivery_option=<id,...>
+    &amount_min=&amount_max=&q=<search>
+
+Dates are local days (TIME_ZONE), both ends inclusive; created_* is turned
+into a range on created_at so the (supplier|consumer, status, -created_at,
+id) indexes can serve it.
+
+q is split into words (at most catalog.search.MAX_TERMS); every word must
+match the order id (if it is a number, '#' allowed), the consumer's
+business name or a product name in the order's lines (the snapshot in
+OrderItem, not the current product). Name matches are icontains, backed on
+PostgreSQL by pg_trgm indexes on UPPER(name) (migration 0006); each of
+them is a subquery of ids, so the outer query still walks an orders index.
+"""
+from datetime import timedelta
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from accounts.models import ConsumerProfile
+from catalog.search import search_terms
+from scp_project import params as query
+from .models import Order, OrderItem
+
+
+def _statuses(params):
+    value = params.get('status')
+    if not value:
+        return None
+    statuses = value.split(',')
+    known = {code for code, _ in Order.STATUS_CHOICES}
+    unknown = [status for status in statuses if status not in known]
+    if unknown:
+        raise ValidationError({'status': f"Неизвестные статусы: {', '.join(unknown)}."})
+    return statuses
+
+
+def search_condition(text):
+    """Q for orders matching every word of `text`; None if there are no words."""
+    terms = search_terms(text.replace('#', ' '))
+    if not terms:
+        return None
+    condition = Q()
+    for term in terms:
+        term_q = Q(
+            consumer_id__in=ConsumerProfile.objects.filter(business_name__icontains=term).values('id')
+        ) | Q(
+            id__in=OrderItem.objects.filter(product_name__icontains=term).values('order_id')
+        )
+        if term.isdigit():
+            term_q |= Q(id=int(term))
+        condition &= term_q
+    return condition
+
+
+def filter_orders(queryset, params):
+    """Apply the order list filters and search from query params."""
+    statuses = _statuses(params)
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+
+    created_from, created_to = query.date(params, 'created_from'), query.date(params, 'created_to')
+    if created_from and created_to and created_from > created_to:
+        raise ValidationError({'created_from': 'Начало периода позже конца.'})
+    if created_from:
+        queryset = queryset.filter(created_at__gte=query.day_start(created_from))
+    if created_to:
+        queryset = queryset.filter(created_at__lt=query.day_start(created_to + timedelta(days=1)))
+
+    delivery_from, delivery_to = query.date(params, 'delivery_from'), query.date(params, 'delivery_to')
+    if delivery_from:
+        queryset = queryset.filter(requested_delivery_date__gte=delivery_from)
+    if delivery_to:
+        queryset = queryset.filter(requested_delivery_date__lte=delivery_to)
+
+    consumer_ids = query.ids(params, 'consumer')
+    if consumer_ids:
+        queryset = queryset.filter(consumer_id__in=consumer_ids)
+    delivery_option_ids = query.ids(params, 'delivery_option')
+    if delivery_option_ids:
+        queryset = queryset.filter(delivery_option_id__in=delivery_option_ids)
+
+    amount_min = query.decimal(params, 'amount_min')
+    if amount_min is not None:
+        queryset = queryset.filter(total_amount__gte=amount_min)
+    amount_max = query.decimal(params, 'amount_max')
+    if amount_max is not None:
+        queryset = queryset.filter(total_amount__lte=amount_max)
+
+    text = params.get('q', '').strip()
+    if text:
+        condition = search_condition(text)
+        queryset = queryset.filter(condition) if condition is not None else queryset.none()
+
+    return queryset
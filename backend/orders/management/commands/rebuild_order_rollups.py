@@ -0,0 +1,45 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from orders import analytics
+from orders.models import Order
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Not a date (YYYY-MM-DD): {value}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily order rollups of supplier dashboards for a range of days "
+        "(backfill, or repair after changes made outside the order API)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', type=_date, help="First day (default: the first order).")
+        parser.add_argument('--to', dest='end', type=_date, help="Last day (default: today).")
+        parser.add_argument('--supplier', type=int, action='append', help="Only this supplier (repeatable).")
+        parser.add_argument('--workers', type=int, default=4, help="Chunks rebuilt in parallel.")
+        parser.add_argument(
+            '--chunk-days', type=int, default=analytics.REBUILD_CHUNK_DAYS, help="Days per transaction."
+        )
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate()
+        start = options['start']
+        if start is None:
+            first = Order.objects.aggregate(first=Min('created_at'))['first']
+            start = analytics.order_day(first) if first else end
+        if start > end:
+            raise CommandError("--from is after --to.")
+
+        rows = analytics.rebuild_range(
+            start, end, options['supplier'], workers=options['workers'], chunk_days=max(options['chunk_days'], 1)
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {start}..{end}: {rows} supplier day(s)."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from orders import reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Release expired stock holds and holds of cancelled or rejected orders "
+        "(run every minute from cron); --reconcile also recomputes reserved quantities."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=reservations.SWEEP_BATCH_SIZE, help="Holds per transaction."
+        )
+        parser.add_argument(
+            '--reconcile', action='store_true', help="Recompute Product.reserved_quantity from active holds."
+        )
+
+    def handle(self, *args, **options):
+        released = reservations.release_all_due_holds(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} hold(s)."))
+        if options['reconcile']:
+            fixed = reservations.reconcile_reserved()
+            self.stdout.write(self.style.SUCCESS(f"Reconciled {fixed} product(s)."))
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:43
+
+from django.db import migrations, models
+
+
+def fill_snapshots(apps, schema_editor):
+    # у старых строк исходных данных нет: берём товар как есть сейчас
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('catalog', 'Product')
+    ordered = OrderItem.objects.values('product_id')
+    products = Product.objects.filter(pk__in=ordered).values_list('id', 'name', 'sku', 'unit', 'image_variants')
+    for product_id, name, sku, unit, variants in products.iterator():
+        thumb = None
+        if variants and 'thumb' in variants:
+            thumb = dict(variants['thumb'], placeholder=variants['placeholder'])
+        OrderItem.objects.filter(product_id=product_id).update(
+            product_name=name, product_sku=sku or '', product_unit=unit, product_thumb=thumb,
+        )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_product_reserved_quantity'),
+        ('orders', '0003_stock_holds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_sku',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_thumb',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_unit',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.RunPython(fill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_supplier_logo_variants'),
+        ('catalog', '0011_product_reserved_quantity'),
+        ('orders', '0004_order_item_product_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumerDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders_count', models.IntegerField(default=0)),
+                ('booked_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('consumer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='accounts.consumerprofile')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumer_daily_stats', to='accounts.supplierprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['supplier', 'day'], name='orders_cons_supplie_1c2926_idx')],
+                'constraints': [models.UniqueConstraint(fields=('supplier', 'consumer', 'day'), name='consumer_daily_stats_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders_count', models.IntegerField(default=0)),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='catalog.product')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_daily_stats', to='accounts.supplierprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['supplier', 'day'], name='orders_prod_supplie_6a5439_idx')],
+                'constraints': [models.UniqueConstraint(fields=('supplier', 'product', 'day'), name='product_daily_stats_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SupplierDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders_count', models.IntegerField(default=0)),
+                ('booked_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('draft_count', models.IntegerField(default=0)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('confirmed_count', models.IntegerField(default=0)),
+                ('rejected_count', models.IntegerField(default=0)),
+                ('in_delivery_count', models.IntegerField(default=0)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('cancelled_count', models.IntegerField(default=0)),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='accounts.supplierprofile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('supplier', 'day'), name='supplier_daily_stats_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:57
+
+from django.db import migrations, models
+
+
+# PostgreSQL only: order search (orders/filters.py) is icontains on the
+# consumer's business name and the lines' product names, which Django
+# renders as UPPER(col::text) LIKE UPPER('%...%'); pg_trgm GIN indexes on
+# that same expression (extension from catalog 0004) serve it.
+POSTGRES_FORWARD = [
+    "CREATE INDEX order_items_product_name_trgm ON orders_orderitem USING gin (UPPER(product_name::text) gin_trgm_ops)",
+    "CREATE INDEX consumer_profiles_business_name_trgm ON consumer_profiles "
+    "USING gin (UPPER(business_name::text) gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS consumer_profiles_business_name_trgm",
+    "DROP INDEX IF EXISTS order_items_product_name_trgm",
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_supplier_logo_variants'),
+        ('catalog', '0011_product_reserved_quantity'),
+        ('orders', '0005_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['supplier', 'status', '-created_at', 'id'], name='orders_orde_supplie_31be59_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['consumer', 'status', '-created_at', 'id'], name='orders_orde_consume_3ddef8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['supplier', 'requested_delivery_date'], name='orders_orde_supplie_b713f1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['supplier', '-created_at', 'id'], name='orders_supplier_pending_idx'),
+        ),
+        migrations.RunPython(run_on_postgres(POSTGRES_FORWARD), run_on_postgres(POSTGRES_BACKWARD)),
+    ]
@@ -3,6 +3,7 @@ from django.conf import settings
 
 from accounts.models import ConsumerProfile, SupplierProfile
 from catalog.models import Product, DeliveryOption
+from scp_project.images import thumb_snapshot
 
 
 class Order(models.Model):
@@ -58,6 +59,24 @@ class Order(models.Model):
 
     notes = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            # keyset-пагинация списков заказов: (-created_at, id)
+            models.Index(fields=['supplier', '-created_at', 'id']),
+            models.Index(fields=['consumer', '-created_at', 'id']),
+            models.Index(fields=['-created_at', 'id']),
+            # фильтры списков (orders/filters.py): набор статусов и период внутри поставщика / потребителя
+            models.Index(fields=['supplier', 'status', '-created_at', 'id']),
+            models.Index(fields=['consumer', 'status', '-created_at', 'id']),
+            models.Index(fields=['supplier', 'requested_delivery_date']),
+            # очередь заказов на подтверждение: маленький частичный индекс
+            models.Index(
+                fields=['supplier', '-created_at', 'id'],
+                condition=models.Q(status='pending'),
+                name='orders_supplier_pending_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} - {self.consumer.business_name} → {self.supplier.company_name}"
 
@@ -99,8 +118,29 @@ class OrderItem(models.Model):
         help_text='Optional note for this line (e.g. ripeness, cut type)'
     )
 
+    # снимок товара на момент заказа: списки заказов не читают products/categories,
+    # и строка показывает то, что заказали, даже если товар потом переименовали
+    product_name = models.CharField(max_length=255, blank=True)
+    product_sku = models.CharField(max_length=100, blank=True)
+    product_unit = models.CharField(max_length=10, blank=True)
+    # размер 'thumb' из Product.image_variants (scp_project/images.py)
+    product_thumb = models.JSONField(null=True, blank=True)
+
+    def copy_product_snapshot(self):
+        """Заполнить product_* из текущего товара."""
+        product = self.product
+        self.product_name = product.name
+        self.product_sku = product.sku or ''
+        self.product_unit = product.unit
+        self.product_thumb = thumb_snapshot(product.image_variants)
+
+    def save(self, *args, **kwargs):
+        if not self.product_name:
+            self.copy_product_snapshot()
+        super().save(*args, **kwargs)
+
     def __str__(self):
-        return f"{self.product.name} x {self.quantity} for Order #{self.order.id}"
+        return f"{self.product_name} x {self.quantity} for Order #{self.order_id}"
 
 
 class OrderStatusHistory(models.Model):
@@ -128,5 +168,129 @@ class OrderStatusHistory(models.Model):
 
     comment = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'changed_at', 'id']),
+        ]
+
     def __str__(self):
         return f"Order #{self.order.id}: {self.old_status} → {self.new_status}"
+
+
+class StockHold(models.Model):
+    """
+    Резерв товара под pending-заказ (orders/reservations.py).
+    Активные резервы суммируются в Product.reserved_quantity.
+    """
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('consumed', 'Consumed'),   # заказ подтверждён, товар списан со склада
+        ('released', 'Released'),   # истёк срок или заказ отменён/отклонён
+    ]
+
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='stock_holds'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_holds'
+    )
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    released_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # очередь для release_stock_holds: только активные резервы
+            models.Index(fields=['expires_at'], name='stock_holds_active_expiry', condition=models.Q(status='active')),
+            models.Index(fields=['order', 'status']),
+        ]
+
+    def __str__(self):
+        return f"Hold {self.quantity} of {self.product_id} for Order #{self.order_id} ({self.status})"
+
+
+class SupplierDailyStats(models.Model):
+    """
+    Сводка поставщика за день (orders/analytics.py): заказы, созданные в этот день,
+    по их текущему статусу, и выручка подтверждённых из них.
+    """
+    supplier = models.ForeignKey(SupplierProfile, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+
+    orders_count = models.IntegerField(default=0)
+    # подтверждённые, в доставке и завершённые: они и дают выручку
+    booked_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    draft_count = models.IntegerField(default=0)
+    pending_count = models.IntegerField(default=0)
+    confirmed_count = models.IntegerField(default=0)
+    rejected_count = models.IntegerField(default=0)
+    in_delivery_count = models.IntegerField(default=0)
+    completed_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['supplier', 'day'], name='supplier_daily_stats_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.supplier_id} {self.day}: {self.orders_count} orders, {self.revenue}"
+
+
+class ProductDailyStats(models.Model):
+    """
+    Продажи товара за день (только заказы, дающие выручку).
+    """
+    supplier = models.ForeignKey(SupplierProfile, on_delete=models.CASCADE, related_name='product_daily_stats')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+
+    orders_count = models.IntegerField(default=0)
+    quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['supplier', 'product', 'day'], name='product_daily_stats_uniq'),
+        ]
+        indexes = [
+            # топ товаров поставщика за период
+            models.Index(fields=['supplier', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.day}: {self.quantity}, {self.revenue}"
+
+
+class ConsumerDailyStats(models.Model):
+    """
+    Заказы потребителя у поставщика за день.
+    """
+    supplier = models.ForeignKey(SupplierProfile, on_delete=models.CASCADE, related_name='consumer_daily_stats')
+    consumer = models.ForeignKey(ConsumerProfile, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+
+    orders_count = models.IntegerField(default=0)
+    booked_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['supplier', 'consumer', 'day'], name='consumer_daily_stats_uniq'),
+        ]
+        indexes = [
+            # топ потребителей поставщика за период
+            models.Index(fields=['supplier', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.consumer_id} → {self.supplier_id} {self.day}: {self.orders_count} orders, {self.revenue}"
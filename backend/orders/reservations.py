@@ -0,0 +1,163 @@
+"""
+Stock reservations for pending orders.
+
+A new order holds its quantities right away (place_holds, called from
+OrderSerializer.create in the order's transaction), so an order that can't
+be delivered is refused when it is submitted, not when the supplier
+confirms it. Holds are StockHold rows; their sum per product is kept in
+Product.reserved_quantity by catalog/inventory.py. Available-to-promise is
+stock_quantity - reserved_quantity, one row read, never summed on demand.
+
+A hold ends in one of three ways:
+
+  * confirmation consumes it: the stock and the order's holds are taken off
+    in one guarded statement (confirm_with_holds);
+  * rejection / cancellation releases it immediately (release_order_holds);
+  * it expires after STOCK_HOLD_TTL_MINUTES. The order stays pending and
+    the stock is checked again when it is confirmed.
+
+`manage.py release_stock_holds` (run it every minute from cron) sweeps
+expired holds and active holds of orders that were cancelled or rejected
+some other way. It works in batches. Each batch is selected with
+SELECT ... FOR UPDATE SKIP LOCKED, so several sweepers can run at once and
+a hold being confirmed is never released under it. reconcile_reserved()
+recomputes reserved_quantity from the active holds, for repairs.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from catalog.inventory import decrement_stock, release_reserved, reserve_stock
+from catalog.models import Product
+
+from .models import StockHold
+
+
+SWEEP_BATCH_SIZE = 500
+RELEASED_ORDER_STATUSES = ('cancelled', 'rejected')
+
+
+def hold_ttl():
+    return timedelta(minutes=getattr(settings, 'STOCK_HOLD_TTL_MINUTES', 24 * 60))
+
+
+def _sum_by_product(rows):
+    quantities = {}
+    for product_id, quantity in rows:
+        quantities[product_id] = quantities.get(product_id, Decimal(0)) + quantity
+    return quantities
+
+
+def place_holds(order, lines):
+    """
+    Hold (product_id, quantity) lines for `order`.
+    Raises catalog.inventory.InsufficientStock, nothing is held then.
+    """
+    quantities = _sum_by_product(lines)
+    if not quantities:
+        return
+    expires_at = timezone.now() + hold_ttl()
+    with transaction.atomic(savepoint=False):
+        reserve_stock(quantities.items())
+        StockHold.objects.bulk_create(
+            StockHold(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in quantities.items()
+        )
+
+
+def _take_active(queryset, status):
+    """Lock the active holds of `queryset`, mark them `status`. -> {product_id: quantity}"""
+    holds = list(queryset.filter(status='active').select_for_update().values_list('id', 'product_id', 'quantity'))
+    if holds:
+        StockHold.objects.filter(pk__in=[hold_id for hold_id, _, _ in holds]).update(
+            status=status, released_at=timezone.now()
+        )
+    return _sum_by_product((product_id, quantity) for _, product_id, quantity in holds)
+
+
+def order_holds(order_ids):
+    """Active holds of the orders: {order_id: {product_id: quantity}}."""
+    holds = {}
+    active = StockHold.objects.filter(order_id__in=order_ids, status='active')
+    for order_id, product_id, quantity in active.values_list('order_id', 'product_id', 'quantity'):
+        held = holds.setdefault(order_id, {})
+        held[product_id] = held.get(product_id, Decimal(0)) + quantity
+    return holds
+
+
+def confirm_with_holds(order_ids, lines):
+    """
+    Take the (product_id, quantity) lines of the orders off the stock,
+    consuming their active holds. Raises InsufficientStock (and keeps the
+    holds) if the stock not held by other orders doesn't cover them.
+    """
+    with transaction.atomic(savepoint=False):
+        held = _take_active(StockHold.objects.filter(order_id__in=order_ids), 'consumed')
+        decrement_stock(lines, held)
+
+
+def release_order_holds(order_ids):
+    """Release the active holds of rejected or cancelled orders."""
+    with transaction.atomic(savepoint=False):
+        release_reserved(_take_active(StockHold.objects.filter(order_id__in=order_ids), 'released'))
+
+
+def release_due_holds(batch_size=SWEEP_BATCH_SIZE, now=None):
+    """
+    Release one batch of expired holds and holds of cancelled / rejected
+    orders. Returns how many holds were released (0: nothing left).
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = (
+            StockHold.objects
+            .filter(status='active')
+            .filter(Q(expires_at__lte=now) | Q(order__status__in=RELEASED_ORDER_STATUSES))
+            .order_by('expires_at')
+            # занятые резервы (их прямо сейчас подтверждают) пропускаем, а не ждём
+            .select_for_update(skip_locked=True, of=('self',))
+            .values_list('id', 'product_id', 'quantity')[:batch_size]
+        )
+        holds = list(due)
+        if not holds:
+            return 0
+        StockHold.objects.filter(pk__in=[hold_id for hold_id, _, _ in holds]).update(
+            status='released', released_at=now
+        )
+        release_reserved(_sum_by_product((product_id, quantity) for _, product_id, quantity in holds))
+    return len(holds)
+
+
+def release_all_due_holds(batch_size=SWEEP_BATCH_SIZE):
+    """Sweep until nothing is due. Returns the number of released holds."""
+    released = 0
+    while True:
+        count = release_due_holds(batch_size)
+        released += count
+        if count < batch_size:
+            return released
+
+
+def reconcile_reserved():
+    """
+    Recompute Product.reserved_quantity from the active holds.
+    Returns the number of products that were off.
+    """
+    with transaction.atomic():
+        active = dict(
+            StockHold.objects.filter(status='active')
+            .values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+        )
+        current = Product.objects.select_for_update().filter(Q(pk__in=active) | Q(reserved_quantity__gt=0))
+        wrong = {
+            product_id: active.get(product_id, Decimal(0))
+            for product_id, reserved in current.values_list('id', 'reserved_quantity')
+            if reserved != active.get(product_id, Decimal(0))
+        }
+        for product_id, reserved in wrong.items():
+            Product.objects.filter(pk=product_id).update(reserved_quantity=reserved)
+    return len(wrong)
@@ -1,14 +1,23 @@
-from decimal import Decimal
+from decimal import ROUND_HALF_UP, Decimal
 
+from django.db import transaction
 from rest_framework import serializers
 
-from .models import Order, OrderItem, OrderStatusHistory, OrderStatusHistory
+from .models import Order, OrderItem, OrderStatusHistory, OrderStatusHistory, SupplierDailyStats
+from .analytics import ORDER_FIELDS, STATUS_COLUMNS, record_changes
+from .reservations import place_holds
+from .transitions import SUPPLIER, TRANSITIONS
 from catalog.models import Product
+from catalog.pricing import get_effective_prices
 from catalog.serializers import ProductSerializer
 from accounts.serializers import SupplierProfileSerializer, ConsumerProfileSerializer
 from accounts.models import SupplierProfile
+from scp_project.fieldsets import SparseFieldsetMixin
+from scp_project.images import ThumbSnapshotField
 
 
+CENT = Decimal('0.01')
+
 
 class OrderStatusHistorySerializer(serializers.ModelSerializer):
     changed_by = serializers.StringRelatedField()
@@ -20,15 +29,12 @@ class OrderStatusHistorySerializer(serializers.ModelSerializer):
         ]
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Строка заказа (для чтения + создания).
     """
-    product_id = serializers.PrimaryKeyRelatedField(
-        queryset=Product.objects.all(),
-        source='product',
-        write_only=True
-    )
+    # товары всех строк ищет OrderSerializer.validate одним запросом
+    product_id = serializers.IntegerField(write_only=True, min_value=1)
     product = ProductSerializer(read_only=True)
 
     line_total = serializers.DecimalField(
@@ -36,6 +42,14 @@ class OrderItemSerializer(serializers.ModelSerializer):
         decimal_places=2,
         read_only=True
     )
+    # цену назначает сервер (catalog/pricing.py), от клиента не принимаем
+    unit_price = serializers.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        read_only=True
+    )
+
+    product_thumb = ThumbSnapshotField()
 
     class Meta:
         model = OrderItem
@@ -43,16 +57,30 @@ class OrderItemSerializer(serializers.ModelSerializer):
             'id',
             'product',
             'product_id',
+            'product_name',
+            'product_sku',
+            'product_unit',
+            'product_thumb',
             'quantity',
             'unit_price',
             'line_total',
             'remark',
         ]
+        read_only_fields = ['product_name', 'product_sku', 'product_unit']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderItemSummarySerializer(OrderItemSerializer):
+    """
+    Строка заказа для списков: товар — id и снимок product_* из самой строки,
+    без JOIN к products/categories. Полный товар отдаёт OrderDetailView.
+    """
+    product = serializers.PrimaryKeyRelatedField(read_only=True)
+
+
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Основной сериализатор заказа + вложенные items.
+    ?fields= / ?expand=items,items.product,supplier,consumer_details (scp_project/fieldsets.py).
     """
     items = OrderItemSerializer(many=True)
     supplier = SupplierProfileSerializer(read_only=True)
@@ -85,46 +113,133 @@ class OrderSerializer(serializers.ModelSerializer):
 
     consumer_details = ConsumerProfileSerializer(source='consumer', read_only=True)
 
+    def validate(self, attrs):
+        """
+        Товары всех строк одним запросом (вместе с категорией и ценой для ответа).
+        """
+        items_data = attrs.get('items', [])
+        product_ids = {item_data['product_id'] for item_data in items_data}
+        products = Product.objects.select_related('category__parent', 'price').in_bulk(product_ids)
+
+        errors = []
+        for item_data in items_data:
+            product = products.get(item_data['product_id'])
+            if product is None:
+                errors.append({'product_id': ["Товар не найден."]})
+            else:
+                item_data['product'] = product
+                errors.append({})
+        if any(errors):
+            raise serializers.ValidationError({'items': errors})
+        return attrs
+
     def create(self, validated_data):
         items_data = validated_data.pop('items', [])
 
-        # создаём сам заказ
-        order = Order.objects.create(**validated_data)
-
-        total = Decimal('0')
+        # действующие цены всех строк одним запросом
+        prices = get_effective_prices(item_data['product'].id for item_data in items_data)
 
+        supplier = validated_data['supplier']
+        items, errors = [], []
         for item_data in items_data:
             product = item_data['product']
-            quantity = item_data['quantity']
-            unit_price = item_data['unit_price']
-
-            line_total = quantity * unit_price
-
-            OrderItem.objects.create(
-                order=order,
+            # проверяем здесь, а не в validate: сначала view проверяет линк с поставщиком (403)
+            if product.supplier_id != supplier.id:
+                errors.append({'product_id': ["Товар другого поставщика."]})
+                continue
+            errors.append({})
+            unit_price = prices[product.id]
+            item = OrderItem(
                 product=product,
-                quantity=quantity,
+                quantity=item_data['quantity'],
                 unit_price=unit_price,
-                line_total=line_total,
-                remark=item_data.get('remark', '')
+                line_total=(item_data['quantity'] * unit_price).quantize(CENT, rounding=ROUND_HALF_UP),
+                remark=item_data.get('remark', ''),
             )
+            # bulk_create не вызывает save(): снимок товара заполняем сами
+            item.copy_product_snapshot()
+            items.append(item)
+        if any(errors):
+            raise serializers.ValidationError({'items': errors})
 
-            total += line_total
-
-        # сохраняем итоговую сумму
-        order.total_amount = total
-        order.save()
-
-        # создаём запись в истории статусов
         request = self.context.get('request')
         changed_by = request.user if request and request.user.is_authenticated else None
 
-        OrderStatusHistory.objects.create(
-            order=order,
-            old_status='',
-            new_status=order.status,
-            changed_by=changed_by,
-            comment='Order created via API'
-        )
+        with transaction.atomic():
+            # итог известен заранее: заказ вставляется одним INSERT
+            total = sum((item.line_total for item in items), Decimal('0'))
+            order = Order.objects.create(total_amount=total, **validated_data)
+            for item in items:
+                item.order = order
+            OrderItem.objects.bulk_create(items)
+            # резерв на складе; InsufficientStock откатывает заказ целиком
+            place_holds(order, [(item.product_id, item.quantity) for item in items])
+
+            OrderStatusHistory.objects.create(
+                order=order,
+                old_status='',
+                new_status=order.status,
+                changed_by=changed_by,
+                comment='Order created via API'
+            )
+            # сводки для дашбордов поставщика (orders/analytics.py)
+            record_changes(
+                [(order.id, '', order.status)],
+                {order.id: {field: getattr(order, field) for field in ORDER_FIELDS}},
+            )
 
+        # строки уже в памяти: ответ не перечитывает их из базы
+        order._prefetched_objects_cache = {'items': items}
         return order
+
+
+class OrderListSerializer(OrderSerializer):
+    """
+    Заказ для списков: строки из order_items без товаров (OrderItemSummarySerializer).
+    """
+    items = OrderItemSummarySerializer(many=True, read_only=True)
+
+
+class BulkOrderStatusSerializer(serializers.Serializer):
+    """
+    Пакетное действие поставщика над заказами (orders/transitions.py, apply_many).
+    """
+    action = serializers.ChoiceField(
+        choices=[action for action, transition in TRANSITIONS.items() if transition.actor == SUPPLIER]
+    )
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=500,
+    )
+
+
+class SupplierDailyStatsSerializer(serializers.ModelSerializer):
+    """
+    День дашборда поставщика (orders/analytics.py).
+    statuses: {статус: сколько заказов этого дня сейчас в нём}.
+    """
+    statuses = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SupplierDailyStats
+        fields = ['day', 'orders_count', 'booked_count', 'revenue', 'statuses']
+
+    def get_statuses(self, obj):
+        return {status: getattr(obj, column) for status, column in STATUS_COLUMNS.items()}
+
+
+class TopProductSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    name = serializers.CharField(source='product__name')
+    orders_count = serializers.IntegerField()
+    quantity = serializers.DecimalField(max_digits=14, decimal_places=2)
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class TopConsumerSerializer(serializers.Serializer):
+    consumer_id = serializers.IntegerField()
+    business_name = serializers.CharField(source='consumer__business_name')
+    orders_count = serializers.IntegerField()
+    booked_count = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
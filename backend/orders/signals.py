@@ -0,0 +1,22 @@
+from django.db.models import Q
+from django.dispatch import receiver
+
+from catalog.models import Product
+from scp_project import images
+
+from .models import OrderItem
+
+
+# ---- product thumbs copied onto order lines ----
+
+@receiver(images.derivatives_in_use, sender=Product)
+def order_line_thumbs(sender, pk, names, **kwargs):
+    # старые файлы картинки, на которые ссылаются строки заказов (снимок товара), не удаляем
+    thumbs = (
+        OrderItem.objects
+        .filter(product_id=pk, product_thumb__isnull=False)
+        .filter(Q(product_thumb__webp__in=names) | Q(product_thumb__jpeg__in=names))
+        .values_list('product_thumb', flat=True)
+        .distinct()
+    )
+    return {thumb[image_format] for thumb in thumbs for image_format in ('webp', 'jpeg')} & names
@@ -1,3 +1,998 @@
-from django.test import TestCase
+import csv
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection, connections
+from django.urls import reverse
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from accounts.models import ConsumerProfile, SupplierStaff, User
+from accounts.tests import ScopeFixtureMixin
+from catalog.models import DeliveryOption, Product
+from chat.models import Message
+
+from . import analytics, export, filters, reservations
+from .models import (
+    ConsumerDailyStats,
+    Order,
+    OrderItem,
+    OrderStatusHistory,
+    ProductDailyStats,
+    StockHold,
+    SupplierDailyStats,
+)
+
+
+class KeysetPaginationTest(ScopeFixtureMixin, TestCase):
+
+    def collect(self, url, page_size):
+        ids = []
+        next_url = f"{url}?page_size={page_size}"
+        pages = 0
+        while next_url:
+            response = self.client.get(next_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+            ids.extend(row['id'] for row in response.data['results'])
+            next_url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_lists_stay_unpaginated_by_default(self):
+        self.authenticate(self.consumer_user)
+        response = self.client.get(reverse('order-list-create'))
+        self.assertIsInstance(response.data, list)
+
+    def test_orders_pages_follow_created_at_then_id(self):
+        # одинаковый created_at у нескольких заказов: порядок решает id
+        Order.objects.filter(pk__in=Order.objects.values('pk')[:2]).update(
+            created_at=Order.objects.order_by('created_at').first().created_at
+        )
+        self.authenticate(self.consumer_user)
+        ids, pages = self.collect(reverse('order-list-create'), 2)
+
+        expected = list(Order.objects.order_by('-created_at', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 2)
+
+    def test_page_does_not_count(self):
+        self.authenticate(self.owner)
+        # scope + page of orders + items, no COUNT(*)
+        with self.assertNumQueries(3) as ctx:
+            self.client.get(reverse('my-supplier-orders'), {'page_size': 1})
+        self.assertFalse(any('COUNT(' in q['sql'].upper() for q in ctx.captured_queries))
+
+    def test_messages_pages(self):
+        conv = self.conversations[0]
+        for i in range(5):
+            Message.objects.create(conversation=conv, sender=self.owner, text=f"m{i}")
+        self.authenticate(self.owner)
+        ids, _ = self.collect(reverse('message-list-create', args=[conv.id]), 3)
+        expected = list(conv.messages.order_by('sent_at', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_invalid_cursor(self):
+        self.authenticate(self.consumer_user)
+        response = self.client.get(reverse('order-list-create'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class OrderCreationTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        category = self.products[0].category
+        self.products += [
+            Product.objects.create(
+                supplier=self.supplier, category=category, name=f"Cheese {i}", unit='kg',
+                unit_price=Decimal('2.50'), stock_quantity=Decimal('100'),
+            )
+            for i in range(30)
+        ]
+        self.authenticate(self.consumer_user)
+
+    def create(self, products, quantity='1.5'):
+        return self.client.post(
+            reverse('order-list-create'),
+            {
+                'supplier_id': self.supplier.id,
+                'items': [{'product_id': product.id, 'quantity': quantity} for product in products],
+            },
+            format='json',
+        )
+
+    def test_query_count_does_not_grow_with_lines(self):
+        # первый запрос прогревает кэш линков
+        self.create(self.products[:1])
+        with CaptureQueriesContext(connection) as one:
+            self.assertEqual(self.create(self.products[:1]).status_code, status.HTTP_201_CREATED)
+        with CaptureQueriesContext(connection) as many:
+            response = self.create(self.products)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        # поставщик, товары, цены, заказ, строки, резерв (блокировка, UPDATE, holds), история,
+        # сводки (поставщик, потребитель) (+ savepoint)
+        self.assertEqual(len(many), len(one))
+        self.assertEqual(len(many), 13)
+        self.assertEqual(len(response.data['items']), 33)
+        self.assertEqual(response.data['items'][5]['product']['category']['parent_name'], 'Food')
+
+    def test_totals_items_and_history(self):
+        response = self.create(self.products[:1] + self.products[3:5], quantity='1.33')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+
+        order = Order.objects.get(pk=response.data['id'])
+        # 1.33 × 10.00 = 13.30, 1.33 × 2.50 = 3.325 -> 3.33
+        self.assertEqual(
+            sorted(order.items.values_list('line_total', flat=True)),
+            [Decimal('3.33'), Decimal('3.33'), Decimal('13.30')],
+        )
+        self.assertEqual(order.total_amount, Decimal('19.96'))
+        self.assertEqual(response.data['total_amount'], '19.96')
+        self.assertEqual(order.status_history.get().new_status, 'pending')
+
+    def test_products_must_exist_and_belong_to_the_supplier(self):
+        foreign = Product.objects.create(
+            supplier=self.other_supplier, name="Foreign", unit='kg', unit_price=Decimal('1.00'),
+        )
+        before = Order.objects.count()
+
+        response = self.create([self.products[0], foreign])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['items'][0], {})
+        self.assertIn('product_id', response.data['items'][1])
+
+        response = self.client.post(
+            reverse('order-list-create'),
+            {'supplier_id': self.supplier.id, 'items': [{'product_id': 10 ** 9, 'quantity': '1'}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.count(), before)
+
+
+class OrderListSnapshotTest(ScopeFixtureMixin, TestCase):
+
+    def test_lists_render_lines_from_order_items_alone(self):
+        milk = self.products[0]
+        milk.sku = 'MILK-1'
+        milk.image_variants = {
+            'source': 'products/milk.png', 'width': 800, 'height': 600,
+            'placeholder': 'data:image/jpeg;base64,AAAA',
+        }
+        for size, width in (('thumb', 160), ('list', 480), ('detail', 800)):
+            milk.image_variants[size] = {
+                'webp': f'derivatives/products/milk-{size}.webp', 'jpeg': f'derivatives/products/milk-{size}.jpg',
+                'width': width, 'height': width * 3 // 4,
+            }
+        milk.save()
+        self.authenticate(self.consumer_user)
+        response = self.client.post(
+            reverse('order-list-create'),
+            {'supplier_id': self.supplier.id, 'items': [{'product_id': milk.id, 'quantity': '2'}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        order_id = response.data['id']
+
+        # товар переименовали после заказа: в заказе остаётся то, что заказали
+        Product.objects.filter(pk=milk.pk).update(name='Oat milk', sku='OAT-1', unit='l')
+
+        for url in (reverse('my-consumer-orders'), reverse('order-list-create')):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+            sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+            self.assertNotIn('"products"', sql)
+            self.assertNotIn('"categories"', sql)
+
+            line = next(order for order in response.data if order['id'] == order_id)['items'][0]
+            self.assertEqual(line['product'], milk.id)
+            self.assertEqual(
+                (line['product_name'], line['product_sku'], line['product_unit']), (milk.name, 'MILK-1', milk.unit)
+            )
+            self.assertTrue(line['product_thumb']['webp'].endswith('derivatives/products/milk-thumb.webp'))
+            self.assertEqual(line['product_thumb']['placeholder'], 'data:image/jpeg;base64,AAAA')
+
+        detail = self.client.get(reverse('order-detail', args=[order_id])).data
+        self.assertEqual(detail['items'][0]['product']['name'], 'Oat milk')
+        self.assertEqual(detail['items'][0]['product_name'], milk.name)
+
+    def test_lines_created_directly_get_a_snapshot(self):
+        item = OrderItem.objects.filter(product=self.products[1]).first()
+        self.assertEqual((item.product_name, item.product_unit), (self.products[1].name, self.products[1].unit))
+        self.assertIsNone(item.product_thumb)
+
+
+class OrderFilterTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.orders = list(Order.objects.order_by('id'))
+        confirmed, kefir, _ = self.orders
+        self.delivery = DeliveryOption.objects.create(
+            supplier=self.supplier, delivery_type='delivery', delivery_time_hours=24
+        )
+        Order.objects.filter(pk=confirmed.pk).update(
+            status='confirmed', total_amount=Decimal('50'), delivery_option=self.delivery,
+            requested_delivery_date=timezone.localdate() + timedelta(days=2),
+        )
+        # в названиях нет цифр: поиск по id не должен совпадать с товарами
+        OrderItem.objects.update(product_name="Milk")
+        OrderItem.objects.filter(order=kefir).update(product_name="Kefir")
+
+        bistro_user = User.objects.create_user(username='bistro', email='bistro@example.com', password='password')
+        self.bistro = ConsumerProfile.objects.create(
+            user=bistro_user, business_name="Bistro", business_type="cafe", address="Street 4", city="Almaty"
+        )
+        self.bistro_order = Order.objects.create(
+            consumer=self.bistro, supplier=self.supplier, total_amount=Decimal('5')
+        )
+        OrderItem.objects.create(
+            order=self.bistro_order, product=self.products[0], quantity=Decimal('1'),
+            unit_price=Decimal('5'), line_total=Decimal('5'), product_name="Kefir",
+        )
+
+    def ids(self, user=None, url_name='order-list-create', **params):
+        self.authenticate(user or self.owner)
+        response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return {row['id'] for row in response.data}
+
+    def test_filters(self):
+        confirmed, kefir, plain = (order.id for order in self.orders)
+        today = timezone.localdate()
+        self.assertEqual(self.ids(status='confirmed'), {confirmed})
+        self.assertEqual(self.ids(status='pending,confirmed'), {confirmed, kefir, plain, self.bistro_order.id})
+        self.assertEqual(self.ids(amount_min='30'), {confirmed})
+        self.assertEqual(self.ids(amount_min='10', amount_max='20'), {kefir, plain})
+        self.assertEqual(self.ids(delivery_from=today.isoformat(), delivery_to=(today + timedelta(days=2)).isoformat()), {confirmed})
+        self.assertEqual(self.ids(delivery_option=str(self.delivery.id)), {confirmed})
+        self.assertEqual(self.ids(consumer=str(self.bistro.id)), {self.bistro_order.id})
+        self.assertEqual(self.ids(created_from=(today + timedelta(days=1)).isoformat()), set())
+        self.assertEqual(len(self.ids(created_from=today.isoformat(), created_to=today.isoformat())), 4)
+
+        # те же фильтры у «моих» списков
+        self.assertEqual(self.ids(self.owner, 'my-supplier-orders', status='confirmed'), {confirmed})
+        self.assertEqual(self.ids(self.consumer_user, 'my-consumer-orders', status='pending'), {kefir, plain})
+
+    def test_search(self):
+        confirmed, kefir, plain = (order.id for order in self.orders)
+        self.assertEqual(self.ids(q=str(kefir)), {kefir})
+        self.assertEqual(self.ids(q=f"#{plain}"), {plain})
+        self.assertEqual(self.ids(q="kefir"), {kefir, self.bistro_order.id})
+        self.assertEqual(self.ids(q="caf kefir"), {kefir})
+        self.assertEqual(self.ids(q="bistro"), {self.bistro_order.id})
+        self.assertEqual(self.ids(q="bistro milk"), set())
+        self.assertEqual(self.ids(q="#"), set())
+        # поиск идёт по снимку строки, а не по текущему товару
+        Product.objects.filter(pk=self.products[1].pk).update(name="Kefir")
+        self.assertEqual(self.ids(q="kefir", status='confirmed'), set())
+
+    def test_invalid_params(self):
+        self.authenticate(self.owner)
+        for params in (
+            {'status': 'lost'},
+            {'amount_min': 'abc'},
+            {'amount_max': '-1'},
+            {'consumer': 'x'},
+            {'created_from': '2026-13-01'},
+            {'created_from': '2026-10-02', 'created_to': '2026-10-01'},
+        ):
+            response = self.client.get(reverse('order-list-create'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "EXPLAIN plans are checked on PostgreSQL only")
+class OrderFilterPlanTest(ScopeFixtureMixin, TestCase):
+    """
+    Every filter combination of a supplier's order list is served by an
+    index. Sequential scans are disabled, so the plan falls back to one only
+    if no index fits the query; search must go through the pg_trgm indexes.
+    """
+    cases = [
+        {},
+        {'status': 'pending'},
+        {'status': 'confirmed,in_delivery'},
+        {'status': 'confirmed', 'created_from': '2026-10-01', 'created_to': '2026-10-31'},
+        {'created_from': '2026-10-01'},
+        {'delivery_from': '2026-10-01', 'delivery_to': '2026-10-07'},
+        {'consumer': '1', 'status': 'pending'},
+        {'delivery_option': '1'},
+        {'amount_min': '100', 'amount_max': '500'},
+        {'q': 'milk'},
+        {'q': '42'},
+    ]
+
+    def plan(self, queryset):
+        with connection.cursor() as cursor:
+            cursor.execute("SET enable_seqscan = off")
+            try:
+                return queryset.explain()
+            finally:
+                cursor.execute("RESET enable_seqscan")
+
+    def test_filters_use_indexes(self):
+        base = Order.objects.filter(supplier_id=self.supplier.id).order_by('-created_at', 'id')
+        for params in self.cases:
+            with self.subTest(**params):
+                plan = self.plan(filters.filter_orders(base, params))
+                self.assertNotIn('Seq Scan', plan)
+                if params.get('q') == 'milk':
+                    self.assertIn('order_items_product_name_trgm', plan)
+                    self.assertIn('consumer_profiles_business_name_trgm', plan)
+
+    def test_pending_queue_uses_partial_index(self):
+        plan = self.plan(
+            Order.objects.filter(supplier_id=self.supplier.id, status='pending').order_by('-created_at', 'id')
+        )
+        self.assertIn('orders_supplier_pending_idx', plan)
+
+
+class OrderConfirmationTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.create(consumer=self.consumer, supplier=self.supplier)
+        for product, quantity in ((self.products[0], '30'), (self.products[1], '40'), (self.products[0], '20')):
+            OrderItem.objects.create(
+                order=self.order, product=product, quantity=Decimal(quantity),
+                unit_price=Decimal('10.00'), line_total=Decimal(quantity) * 10,
+            )
+        self.authenticate(self.owner)
+
+    def confirm(self):
+        return self.client.post(reverse('order-confirm', args=[self.order.id]))
+
+    def stock(self):
+        return [product.stock_quantity for product in Product.objects.filter(pk__in=[p.id for p in self.products]).order_by('id')]
+
+    def test_confirm_takes_all_lines_off_the_stock(self):
+        response = self.confirm()
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        # две строки одного товара списываются вместе
+        self.assertEqual(self.stock(), [Decimal('50'), Decimal('60'), Decimal('100')])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'confirmed')
+        self.assertEqual(self.order.status_history.get().new_status, 'confirmed')
+
+        self.assertEqual(self.confirm().status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.stock(), [Decimal('50'), Decimal('60'), Decimal('100')])
+
+    def test_shortfall_changes_nothing(self):
+        Product.objects.filter(pk=self.products[0].pk).update(stock_quantity=Decimal('45'))
+        response = self.confirm()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['items'], [{
+            'product_id': self.products[0].id,
+            'name': self.products[0].name,
+            'available': '45.00',
+            'required': '50.00',
+        }])
+        self.assertEqual(self.stock(), [Decimal('45'), Decimal('100'), Decimal('100')])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+        self.assertFalse(self.order.status_history.exists())
+
+
+class OrderTransitionTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.order = Order.objects.filter(supplier=self.supplier).order_by('id').first()
+
+    def post(self, name, user, order_id=None):
+        self.authenticate(user)
+        return self.client.post(reverse(name, args=[order_id or self.order.id]))
+
+    def test_transition_is_one_conditional_update(self):
+        self.authenticate(self.consumer_user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('consumer-cancel-order', args=[self.order.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(response.data, {'id': self.order.id, 'old_status': 'pending', 'new_status': 'cancelled'})
+
+        # заказ не читается перед изменением: сразу UPDATE ... WHERE status IN (...)
+        # (без PostgreSQL поля заказа для сводок читаются после него)
+        order_queries = [query['sql'] for query in ctx.captured_queries if '"orders_order"' in query['sql']]
+        self.assertTrue(order_queries[0].startswith('UPDATE'))
+        self.assertEqual(sum(sql.startswith('UPDATE') for sql in order_queries), 1)
+        history = self.order.status_history.get()
+        self.assertEqual((history.old_status, history.new_status, history.changed_by_id),
+                         ('pending', 'cancelled', self.consumer_user.id))
+
+    def test_only_one_of_competing_transitions_wins(self):
+        self.assertEqual(self.post('order-confirm', self.owner).status_code, status.HTTP_200_OK)
+        response = self.post('consumer-cancel-order', self.consumer_user)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['detail'], "Нельзя отменить заказ в статусе 'confirmed'.")
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'confirmed')
+        self.assertEqual(self.order.status_history.count(), 1)
+
+    def test_complete_from_either_source_status(self):
+        Order.objects.filter(pk=self.order.pk).update(status='in_delivery')
+        response = self.post('consumer-complete-order', self.consumer_user)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(response.data['old_status'], 'in_delivery')
+
+        response = self.post('consumer-complete-order', self.consumer_user)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_refusals(self):
+        other_owner = User.objects.create_user(
+            username='other', email='other@example.com', password='password', user_type='supplier_owner'
+        )
+        SupplierStaff.objects.create(user=other_owner, supplier=self.other_supplier)
+
+        self.assertEqual(self.post('order-confirm', other_owner).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.post('order-reject', self.consumer_user).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.post('consumer-cancel-order', self.owner).status_code, status.HTTP_403_FORBIDDEN)
+        response = self.post('order-confirm', self.owner, order_id=10 ** 6)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+        self.assertFalse(self.order.status_history.exists())
+
+
+class BulkOrderStatusTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.filter(pk__in=[p.id for p in self.products]).update(stock_quantity=Decimal('10000'))
+
+    def make_orders(self, count, quantity='1', supplier=None):
+        orders = Order.objects.bulk_create(
+            Order(consumer=self.consumer, supplier=supplier or self.supplier) for _ in range(count)
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order, product=product, quantity=Decimal(quantity), unit_price=Decimal('10'),
+                line_total=Decimal(quantity) * 10, product_name=product.name,
+            )
+            for order in orders
+            for product in self.products[:2]
+        )
+        return [order.id for order in orders]
+
+    def bulk(self, action, order_ids, user=None):
+        self.authenticate(user or self.owner)
+        return self.client.post(
+            reverse('order-bulk-status'), {'action': action, 'order_ids': order_ids}, format='json'
+        )
+
+    def test_query_count_does_not_grow_with_orders(self):
+        self.bulk('confirm', self.make_orders(1))
+        with CaptureQueriesContext(connection) as few:
+            response = self.bulk('confirm', self.make_orders(20))
+        self.assertEqual(response.data['applied'], 20)
+        order_ids = self.make_orders(200)
+        with CaptureQueriesContext(connection) as many:
+            response = self.bulk('confirm', order_ids)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(response.data['applied'], 200)
+        # sqlite делит INSERT истории на пачки (лимит параметров), PostgreSQL вставляет одним запросом
+        self.assertLessEqual(len(many), len(few) + 1)
+        self.assertLessEqual(len(many), 20)
+
+        self.assertEqual(Order.objects.filter(pk__in=order_ids, status='confirmed').count(), 200)
+        self.assertEqual(OrderStatusHistory.objects.filter(order_id__in=order_ids, new_status='confirmed').count(), 200)
+        stock = Product.objects.filter(pk__in=[p.id for p in self.products]).order_by('id')
+        self.assertEqual(list(stock.values_list('stock_quantity', flat=True)),
+                         [Decimal('10000') - 221, Decimal('10000') - 221, Decimal('10000')])
+
+    def test_per_order_outcomes(self):
+        Product.objects.filter(pk=self.products[0].pk).update(stock_quantity=Decimal('100'))
+        first, second = self.make_orders(2, quantity='60')
+        confirmed = self.make_orders(1)[0]
+        Order.objects.filter(pk=confirmed).update(status='confirmed')
+        foreign = self.make_orders(1, supplier=self.other_supplier)[0]
+
+        response = self.bulk('confirm', [first, second, confirmed, foreign, 10 ** 6, first])
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        results = {result['id']: result for result in response.data['results']}
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(results[first], {'id': first, 'ok': True, 'old_status': 'pending', 'new_status': 'confirmed'})
+        # заказы обрабатываются по порядку: второму остатка уже не хватает
+        self.assertEqual(results[second]['items'][0]['available'], '40.00')
+        self.assertEqual(
+            [(results[i]['ok'], results[i]['status_code']) for i in (second, confirmed, foreign, 10 ** 6)],
+            [(False, 400), (False, 400), (False, 403), (False, 404)],
+        )
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock_quantity, Decimal('40'))
+        self.assertEqual(Order.objects.get(pk=second).status, 'pending')
+
+    def test_reject_releases_holds(self):
+        self.authenticate(self.consumer_user)
+        order_ids = [
+            self.client.post(
+                reverse('order-list-create'),
+                {'supplier_id': self.supplier.id, 'items': [{'product_id': self.products[0].id, 'quantity': '5'}]},
+                format='json',
+            ).data['id']
+            for _ in range(3)
+        ]
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).reserved_quantity, Decimal('15'))
+
+        response = self.bulk('reject', order_ids)
+        self.assertEqual(response.data['applied'], 3)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).reserved_quantity, Decimal('0'))
+        self.assertFalse(StockHold.objects.filter(order_id__in=order_ids, status='active').exists())
+
+    def test_only_supplier_actions_for_staff(self):
+        order_ids = self.make_orders(2)
+        self.assertEqual(self.bulk('confirm', order_ids, user=self.consumer_user).status_code, 403)
+        self.assertEqual(self.bulk('cancel', order_ids).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.bulk('confirm', []).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.filter(pk__in=order_ids).exclude(status='pending').exists())
+
+
+class OrderAnalyticsTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # заказы фикстуры созданы в обход API и в сводки не попали
+        Order.objects.all().delete()
+
+    def place(self, lines):
+        self.authenticate(self.consumer_user)
+        response = self.client.post(
+            reverse('order-list-create'),
+            {
+                'supplier_id': self.supplier.id,
+                'items': [{'product_id': product.id, 'quantity': quantity} for product, quantity in lines],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        return response.data['id']
+
+    def rollups(self):
+        return [
+            sorted(model.objects.values_list(*[f.attname for f in model._meta.concrete_fields if not f.primary_key]))
+            for model in (SupplierDailyStats, ProductDailyStats, ConsumerDailyStats)
+        ]
+
+    def make_history(self):
+        milk, kefir, cream = self.products
+        confirmed = self.place([(milk, '2'), (kefir, '1'), (milk, '1')])
+        bulk = [self.place([(kefir, '3')]), self.place([(cream, '1')])]
+        cancelled = self.place([(cream, '5')])
+        self.place([(milk, '1')])
+
+        self.authenticate(self.owner)
+        self.client.post(reverse('order-confirm', args=[confirmed]))
+        self.client.post(reverse('order-bulk-status'), {'action': 'confirm', 'order_ids': bulk}, format='json')
+        self.authenticate(self.consumer_user)
+        self.client.post(reverse('consumer-cancel-order', args=[cancelled]))
+        self.client.post(reverse('consumer-complete-order', args=[confirmed]))
+
+    def test_incremental_rollups_match_a_rebuild(self):
+        self.make_history()
+        today = timezone.localdate()
+        day = SupplierDailyStats.objects.get(supplier=self.supplier, day=today)
+        self.assertEqual((day.orders_count, day.booked_count, day.revenue), (5, 3, Decimal('80.00')))
+        self.assertEqual(
+            (day.pending_count, day.confirmed_count, day.completed_count, day.cancelled_count), (1, 2, 1, 1)
+        )
+        milk = ProductDailyStats.objects.get(product=self.products[0], day=today)
+        self.assertEqual((milk.orders_count, milk.quantity, milk.revenue), (1, Decimal('3'), Decimal('30.00')))
+
+        incremental = self.rollups()
+        self.assertEqual(analytics.rebuild_range(today - timedelta(days=3), today, workers=1, chunk_days=2), 1)
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_rebuild_command_repairs_lost_rows(self):
+        self.make_history()
+        expected = self.rollups()
+        SupplierDailyStats.objects.all().delete()
+        ProductDailyStats.objects.filter(product=self.products[0]).update(quantity=Decimal('999'))
+
+        out = StringIO()
+        call_command('rebuild_order_rollups', '--workers', '1', stdout=out)
+        self.assertIn('1 supplier day(s)', out.getvalue())
+        self.assertEqual(self.rollups(), expected)
+
+    def test_dashboards(self):
+        self.make_history()
+        self.authenticate(self.owner)
+        args = [self.supplier.id]
+
+        with CaptureQueriesContext(connection) as ctx:
+            daily = self.client.get(reverse('supplier-daily-stats', args=args))
+        self.assertEqual(daily.status_code, status.HTTP_200_OK, daily.content)
+        self.assertEqual(daily.data['totals'], {'orders_count': 5, 'booked_count': 3, 'revenue': '80.00'})
+        self.assertEqual(daily.data['days'][0]['statuses']['cancelled'], 1)
+        self.assertFalse(any('"orders_order"' in query['sql'] for query in ctx.captured_queries))
+
+        products = self.client.get(reverse('supplier-top-products', args=args), {'limit': 2}).data['products']
+        self.assertEqual(
+            [(row['name'], row['revenue']) for row in products],
+            [(self.products[1].name, '40.00'), (self.products[0].name, '30.00')],
+        )
+        consumers = self.client.get(reverse('supplier-top-consumers', args=args)).data['consumers']
+        self.assertEqual(
+            [(row['business_name'], row['orders_count'], row['revenue']) for row in consumers],
+            [(self.consumer.business_name, 5, '80.00')],
+        )
+
+        yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+        empty = self.client.get(reverse('supplier-daily-stats', args=args), {'to': yesterday}).data
+        self.assertEqual(empty['days'], [])
+
+        for params in ({'from': 'yesterday'}, {'from': '2024-01-01', 'to': '2023-01-01'}, {'from': '2020-01-01'}):
+            response = self.client.get(reverse('supplier-daily-stats', args=args), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+        self.authenticate(self.consumer_user)
+        response = self.client.get(reverse('supplier-daily-stats', args=args))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class StockReservationTest(ScopeFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.milk = self.products[0]
+
+    def place(self, quantity, product=None):
+        self.authenticate(self.consumer_user)
+        return self.client.post(
+            reverse('order-list-create'),
+            {
+                'supplier_id': self.supplier.id,
+                'items': [{'product_id': (product or self.milk).id, 'quantity': quantity}],
+            },
+            format='json',
+        )
+
+    def milk_row(self):
+        return Product.objects.values('stock_quantity', 'reserved_quantity').get(pk=self.milk.pk)
+
+    def test_order_holds_stock_and_refuses_what_is_not_available(self):
+        response = self.place('70')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        hold = StockHold.objects.get(order_id=response.data['id'])
+        self.assertEqual((hold.status, hold.quantity), ('active', Decimal('70')))
+        self.assertEqual(self.milk_row(), {'stock_quantity': Decimal('100'), 'reserved_quantity': Decimal('70')})
+
+        products = self.client.get(reverse('supplier-products', args=[self.supplier.id])).data
+        milk = next(product for product in products if product['id'] == self.milk.id)
+        self.assertEqual((milk['reserved_quantity'], milk['available_quantity']), ('70.00', '30.00'))
+
+        orders_before = Order.objects.count()
+        response = self.place('40')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['items'][0]['available'], '30.00')
+        self.assertEqual(Order.objects.count(), orders_before)
+        self.assertEqual(self.milk_row()['reserved_quantity'], Decimal('70'))
+
+    def test_confirmation_consumes_and_cancellation_releases(self):
+        confirmed_id = self.place('70').data['id']
+        cancelled_id = self.place('20').data['id']
+
+        self.authenticate(self.owner)
+        self.assertEqual(self.client.post(reverse('order-confirm', args=[confirmed_id])).status_code, 200)
+        self.assertEqual(self.milk_row(), {'stock_quantity': Decimal('30'), 'reserved_quantity': Decimal('20')})
+        self.assertEqual(StockHold.objects.get(order_id=confirmed_id).status, 'consumed')
+
+        self.authenticate(self.consumer_user)
+        self.assertEqual(self.client.post(reverse('consumer-cancel-order', args=[cancelled_id])).status_code, 200)
+        self.assertEqual(self.milk_row(), {'stock_quantity': Decimal('30'), 'reserved_quantity': Decimal('0')})
+        self.assertEqual(StockHold.objects.get(order_id=cancelled_id).status, 'released')
+
+    def test_orders_without_holds_cannot_take_held_stock(self):
+        self.place('70')
+        # заказ из фикстуры создан без резерва: ему доступно только то, что не зарезервировано
+        legacy = Order.objects.create(consumer=self.consumer, supplier=self.supplier)
+        OrderItem.objects.create(
+            order=legacy, product=self.milk, quantity=Decimal('40'), unit_price=Decimal('10'), line_total=Decimal('400'),
+        )
+        self.authenticate(self.owner)
+        response = self.client.post(reverse('order-confirm', args=[legacy.id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['items'][0]['available'], '30.00')
+
+    def test_sweeper_releases_expired_and_cancelled_holds_in_batches(self):
+        expired = [self.place('10').data['id'] for _ in range(3)]
+        cancelled = self.place('5').data['id']
+        kept = self.place('1').data['id']
+        StockHold.objects.filter(order_id__in=expired).update(expires_at=timezone.now() - timedelta(minutes=1))
+        # статус поменяли в обход API: резерв остался активным
+        Order.objects.filter(pk=cancelled).update(status='cancelled')
+
+        self.assertEqual(reservations.release_due_holds(batch_size=2), 2)
+        self.assertEqual(reservations.release_all_due_holds(batch_size=2), 2)
+        self.assertEqual(reservations.release_due_holds(), 0)
+
+        self.assertEqual(StockHold.objects.get(order_id=kept).status, 'active')
+        self.assertEqual(StockHold.objects.filter(status='released').count(), 4)
+        self.assertEqual(self.milk_row()['reserved_quantity'], Decimal('1'))
+
+    def test_reconcile(self):
+        self.place('7')
+        Product.objects.filter(pk__in=[self.milk.pk, self.products[1].pk]).update(reserved_quantity=Decimal('50'))
+        self.assertEqual(reservations.reconcile_reserved(), 2)
+        self.assertEqual(
+            list(Product.objects.filter(pk__in=[p.pk for p in self.products]).order_by('id')
+                 .values_list('reserved_quantity', flat=True)),
+            [Decimal('7'), Decimal('0'), Decimal('0')],
+        )
+
+
+class OrderExportTest(ScopeFixtureMixin, TestCase):
+
+    def download(self, user, kind='lines', **params):
+        self.authenticate(user)
+        return self.client.get(reverse('order-export', args=[kind]), params)
+
+    def csv_rows(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith(export.CSV_BOM))
+        return list(csv.reader(StringIO(content[1:])))
+
+    def test_lines_csv_uses_product_snapshot(self):
+        Product.objects.filter(pk=self.products[0].pk).update(name="Renamed")
+        response = self.download(self.owner)
+        self.assertIn('attachment; filename="lines-', response['Content-Disposition'])
+        rows = self.csv_rows(response)
+        self.assertEqual(rows[0], [header for header, _ in export.LINE_COLUMNS])
+        self.assertEqual(len(rows), 10)
+        line = dict(zip(rows[0], rows[1]))
+        self.assertEqual(
+            (line['supplier'], line['consumer'], line['product_name'], line['unit'], line['line_total']),
+            ("Fresh Farm", "Cafe", "Milk 0", 'l', '20.00'),
+        )
+
+    def test_filters_and_scope(self):
+        Order.objects.create(consumer=self.consumer, supplier=self.other_supplier, total_amount=Decimal('5'))
+        first = Order.objects.filter(supplier=self.supplier).order_by('id').first()
+        Order.objects.filter(pk=first.pk).update(status='confirmed')
+
+        self.assertEqual(len(self.csv_rows(self.download(self.owner, 'orders'))), 4)
+        self.assertEqual(len(self.csv_rows(self.download(self.consumer_user, 'orders'))), 5)
+        confirmed = self.csv_rows(self.download(self.owner, 'orders', status='confirmed,completed'))
+        self.assertEqual([row[0] for row in confirmed[1:]], [str(first.pk)])
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.assertEqual(len(self.csv_rows(self.download(self.owner, 'orders', **{'from': tomorrow.isoformat()}))), 1)
+        self.assertEqual(
+            len(self.csv_rows(self.download(self.consumer_user, 'orders', supplier_id=self.other_supplier.id))), 2
+        )
+
+        self.assertEqual(self.download(self.owner, status='lost').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.download(self.owner, type='pdf').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.download(self.owner, 'products').status_code, status.HTTP_404_NOT_FOUND)
+        stranger = User.objects.create_user(username='stranger', email='stranger@example.com', password='password')
+        self.assertEqual(self.download(stranger).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_queries_do_not_grow_with_the_export(self):
+        def count():
+            self.authenticate(self.owner)
+            with CaptureQueriesContext(connection) as queries:
+                self.csv_rows(self.client.get(reverse('order-export', args=['lines'])))
+            return len(queries)
+
+        before = count()
+        for _ in range(5):
+            order = Order.objects.create(consumer=self.consumer, supplier=self.supplier, total_amount=Decimal('10'))
+            OrderItem.objects.create(
+                order=order, product=self.products[0], quantity=Decimal('1'),
+                unit_price=Decimal('10'), line_total=Decimal('10'),
+            )
+        self.assertEqual(count(), before)
+
+    @unittest.skipIf(export.openpyxl is None, "openpyxl is not installed")
+    def test_xlsx(self):
+        response = self.download(self.owner, 'orders', type='xlsx')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], export.CONTENT_TYPES['xlsx'])
+        workbook = export.openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)))
+        rows = list(workbook['orders'].values)
+        self.assertEqual(rows[0][0], 'order_id')
+        self.assertEqual(len(rows), 4)
+        self.assertIsNone(rows[1][1].tzinfo)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_orders', 'orders', '--status', 'pending', '--supplier', str(self.supplier.id), stdout=out)
+        rows = list(csv.reader(StringIO(out.getvalue())))
+        self.assertEqual((rows[0][0], len(rows)), ('order_id', 4))
+
+        if export.openpyxl is None:
+            return
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'lines.xlsx')
+            call_command('export_orders', 'lines', '--format', 'xlsx', '--output', path, stdout=StringIO())
+            self.assertEqual(export.openpyxl.load_workbook(path)['lines'].max_row, 10)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "row locking needs PostgreSQL")
+class ConcurrentConfirmationTest(ScopeFixtureMixin, TransactionTestCase):
+    """
+    1000 overlapping orders confirmed from 16 threads: the stock never goes
+    below zero and equals the initial stock minus what confirmed orders took.
+    Confirm and cancel of the same order: exactly one of them wins.
+    """
+    orders = 1000
+    workers = 16
+
+    def test_no_oversell(self):
+        initial = Decimal('400')
+        Product.objects.filter(pk__in=[p.id for p in self.products]).update(stock_quantity=initial)
+        orders = Order.objects.bulk_create(
+            Order(consumer=self.consumer, supplier=self.supplier) for _ in range(self.orders)
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order, product=product, quantity=Decimal(1 + (index + offset) % 2),
+                unit_price=Decimal('10.00'), line_total=Decimal('10.00'),
+            )
+            for index, order in enumerate(orders)
+            # каждый заказ берёт два товара из трёх, соседние заказы пересекаются
+            for offset, product in enumerate([self.products[index % 3], self.products[(index + 1) % 3]])
+        )
+        owner = User.objects.get(pk=self.owner.pk)
+
+        def confirm(order_id):
+            client = APIClient()
+            client.force_authenticate(user=owner)
+            try:
+                return client.post(reverse('order-confirm', args=[order_id])).status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            codes = list(executor.map(confirm, [order.id for order in orders]))
+
+        self.assertEqual(set(codes) - {status.HTTP_200_OK, status.HTTP_400_BAD_REQUEST}, set())
+        confirmed = OrderItem.objects.filter(order__status='confirmed')
+        self.assertEqual(Order.objects.filter(status='confirmed').count(), codes.count(status.HTTP_200_OK))
+        for product in Product.objects.filter(pk__in=[p.id for p in self.products]):
+            taken = sum(item.quantity for item in confirmed.filter(product=product))
+            self.assertGreaterEqual(product.stock_quantity, 0)
+            self.assertEqual(product.stock_quantity, initial - taken)
+
+    def test_confirm_and_cancel_race(self):
+        orders = Order.objects.bulk_create(
+            Order(consumer=self.consumer, supplier=self.supplier) for _ in range(self.orders // 5)
+        )
+        users = {
+            'order-confirm': User.objects.get(pk=self.owner.pk),
+            'consumer-cancel-order': User.objects.get(pk=self.consumer_user.pk),
+        }
+
+        def post(args):
+            name, order_id = args
+            client = APIClient()
+            client.force_authenticate(user=users[name])
+            try:
+                return order_id, client.post(reverse(name, args=[order_id])).status_code
+            finally:
+                connections.close_all()
+
+        attempts = [(name, order.id) for order in orders for name in users]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(post, attempts))
+
+        for order in orders:
+            codes = sorted(code for order_id, code in results if order_id == order.id)
+            self.assertEqual(codes, [status.HTTP_200_OK, status.HTTP_400_BAD_REQUEST])
+            self.assertEqual(order.status_history.count(), 1)
+
+
+class SparseFieldsetTest(ScopeFixtureMixin, TestCase):
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        return response, [query['sql'] for query in ctx.captured_queries]
+
+    def test_order_rows_without_nested_objects(self):
+        self.authenticate(self.owner)
+        response, queries = self.get(reverse('my-supplier-orders'), fields='id,status,total_amount', expand='')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(set(response.data[0]), {'id', 'status', 'total_amount'})
+
+        # scope + заказы одним запросом: без JOIN, без items
+        orders_sql = queries[-1]
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('JOIN', orders_sql)
+        self.assertNotIn('"notes"', orders_sql)
+
+    def test_collapsed_and_narrowed_relations(self):
+        self.authenticate(self.owner)
+        response, queries = self.get(
+            reverse('my-supplier-orders'), fields='id,supplier,items.quantity,items.product', expand='',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        row = response.data[0]
+        order = Order.objects.get(pk=row['id'])
+        self.assertEqual(row['supplier'], order.supplier_id)
+        self.assertEqual(
+            sorted((item['product'], str(item['quantity'])) for item in row['items']),
+            sorted((item.product_id, str(item.quantity)) for item in order.items.all()),
+        )
+        self.assertEqual(len(queries), 3)
+        self.assertFalse(any('JOIN' in sql for sql in queries[1:]))
+
+        response = self.client.get(reverse('my-supplier-orders'), {'fields': 'id,items.product_name'})
+        self.assertEqual(set(response.data[0]['items'][0]), {'product_name'})
+
+        order_id = response.data[0]['id']
+        response = self.client.get(reverse('order-detail', args=[order_id]), {'fields': 'id,items.product.name'})
+        self.assertEqual(set(response.data['items'][0]['product']), {'name'})
+
+    def test_default_response_is_unchanged(self):
+        self.authenticate(self.owner)
+        full = self.client.get(reverse('my-supplier-orders')).data[0]
+        self.assertIn('consumer_details', full)
+        self.assertIsInstance(full['supplier'], dict)
+        self.assertIsInstance(full['items'][0]['product'], int)
+        detail = self.client.get(reverse('order-detail', args=[full['id']])).data
+        self.assertIsInstance(detail['items'][0]['product']['category'], dict)
+
+        expanded = self.client.get(reverse('my-supplier-orders'), {'expand': 'items,supplier'}).data[0]
+        self.assertIsInstance(expanded['supplier'], dict)
+        self.assertIsInstance(expanded['items'][0]['product'], int)
+        self.assertIsInstance(expanded['consumer_details'], int)
+
+    def test_product_list_loads_only_requested_columns(self):
+        self.authenticate(self.consumer_user)
+        url = reverse('supplier-products', args=[self.supplier.id])
+        response, queries = self.get(url, fields='id,name,effective_price,category', expand='', page_size=2)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'name', 'effective_price', 'category'})
+        self.assertEqual(row['category'], self.products[0].category_id)
+
+        products_sql = queries[-1]
+        self.assertIn('product_prices', products_sql)
+        self.assertNotIn('categories', products_sql)
+        self.assertNotIn('"description"', products_sql)
+
+        # страница продолжается по курсору: ключи сортировки загружены
+        response = self.client.get(response.data['next'])
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'effective_price', 'category'})
+
+    def test_conversations_skip_unrequested_subqueries(self):
+        self.authenticate(self.owner)
+        response, queries = self.get(reverse('conversation-list-create'), fields='id,supplier_name')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(response.data[0]['supplier_name'], self.supplier.company_name)
+        self.assertNotIn('chat_message', queries[-1])
+        self.assertIn('JOIN "supplier_profiles"', queries[-1])
+        self.assertNotIn('consumer_profiles', queries[-1])
+
+        response = self.client.get(reverse('conversation-list-create'), {'fields': 'id,last_message'})
+        self.assertIsNotNone(response.data[0]['last_message'])
+
+    def test_complaint_rows(self):
+        self.authenticate(self.owner)
+        response, queries = self.get(reverse('complaint-list-create'), fields='id,title,can_escalate')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(set(response.data[0]), {'id', 'title', 'can_escalate'})
+        self.assertNotIn('JOIN', queries[-1])
+
+        complaint_id = response.data[0]['id']
+        response = self.client.get(
+            reverse('complaint-detail', args=[complaint_id]), {'fields': 'id,responses', 'expand': ''}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertIsInstance(response.data['responses'], list)
+
+    def test_unknown_fields_are_rejected(self):
+        self.authenticate(self.owner)
+        for params in ({'fields': 'id,secret'}, {'expand': 'status'}, {'fields': 'items.nope'}):
+            response = self.client.get(reverse('my-supplier-orders'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
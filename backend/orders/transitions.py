@@ -0,0 +1,337 @@
+"""
+Order status transitions.
+
+Every status change of an order is a Transition: the statuses it may start
+from, the status it leads to, who may perform it, and an optional effect
+(stock) that runs in the same transaction. apply() performs one:
+
+    result = transitions.apply(order_id, 'confirm', request)
+
+The change is a conditional UPDATE per source status, no SELECT and no lock
+taken beforehand; the first one that matches tells the previous status:
+
+    UPDATE orders_order SET status = 'confirmed', updated_at = now()
+    WHERE id = ... AND status = 'pending' AND supplier_id IN (...)
+    RETURNING id, supplier_id, ...
+
+If two transitions race (confirm and cancel of the same pending order),
+the database lets exactly one UPDATE match; the other finds the new status
+and is refused. The effect and the OrderStatusHistory row are written in
+the transaction of the UPDATE, so a failing effect (InsufficientStock)
+rolls the status back too; so are the dashboard rollups (orders/analytics.py).
+
+Only a refused transition reads the order, to tell "not found" (404),
+"not yours" (403), "not from this status" (400) and "changed meanwhile"
+(409) apart. These are raised as DRF exceptions.
+
+A transition with one source status takes one statement ('complete', from
+'confirmed' or 'in_delivery', up to two). On PostgreSQL the UPDATE also
+returns the order fields the dashboard rollups need.
+
+apply_many() performs one action on many orders (supplier staff confirming
+the morning's orders) with a fixed number of statements: the user is
+authorized once, the eligible orders are locked with one SELECT, a
+transition's `admit` step drops the orders it can't take (confirmation:
+allocate_stock, first come first served), and the rest get one UPDATE, one
+effect and one bulk history INSERT. Each order gets its own outcome.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, PermissionDenied
+
+from accounts.scope import get_access_scope
+
+from catalog.inventory import InsufficientStock, allocate_stock
+
+from . import analytics
+from .models import Order, OrderItem, OrderStatusHistory
+from .reservations import confirm_with_holds, order_holds, release_order_holds
+
+
+SUPPLIER = 'supplier'
+CONSUMER = 'consumer'
+
+TRANSITION_SQL = """
+UPDATE {table}
+SET status = %s, updated_at = %s
+WHERE id = %s AND status = %s{guard}
+RETURNING id, supplier_id, consumer_id, created_at, total_amount
+"""
+
+
+class TransitionRefused(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = "Transition is not allowed."
+    default_code = 'transition_refused'
+
+
+class TransitionConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Статус заказа уже изменился."
+    default_code = 'transition_conflict'
+
+
+def _order_lines(order_ids):
+    lines = {}
+    for order_id, product_id, quantity in (
+        OrderItem.objects.filter(order_id__in=order_ids).values_list('order_id', 'product_id', 'quantity')
+    ):
+        lines.setdefault(order_id, []).append((product_id, quantity))
+    return lines
+
+
+def _covered_by_stock(order_ids):
+    # заказы, которые склад покрывает целиком, в порядке запроса; остальные — с нехваткой
+    lines, holds = _order_lines(order_ids), order_holds(order_ids)
+    return allocate_stock((order_id, lines.get(order_id, []), holds.get(order_id)) for order_id in order_ids)
+
+
+def _consume_stock(order_ids):
+    # все строки списываются одним запросом, всё или ничего; резервы заказов гасятся
+    lines = OrderItem.objects.filter(order_id__in=order_ids).values_list('product_id', 'quantity')
+    confirm_with_holds(order_ids, list(lines))
+
+
+def _release_stock(order_ids):
+    # резерв больше не нужен: товар снова доступен другим заказам
+    release_order_holds(order_ids)
+
+
+class Transition:
+    """
+    One edge of the order state machine.
+
+    actor: SUPPLIER (staff of the order's supplier) or CONSUMER (the order's
+    consumer); a superuser may do both. effect(order_ids) runs after the
+    status is changed, inside the same transaction. admit(order_ids), for
+    apply_many, picks the orders the effect can take before anything is
+    changed: -> ([admitted ids], {order_id: shortfalls}).
+    """
+
+    def __init__(self, action, sources, target, actor, comment, forbidden, refused, not_actor=None,
+                 effect=None, admit=None):
+        self.action = action
+        self.sources = tuple(sources)
+        self.target = target
+        self.actor = actor
+        self.comment = comment
+        self.forbidden = forbidden
+        self.refused = refused
+        self.not_actor = not_actor
+        self.effect = effect
+        self.admit = admit
+
+
+TRANSITIONS = {
+    transition.action: transition
+    for transition in (
+        Transition(
+            'confirm', ['pending'], 'confirmed', SUPPLIER,
+            comment='Order confirmed by supplier via API',
+            forbidden="Вы не можете подтверждать заказы для этого поставщика.",
+            refused="Нельзя подтвердить заказ в статусе '{status}'.",
+            effect=_consume_stock,
+            admit=_covered_by_stock,
+        ),
+        Transition(
+            'reject', ['pending'], 'rejected', SUPPLIER,
+            comment='Order rejected by supplier via API',
+            forbidden="Вы не можете отклонять заказы для этого поставщика.",
+            refused="Нельзя отклонить заказ в статусе '{status}'.",
+            effect=_release_stock,
+        ),
+        Transition(
+            'cancel', ['pending'], 'cancelled', CONSUMER,
+            comment='Order cancelled by consumer via API',
+            not_actor="Только потребитель может отменять заказ.",
+            forbidden="Вы не можете отменять чужой заказ.",
+            refused="Нельзя отменить заказ в статусе '{status}'.",
+            effect=_release_stock,
+        ),
+        Transition(
+            'complete', ['confirmed', 'in_delivery'], 'completed', CONSUMER,
+            comment='Order completed by consumer via API',
+            not_actor="Только потребитель может завершать заказ.",
+            forbidden="Вы не можете завершать чужой заказ.",
+            refused="Нельзя завершить заказ в статусе '{status}'. Допустимые статусы: ['confirmed', 'in_delivery'].",
+        ),
+    )
+}
+
+
+class TransitionResult:
+    def __init__(self, order_id, old_status, new_status):
+        self.order_id = order_id
+        self.old_status = old_status
+        self.new_status = new_status
+
+    def as_dict(self):
+        return {"id": self.order_id, "old_status": self.old_status, "new_status": self.new_status}
+
+
+def _guard(transition, scope):
+    """
+    {column: allowed ids} restricting the UPDATE to orders the user may
+    change, {} for a superuser, None if the user may change none.
+    """
+    if scope.is_superuser:
+        return {}
+    if transition.actor == SUPPLIER:
+        return {'supplier_id': sorted(scope.supplier_ids)} if scope.supplier_ids else None
+    return {'consumer_id': [scope.consumer_id]} if scope.is_consumer else None
+
+
+def _update_postgres(order_id, transition, guard, now):
+    conditions, guard_params = [], []
+    for column, ids in guard.items():
+        conditions.append(f" AND {column} IN ({', '.join(['%s'] * len(ids))})")
+        guard_params.extend(ids)
+    sql = TRANSITION_SQL.format(table=connection.ops.quote_name(Order._meta.db_table), guard=''.join(conditions))
+    with connection.cursor() as cursor:
+        for source in transition.sources:
+            cursor.execute(sql, [transition.target, now, order_id, source, *guard_params])
+            row = cursor.fetchone()
+            if row is not None:
+                # поля заказа для сводок (orders/analytics.py), без отдельного SELECT
+                return source, dict(zip(analytics.ORDER_FIELDS, row))
+    return None, None
+
+
+def _update_portable(order_id, transition, guard, now):
+    orders = Order.objects.filter(pk=order_id, **{f'{column}__in': ids for column, ids in guard.items()})
+    for source in transition.sources:
+        if orders.filter(status=source).update(status=transition.target, updated_at=now):
+            return source, None
+    return None, None
+
+
+def _refusals(order_ids, transition, scope):
+    """Why the orders weren't changed: {order_id: exception to raise}, one query."""
+    orders = {
+        order['id']: order
+        for order in Order.objects.filter(pk__in=order_ids).values('id', 'status', 'supplier_id', 'consumer_id')
+    }
+
+    def refusal(order):
+        if order is None:
+            return NotFound("Order not found.")
+        if not scope.is_superuser:
+            if transition.actor == SUPPLIER and not scope.is_staff_of(order['supplier_id']):
+                return PermissionDenied(transition.forbidden)
+            if transition.actor == CONSUMER and order['consumer_id'] != scope.consumer_id:
+                return PermissionDenied(transition.forbidden)
+        if order['status'] not in transition.sources:
+            return TransitionRefused(transition.refused.format(status=order['status']))
+        return TransitionConflict()
+
+    return {order_id: refusal(orders.get(order_id)) for order_id in order_ids}
+
+
+def _authorize(transition, request):
+    """-> (scope, guard); a user who can't perform the action at all gets PermissionDenied."""
+    scope = get_access_scope(request)
+    if transition.actor == CONSUMER and not scope.is_consumer and transition.not_actor:
+        raise PermissionDenied(transition.not_actor)
+    return scope, _guard(transition, scope)
+
+
+def _write_history(order_ids, old_statuses, transition, user, comment, orders=None):
+    analytics.record_changes(
+        [(order_id, old_statuses[order_id], transition.target) for order_id in order_ids], orders
+    )
+    OrderStatusHistory.objects.bulk_create(
+        OrderStatusHistory(
+            order_id=order_id,
+            old_status=old_statuses[order_id],
+            new_status=transition.target,
+            changed_by=user,
+            comment=comment or transition.comment,
+        )
+        for order_id in order_ids
+    )
+
+
+def apply(order_id, action, request, comment=None):
+    """
+    Perform `action` (a key of TRANSITIONS) on the order as the request's
+    user. Returns a TransitionResult; raises NotFound, PermissionDenied,
+    TransitionRefused, TransitionConflict, or whatever the effect raises
+    (InsufficientStock), with nothing changed.
+    """
+    transition = TRANSITIONS[action]
+    scope, guard = _authorize(transition, request)
+    with transaction.atomic():
+        old_status, order = None, None
+        if guard is not None:
+            update = _update_postgres if connection.vendor == 'postgresql' else _update_portable
+            old_status, order = update(order_id, transition, guard, timezone.now())
+        if old_status is None:
+            raise _refusals([order_id], transition, scope)[order_id]
+
+        if transition.effect is not None:
+            transition.effect([order_id])
+        orders = {order_id: order} if order is not None else None
+        _write_history([order_id], {order_id: old_status}, transition, request.user, comment, orders)
+    return TransitionResult(order_id, old_status, transition.target)
+
+
+def _failure(order_id, exc):
+    """Outcome of an order apply_many didn't change."""
+    if isinstance(exc, InsufficientStock):
+        return {
+            "id": order_id,
+            "ok": False,
+            "status_code": status.HTTP_400_BAD_REQUEST,
+            "detail": "Недостаточно товара на складе для некоторых позиций.",
+            "items": exc.shortfalls,
+        }
+    return {"id": order_id, "ok": False, "status_code": exc.status_code, "detail": str(exc.detail)}
+
+
+def apply_many(order_ids, action, request, comment=None):
+    """
+    Perform `action` on each of the orders, in one transaction and a fixed
+    number of queries. Returns one outcome per distinct id, in request
+    order: {"id", "ok": True, "old_status", "new_status"} or _failure().
+    Raises PermissionDenied if the user may not perform the action at all.
+    """
+    transition = TRANSITIONS[action]
+    scope, guard = _authorize(transition, request)
+    if guard is None:
+        raise PermissionDenied(transition.forbidden)
+    order_ids = list(dict.fromkeys(order_ids))
+
+    outcomes = {}
+    with transaction.atomic():
+        # блокируем подходящие заказы в порядке id: параллельные пакеты ждут, а не взаимно блокируются
+        locked = {
+            order['id']: order
+            for order in Order.objects
+            .filter(pk__in=order_ids, status__in=transition.sources, **{f'{c}__in': ids for c, ids in guard.items()})
+            .order_by('id')
+            .select_for_update()
+            .values('status', *analytics.ORDER_FIELDS)
+        }
+        eligible = {order_id: order['status'] for order_id, order in locked.items()}
+        refused = [order_id for order_id in order_ids if order_id not in eligible]
+        if refused:
+            for order_id, exc in _refusals(refused, transition, scope).items():
+                outcomes[order_id] = _failure(order_id, exc)
+
+        admitted = [order_id for order_id in order_ids if order_id in eligible]
+        if admitted and transition.admit is not None:
+            admitted, short = transition.admit(admitted)
+            for order_id, shortfalls in short.items():
+                outcomes[order_id] = _failure(order_id, InsufficientStock(shortfalls))
+
+        if admitted:
+            Order.objects.filter(pk__in=admitted).update(status=transition.target, updated_at=timezone.now())
+            if transition.effect is not None:
+                transition.effect(admitted)
+            _write_history(admitted, eligible, transition, request.user, comment, locked)
+            for order_id in admitted:
+                outcomes[order_id] = {
+                    "id": order_id, "ok": True, "old_status": eligible[order_id], "new_status": transition.target,
+                }
+    return [outcomes[order_id] for order_id in order_ids]
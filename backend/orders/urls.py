@@ -8,6 +8,11 @@ from .views import (
     SupplierRejectOrderView,
     ConsumerCancelOrderView,
     ConsumerCompleteOrderView,
+    SupplierBulkOrderStatusView,
+    SupplierDailyStatsView,
+    SupplierTopProductsView,
+    SupplierTopConsumersView,
+    OrderExportView,
     OrderStatusHistoryListView,
 )
 
@@ -23,5 +28,22 @@ urlpatterns = [
     path('orders/<int:pk>/reject/', SupplierRejectOrderView.as_view(), name='order-reject'),
     path('orders/<int:pk>/cancel/', ConsumerCancelOrderView.as_view(), name='consumer-cancel-order'),
     path('orders/<int:pk>/complete/', ConsumerCompleteOrderView.as_view(), name='consumer-complete-order'),
+    path('orders/bulk-status/', SupplierBulkOrderStatusView.as_view(), name='order-bulk-status'),
+
+    # выгрузка для бухгалтерии (CSV / XLSX)
+    path('orders/export/<str:kind>/', OrderExportView.as_view(), name='order-export'),
+
+    # дашборды поставщика (сводки orders/analytics.py)
+    path('orders/stats/suppliers/<int:supplier_id>/daily/', SupplierDailyStatsView.as_view(), name='supplier-daily-stats'),
+    path(
+        'orders/stats/suppliers/<int:supplier_id>/top-products/',
+        SupplierTopProductsView.as_view(),
+        name='supplier-top-products',
+    ),
+    path(
+        'orders/stats/suppliers/<int:supplier_id>/top-consumers/',
+        SupplierTopConsumersView.as_view(),
+        name='supplier-top-consumers',
+    ),
     path('<int:order_id>/history/', OrderStatusHistoryListView.as_view(), name='order-status-history'),
 ]
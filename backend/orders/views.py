@@ -1,63 +1,108 @@
+from datetime import timedelta
+from decimal import Decimal
+
 from rest_framework import generics, permissions
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from .models import Order, OrderItem, OrderStatusHistory
-from .serializers import OrderSerializer, OrderStatusHistorySerializer
-
-from accounts.models import (
-    ConsumerProfile,
-    SupplierStaff,
-    ConsumerSupplierLink,
+from .models import ConsumerDailyStats, Order, OrderItem, OrderStatusHistory, ProductDailyStats, SupplierDailyStats
+from . import export, transitions
+from .filters import filter_orders
+from .serializers import (
+    BulkOrderStatusSerializer,
+    OrderListSerializer,
+    OrderSerializer,
+    OrderStatusHistorySerializer,
+    SupplierDailyStatsSerializer,
+    TopConsumerSerializer,
+    TopProductSerializer,
 )
-from catalog.models import Product
 
+from accounts.scope import get_access_scope
+from scp_project import params as query
+from scp_project.fieldsets import SparseFieldsetViewMixin
+from catalog.inventory import InsufficientStock
+from django.db.models import Prefetch, Sum
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.utils import timezone
 
 
+def order_items_prefetch():
+    """
+    items + product + category одним запросом (OrderItemSerializer вкладывает ProductSerializer).
+    Спискам это не нужно: OrderListSerializer читает снимок товара из самих строк.
+    """
+    return Prefetch(
+        'items',
+        queryset=OrderItem.objects.select_related('product__category__parent', 'product__price'),
+    )
+
 
 class OrderStatusHistoryListView(generics.ListAPIView):
     serializer_class = OrderStatusHistorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('changed_at', 'id')
 
     def get_queryset(self):
         order_id = self.kwargs.get('order_id')
-        user = self.request.user
+        scope = get_access_scope(self.request)
         # Only allow access if user can see the order
         try:
-            order = Order.objects.get(id=order_id)
+            order = Order.objects.only('id', 'supplier_id', 'consumer_id').get(id=order_id)
         except Order.DoesNotExist:
             return OrderStatusHistory.objects.none()
 
         # superuser can see all
-        if user.is_superuser:
+        if scope.is_superuser:
             return OrderStatusHistory.objects.filter(order=order)
 
         # supplier staff for this order
-        if hasattr(user, 'supplier_staff') and order.supplier == user.supplier_staff.supplier:
+        if scope.is_staff_of(order.supplier_id):
             return OrderStatusHistory.objects.filter(order=order)
 
         # consumer who owns the order
-        if hasattr(user, 'consumer_profile') and order.consumer == user.consumer_profile:
+        if scope.is_consumer and order.consumer_id == scope.consumer_id:
             return OrderStatusHistory.objects.filter(order=order)
 
         return OrderStatusHistory.objects.none()
 
 
-class OrderListCreateView(generics.ListCreateAPIView):
+class OrderFilterMixin:
+    """
+    Фильтры и поиск списков заказов (orders/filters.py):
+    ?status=&created_from=&created_to=&delivery_from=&delivery_to=&consumer=&delivery_option=
+    &amount_min=&amount_max=&q=
+    """
+
+    def filter_queryset(self, queryset):
+        return filter_orders(super().filter_queryset(queryset), self.request.query_params)
+
+
+class OrderListCreateView(OrderFilterMixin, SparseFieldsetViewMixin, generics.ListCreateAPIView):
     """
     GET: список заказов текущего пользователя:
          - superuser: все заказы
          - supplier staff: заказы своего поставщика(ов)
          - consumer: только свои заказы
+         ?fields= / ?expand= — только нужные поля и вложенные объекты (scp_project/fieldsets.py)
+         фильтры и поиск ?status=&created_from=&...&q= — OrderFilterMixin
+         строки заказов — со снимком товара, без самих товаров (OrderListSerializer)
     POST: создать новый заказ (только consumer с accepted-линком к поставщику).
+          Количества сразу резервируются на складе; если их нет — 400 со списком позиций.
     """
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('-created_at', 'id')
+
+    def get_serializer_class(self):
+        if self.request is not None and self.request.method == 'GET':
+            return OrderListSerializer
+        return OrderSerializer
 
     def get_queryset(self):
-        user = self.request.user
+        scope = get_access_scope(self.request)
 
         base_qs = (
             Order.objects
@@ -67,34 +112,30 @@ class OrderListCreateView(generics.ListCreateAPIView):
         )
 
         # 1) суперюзер видит всё
-        if user.is_superuser:
+        if scope.is_superuser:
             return base_qs
 
         # 2) staff поставщика
-        staff_links = SupplierStaff.objects.filter(user=user).values_list('supplier_id', flat=True)
-        if staff_links:
-            return base_qs.filter(supplier_id__in=staff_links)
+        if scope.supplier_ids:
+            return base_qs.filter(supplier_id__in=scope.supplier_ids)
 
         # 3) consumer
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
+        if not scope.is_consumer:
             # ни staff, ни consumer – ничего не видит
             return Order.objects.none()
 
-        return base_qs.filter(consumer=consumer_profile)
+        return base_qs.filter(consumer_id=scope.consumer_id)
 
     def perform_create(self, serializer):
         """
         Создать заказ от имени текущего consumer.
         Проверяем наличие accepted-линка к выбранному поставщику.
         """
-        user = self.request.user
+        scope = get_access_scope(self.request)
 
         # 1) проверяем, что у пользователя есть ConsumerProfile
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
+        consumer_profile = scope.consumer_profile
+        if consumer_profile is None:
             raise PermissionDenied("Только пользователи с ConsumerProfile могут создавать заказы.")
 
         supplier = serializer.validated_data.get('supplier')
@@ -103,316 +144,314 @@ class OrderListCreateView(generics.ListCreateAPIView):
             raise PermissionDenied("Не указан поставщик для заказа.")
 
         # 2) проверяем accepted-линк между consumer и этим поставщиком
-        has_link = ConsumerSupplierLink.objects.filter(
-            consumer=consumer_profile,
-            supplier=supplier,
-            status='accepted',
-        ).exists()
-
-        if not has_link:
+        if not scope.has_accepted_link(supplier.id):
             raise PermissionDenied("Нет одобренной связи с этим поставщиком. Сначала запросите линк.")
 
         # 3) сохраняем заказ, передаём consumer в serializer
         serializer.save(consumer=consumer_profile)
 
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except InsufficientStock as exc:
+            return Response(
+                {
+                    "detail": "Недостаточно товара на складе для некоторых позиций.",
+                    "items": exc.shortfalls,
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
 
-class OrderDetailView(generics.RetrieveAPIView):
+class OrderDetailView(SparseFieldsetViewMixin, generics.RetrieveAPIView):
     """
     Получить один заказ по id.
     """
-    queryset = Order.objects.all().select_related('consumer', 'supplier', 'delivery_option').prefetch_related('items')
+    queryset = (
+        Order.objects.all()
+        .select_related('consumer', 'supplier', 'delivery_option')
+        .prefetch_related(order_items_prefetch())
+    )
     serializer_class = OrderSerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = 'pk'
 
-class MyConsumerOrdersView(generics.ListAPIView):
+class MyConsumerOrdersView(OrderFilterMixin, SparseFieldsetViewMixin, generics.ListAPIView):
     """
     Список заказов текущего пользователя как потребителя (ресторан/отель).
     URL: /api/orders/my/consumer/
     """
-    serializer_class = OrderSerializer
+    serializer_class = OrderListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('-created_at', 'id')
 
     def get_queryset(self):
-        user = self.request.user
+        scope = get_access_scope(self.request)
+        if not scope.is_consumer:
+            return Order.objects.none()
         return (
             Order.objects
-            .filter(consumer__user=user)
+            .filter(consumer_id=scope.consumer_id)
             .select_related('consumer', 'supplier', 'delivery_option')
             .prefetch_related('items')
             .order_by('-created_at')
         )
 
 
-class MySupplierOrdersView(generics.ListAPIView):
+class MySupplierOrdersView(OrderFilterMixin, SparseFieldsetViewMixin, generics.ListAPIView):
     """
     Список заказов для поставщика, с которым связан текущий пользователь (через SupplierStaff).
     URL: /api/orders/my/supplier/
     """
-    serializer_class = OrderSerializer
+    serializer_class = OrderListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    keyset_ordering = ('-created_at', 'id')
 
     def get_queryset(self):
-        user = self.request.user
-
-        staff_links = SupplierStaff.objects.filter(user=user).select_related('supplier')
-        supplier_ids = [s.supplier_id for s in staff_links]
+        scope = get_access_scope(self.request)
+        if not scope.supplier_ids:
+            return Order.objects.none()
 
         return (
             Order.objects
-            .filter(supplier_id__in=supplier_ids)
+            .filter(supplier_id__in=scope.supplier_ids)
             .select_related('consumer', 'supplier', 'delivery_option')
             .prefetch_related('items')
             .order_by('-created_at')
         )
 
-class BaseOrderStatusView(APIView):
+class OrderExportView(APIView):
     """
-    Базовый класс для изменения статуса заказа.
-    Потом от него наследуются confirm/reject/cancel.
+    Выгрузка заказов для бухгалтерии: GET /api/orders/export/<orders|lines>/
+      ?type=csv|xlsx (по умолчанию csv; xlsx — только если установлен openpyxl)
+      ?from=YYYY-MM-DD&to=YYYY-MM-DD — по дате создания заказа
+      ?status=confirmed,completed (или несколько ?status=)
+      ?supplier_id= / ?consumer_id= — сузить выборку (id или список id через запятую)
+    Видимость как у списка заказов: superuser — все, staff — заказы своих поставщиков,
+    consumer — свои. Строки читаются курсором и пишутся в ответ по мере чтения (orders/export.py),
+    память не растёт с размером выгрузки.
     """
     permission_classes = [permissions.IsAuthenticated]
-    new_status = None  # переопределяем в наследниках
-
-    def post(self, request, pk):
-        # ищем заказ
-        try:
-            order = Order.objects.select_related('supplier', 'consumer').prefetch_related('items').get(pk=pk)
-        except Order.DoesNotExist:
-            return Response({"detail": "Order not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        if self.new_status is None:
-            return Response({"detail": "Invalid action."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # вызываем конкретную логику в наследнике
-        return self.handle_order(request, order)
+    def get(self, request, kind):
+        if kind not in export.KINDS:
+            raise Http404
+        file_format = request.query_params.get('type', 'csv')
+        if file_format not in export.FORMATS:
+            raise ValidationError({'type': f"Допустимые значения: {', '.join(export.FORMATS)}."})
+        if file_format == 'xlsx' and export.openpyxl is None:
+            raise ValidationError({'type': "XLSX недоступен на сервере (нет openpyxl), выгрузите CSV."})
+
+        start, end = query.date(request.query_params, 'from'), query.date(request.query_params, 'to')
+        if start and end and start > end:
+            raise ValidationError({'from': "Начало периода позже конца."})
+        orders = export.filter_orders(self.get_orders(request), start, end, self.get_statuses(request))
+        rows = export.rows(orders, kind)
+
+        filename = f"{kind}-{timezone.localdate():%Y%m%d}.{file_format}"
+        if file_format == 'xlsx':
+            # zip-контейнер собирается во временном файле и отдаётся с диска
+            return FileResponse(
+                export.xlsx_file(rows, title=kind),
+                as_attachment=True,
+                filename=filename,
+                content_type=export.CONTENT_TYPES['xlsx'],
+            )
+        response = StreamingHttpResponse(export.iter_csv(rows), content_type=export.CONTENT_TYPES['csv'])
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def get_orders(self, request):
+        scope = get_access_scope(request)
+        if scope.is_superuser:
+            orders = Order.objects.all()
+        elif scope.supplier_ids:
+            orders = Order.objects.filter(supplier_id__in=scope.supplier_ids)
+        elif scope.is_consumer:
+            orders = Order.objects.filter(consumer_id=scope.consumer_id)
+        else:
+            raise PermissionDenied("Нет доступа к заказам.")
+
+        for param in ('supplier_id', 'consumer_id'):
+            ids = query.ids(request.query_params, param)
+            if ids:
+                orders = orders.filter(**{f'{param}__in': ids})
+        return orders
+
+    def get_statuses(self, request):
+        statuses = {
+            status_value.strip()
+            for value in request.query_params.getlist('status')
+            for status_value in value.split(',')
+            if status_value.strip()
+        }
+        unknown = statuses - {value for value, _ in Order.STATUS_CHOICES}
+        if unknown:
+            raise ValidationError({'status': f"Неизвестные статусы: {', '.join(sorted(unknown))}."})
+        return sorted(statuses)
 
-    def handle_order(self, request, order):
-        raise NotImplementedError("handle_order must be implemented in subclasses")
-    
 
-class SupplierConfirmOrderView(BaseOrderStatusView):
+class BaseOrderStatusView(APIView):
     """
-    Подтверждение заказа поставщиком.
-    - Доступ: только staff этого поставщика или superuser.
-    - Проверяет статус (например, должен быть 'pending').
-    - Обновляет склад: вычитает quantity из Product.stock_quantity.
+    Базовый класс для изменения статуса заказа.
+    Переход описан в orders/transitions.py: один условный UPDATE + история в одной транзакции.
     """
-    new_status = 'confirmed'
-
-    def handle_order(self, request, order):
-        user = request.user
-
-        # проверяем, что user привязан к этому supplier
-        staff_links = SupplierStaff.objects.filter(user=user, supplier=order.supplier)
-        if not staff_links.exists() and not user.is_superuser:
-            return Response(
-                {"detail": "Вы не можете подтверждать заказы для этого поставщика."},
-                status=status.HTTP_403_FORBIDDEN
-            )
-
-        # допускаем подтверждение только из 'pending'
-        if order.status != 'pending':
-            return Response(
-                {"detail": f"Нельзя подтвердить заказ в статусе '{order.status}'."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+    permission_classes = [permissions.IsAuthenticated]
+    action = None  # ключ transitions.TRANSITIONS, переопределяем в наследниках
 
-        # проверяем наличие товаров на складе
-        items = order.items.all()
-        insufficient = []
-        for item in items:
-            product = item.product
-            if product.stock_quantity is not None and product.stock_quantity < item.quantity:
-                insufficient.append({
-                    "product_id": product.id,
-                    "name": product.name,
-                    "available": str(product.stock_quantity),
-                    "required": str(item.quantity),
-                })
-
-        if insufficient:
+    def post(self, request, pk):
+        try:
+            result = transitions.apply(pk, self.action, request)
+        except InsufficientStock as exc:
             return Response(
                 {
                     "detail": "Недостаточно товара на складе для некоторых позиций.",
-                    "items": insufficient,
+                    "items": exc.shortfalls,
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
+        return Response(result.as_dict(), status=status.HTTP_200_OK)
 
-        # всё ок – вычитаем количество из склада
-        for item in items:
-            product = item.product
-            if product.stock_quantity is not None:
-                product.stock_quantity = product.stock_quantity - item.quantity
-                product.save()
-
-        old_status = order.status
-        order.status = self.new_status
-        order.save()
-
-        OrderStatusHistory.objects.create(
-            order=order,
-            old_status=old_status,
-            new_status=order.status,
-            changed_by=user,
-            comment='Order confirmed by supplier via API',
-        )
 
-        return Response(
-            {
-                "id": order.id,
-                "old_status": old_status,
-                "new_status": order.status,
-            },
-            status=status.HTTP_200_OK
-        )
-
-class SupplierRejectOrderView(BaseOrderStatusView):
+class SupplierConfirmOrderView(BaseOrderStatusView):
     """
-    Отклонение заказа поставщиком.
+    Подтверждение заказа поставщиком.
+    - Доступ: только staff этого поставщика или superuser.
+    - Только из 'pending'.
+    - Обновляет склад: вычитает quantity из Product.stock_quantity
+      (одним запросом под блокировкой, без ухода в минус), резервы заказа гасятся.
     """
-    new_status = 'rejected'
+    action = 'confirm'
 
-    def handle_order(self, request, order):
-        user = request.user
 
-        staff_links = SupplierStaff.objects.filter(user=user, supplier=order.supplier)
-        if not staff_links.exists() and not user.is_superuser:
-            return Response(
-                {"detail": "Вы не можете отклонять заказы для этого поставщика."},
-                status=status.HTTP_403_FORBIDDEN
-            )
-
-        if order.status != 'pending':
-            return Response(
-                {"detail": f"Нельзя отклонить заказ в статусе '{order.status}'."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        old_status = order.status
-        order.status = self.new_status
-        order.save()
+class SupplierRejectOrderView(BaseOrderStatusView):
+    """
+    Отклонение заказа поставщиком (только из 'pending'), резерв освобождается.
+    """
+    action = 'reject'
 
-        OrderStatusHistory.objects.create(
-            order=order,
-            old_status=old_status,
-            new_status=order.status,
-            changed_by=user,
-            comment='Order rejected by supplier via API',
-        )
-
-        return Response(
-            {
-                "id": order.id,
-                "old_status": old_status,
-                "new_status": order.status,
-            },
-            status=status.HTTP_200_OK
-        )
 
 class ConsumerCancelOrderView(BaseOrderStatusView):
     """
     Отмена заказа потребителем.
     Можно отменить только свой заказ и только пока он 'pending'.
     """
-    new_status = 'cancelled'
-
-    def handle_order(self, request, order):
-        user = request.user
+    action = 'cancel'
 
-        # ищем consumer-профиль
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
-            return Response(
-                {"detail": "Только потребитель может отменять заказ."},
-                status=status.HTTP_403_FORBIDDEN
-            )
 
-        if order.consumer != consumer_profile and not user.is_superuser:
-            return Response(
-                {"detail": "Вы не можете отменять чужой заказ."},
-                status=status.HTTP_403_FORBIDDEN
-            )
+class ConsumerCompleteOrderView(BaseOrderStatusView):
+    """
+    Завершение заказа потребителем.
+    Можно завершить только свой заказ и только если он 'confirmed' или 'in_delivery'.
+    """
+    action = 'complete'
 
-        if order.status != 'pending':
-            return Response(
-                {"detail": f"Нельзя отменить заказ в статусе '{order.status}'."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
 
-        old_status = order.status
-        order.status = self.new_status
-        order.save()
+class SupplierBulkOrderStatusView(APIView):
+    """
+    Пакетное подтверждение / отклонение заказов поставщиком.
+    POST {"action": "confirm" | "reject", "order_ids": [...]}
+    - Права проверяются один раз; все переходы и списание со склада — в одной транзакции,
+      фиксированным числом запросов (transitions.apply_many).
+    - Ответ: результат по каждому заказу, {"id", "ok": true, "old_status", "new_status"}
+      или {"id", "ok": false, "status_code", "detail"[, "items"]}.
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
-        OrderStatusHistory.objects.create(
-            order=order,
-            old_status=old_status,
-            new_status=order.status,
-            changed_by=user,
-            comment='Order cancelled by consumer via API',
+    def post(self, request):
+        serializer = BulkOrderStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = transitions.apply_many(
+            serializer.validated_data['order_ids'], serializer.validated_data['action'], request
         )
-
         return Response(
             {
-                "id": order.id,
-                "old_status": old_status,
-                "new_status": order.status,
+                "action": serializer.validated_data['action'],
+                "applied": sum(result['ok'] for result in results),
+                "results": results,
             },
             status=status.HTTP_200_OK
         )
 
 
-class ConsumerCompleteOrderView(BaseOrderStatusView):
+class SupplierStatsView(APIView):
     """
-    Завершение заказа потребителем.
-    Можно завершить только свой заказ и только если он 'confirmed' или 'in_delivery'.
+    Базовый класс дашбордов поставщика: читает только сводки orders/analytics.py.
+    GET ?from=YYYY-MM-DD&to=YYYY-MM-DD (по умолчанию последние 30 дней, не больше года).
+    Доступ: staff поставщика или superuser.
+    Подкласс определяет stats(supplier_id, start, end) -> dict для ответа.
     """
-    new_status = 'completed'
+    permission_classes = [permissions.IsAuthenticated]
+    default_days = 30
+    max_days = 366
+
+    def get(self, request, supplier_id):
+        scope = get_access_scope(request)
+        if not scope.is_staff_of(supplier_id) and not scope.is_superuser:
+            raise PermissionDenied("Нет доступа к статистике этого поставщика.")
+        start, end = self.get_period(request)
+        return Response({"from": start, "to": end, **self.stats(supplier_id, start, end)})
+
+    def get_period(self, request):
+        end = query.date(request.query_params, 'to') or timezone.localdate()
+        start = query.date(request.query_params, 'from') or end - timedelta(days=self.default_days - 1)
+        if start > end:
+            raise ValidationError({'from': "Начало периода позже конца."})
+        if (end - start).days >= self.max_days:
+            raise ValidationError({'from': f"Период не длиннее {self.max_days} дней."})
+        return start, end
+
+    def get_limit(self, request, default=10, maximum=100):
+        try:
+            return max(1, min(int(request.query_params.get('limit', default)), maximum))
+        except ValueError:
+            raise ValidationError({'limit': "Должно быть целым числом."})
 
-    def handle_order(self, request, order):
-        user = request.user
 
-        # ищем consumer-профиль
-        try:
-            consumer_profile = ConsumerProfile.objects.get(user=user)
-        except ConsumerProfile.DoesNotExist:
-            return Response(
-                {"detail": "Только потребитель может завершать заказ."},
-                status=status.HTTP_403_FORBIDDEN
-            )
+class SupplierDailyStatsView(SupplierStatsView):
+    """
+    Выручка и заказы по дням: {"from", "to", "totals", "days": [...]}.
+    """
 
-        if order.consumer != consumer_profile and not user.is_superuser:
-            return Response(
-                {"detail": "Вы не можете завершать чужой заказ."},
-                status=status.HTTP_403_FORBIDDEN
-            )
+    def stats(self, supplier_id, start, end):
+        days = list(
+            SupplierDailyStats.objects.filter(supplier_id=supplier_id, day__gte=start, day__lte=end).order_by('day')
+        )
+        totals = {
+            "orders_count": sum(day.orders_count for day in days),
+            "booked_count": sum(day.booked_count for day in days),
+            "revenue": str(sum((day.revenue for day in days), Decimal('0.00'))),
+        }
+        return {"totals": totals, "days": SupplierDailyStatsSerializer(days, many=True).data}
 
-        allowed_statuses = ['confirmed', 'in_delivery']
-        if order.status not in allowed_statuses:
-            return Response(
-                {"detail": f"Нельзя завершить заказ в статусе '{order.status}'. Допустимые статусы: {allowed_statuses}."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
 
-        old_status = order.status
-        order.status = self.new_status
-        order.save()
+class SupplierTopProductsView(SupplierStatsView):
+    """
+    Товары с наибольшей выручкой за период: ?limit= (по умолчанию 10, максимум 100).
+    """
 
-        OrderStatusHistory.objects.create(
-            order=order,
-            old_status=old_status,
-            new_status=order.status,
-            changed_by=user,
-            comment='Order completed by consumer via API',
+    def stats(self, supplier_id, start, end):
+        rows = (
+            ProductDailyStats.objects
+            .filter(supplier_id=supplier_id, day__gte=start, day__lte=end)
+            .values('product_id', 'product__name')
+            .annotate(orders_count=Sum('orders_count'), quantity=Sum('quantity'), revenue=Sum('revenue'))
+            .order_by('-revenue', 'product_id')[:self.get_limit(self.request)]
         )
+        return {"products": TopProductSerializer(rows, many=True).data}
 
-        return Response(
-            {
-                "id": order.id,
-                "old_status": old_status,
-                "new_status": order.status,
-            },
-            status=status.HTTP_200_OK
+
+class SupplierTopConsumersView(SupplierStatsView):
+    """
+    Потребители с наибольшей выручкой за период: ?limit= (по умолчанию 10, максимум 100).
+    """
+
+    def stats(self, supplier_id, start, end):
+        rows = (
+            ConsumerDailyStats.objects
+            .filter(supplier_id=supplier_id, day__gte=start, day__lte=end)
+            .values('consumer_id', 'consumer__business_name')
+            .annotate(orders_count=Sum('orders_count'), booked_count=Sum('booked_count'), revenue=Sum('revenue'))
+            .order_by('-revenue', 'consumer_id')[:self.get_limit(self.request)]
         )
+        return {"consumers": TopConsumerSerializer(rows, many=True).data}
@@ -0,0 +1,324 @@
+"""
+Sparse fieldsets for list and detail endpoints: ?fields= and ?expand=.
+
+    GET /api/orders/?fields=id,status,total_amount,items.quantity&expand=items
+
+  * fields - comma-separated names to return, the rest is left out. A dotted
+             name (items.quantity) narrows a nested object and implies that
+             it is expanded. Without the parameter every field is returned.
+  * expand - which nested objects (category, supplier, items, items.product,
+             ...) are rendered in full. A nested object that is not expanded
+             is rendered as its id, or a list of ids. Without the parameter
+             everything is expanded, as before; ?expand= with no value
+             collapses all of them.
+
+Unknown names are a 400.
+
+Both the serializer and the query follow the same selection.
+SparseFieldsetMixin drops unrequested fields and replaces collapsed relations
+with primary keys. restrict_queryset() walks the resulting serializer and
+rebuilds the queryset: only() for the columns that are read, select_related()
+only for expanded or dereferenced foreign keys, and prefetches only for
+requested nested lists. A collapsed foreign key is read from its own column,
+without a join.
+
+SerializerMethodFields can't be inspected. A serializer lists the attributes
+they read in `method_field_sources`. An undeclared method field, or a
+source that isn't a column, annotation or relation, disables only() for its
+model so nothing is loaded lazily per row.
+
+Views opt in with SparseFieldsetViewMixin. It parses the parameters for GET
+requests, passes them to the serializer through the context and applies
+restrict_queryset() in filter_queryset().
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_paths(value):
+    """'id,items.product.name' -> {'id': {}, 'items': {'product': {'name': {}}}}"""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            name = name.strip()
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+class Fieldset:
+    """
+    Requested fields and expansions of one serializer level; None means
+    "no restriction".
+    """
+
+    def __init__(self, fields=None, expand=None):
+        self.fields = fields or None
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request):
+        params = request.query_params
+        fields = parse_paths(params[FIELDS_PARAM]) if params.get(FIELDS_PARAM, '').strip() else None
+        expand = parse_paths(params[EXPAND_PARAM]) if EXPAND_PARAM in params else None
+        if fields is None and expand is None:
+            return None
+        return cls(fields, expand)
+
+    def includes(self, name):
+        return self.fields is None or name in self.fields
+
+    def expands(self, name):
+        if self.fields is not None and self.fields.get(name):
+            return True
+        return self.expand is None or name in self.expand
+
+    def child(self, name):
+        fields = self.fields.get(name) if self.fields is not None else None
+        expand = self.expand.get(name, {}) if self.expand is not None else None
+        return Fieldset(fields, expand)
+
+
+def _nested(field):
+    """The serializer behind a nested field (the child of a list), or None."""
+    if isinstance(field, serializers.ListSerializer):
+        return field.child
+    if isinstance(field, serializers.BaseSerializer):
+        return field
+    return None
+
+
+def _collapsed(name, field):
+    kwargs = {'read_only': True}
+    if field.source not in (None, name):
+        kwargs['source'] = field.source
+    if isinstance(field, serializers.ListSerializer):
+        return serializers.PrimaryKeyRelatedField(many=True, **kwargs)
+    return serializers.PrimaryKeyRelatedField(**kwargs)
+
+
+def select_fields(fields, fieldset, param_prefix=''):
+    """
+    Apply `fieldset` to a serializer's fields dict (before binding).
+    Returns the fields to keep; nested serializers get their own fieldset.
+    """
+    if fieldset is None:
+        return fields
+
+    readable = {name for name, field in fields.items() if not field.write_only}
+    for param, tree in ((FIELDS_PARAM, fieldset.fields), (EXPAND_PARAM, fieldset.expand)):
+        for name, subtree in (tree or {}).items():
+            if name not in readable:
+                raise ValidationError({param: [f"Unknown field: {param_prefix}{name}"]})
+            if (subtree or param == EXPAND_PARAM) and _nested(fields[name]) is None:
+                raise ValidationError({param: [f"Not a nested object: {param_prefix}{name}"]})
+
+    selected = {}
+    for name, field in fields.items():
+        if field.write_only:
+            # для чтения не нужны, а при записи fieldset не применяется
+            selected[name] = field
+            continue
+        if not fieldset.includes(name):
+            continue
+        nested = _nested(field)
+        if nested is None:
+            selected[name] = field
+        elif not fieldset.expands(name):
+            selected[name] = _collapsed(name, field)
+        else:
+            child = fieldset.child(name)
+            if isinstance(nested, SparseFieldsetMixin):
+                nested._fieldset = child
+                nested._fieldset_prefix = f'{param_prefix}{name}.'
+            elif child.fields is not None:
+                raise ValidationError({FIELDS_PARAM: [f"Can't narrow nested object: {param_prefix}{name}"]})
+            selected[name] = field
+    return selected
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin: fields follow the request's ?fields= / ?expand=
+    (context['fieldset'], set by SparseFieldsetViewMixin).
+
+    method_field_sources: {method field name: [dotted attributes it reads]},
+    e.g. {'supplier_name': ['supplier.company_name']}.
+    """
+    method_field_sources = {}
+
+    _fieldset = None
+    _fieldset_prefix = ''
+
+    def get_fields(self):
+        return select_fields(super().get_fields(), self.get_fieldset(), self._fieldset_prefix)
+
+    def get_fieldset(self):
+        if self._fieldset is not None:
+            return self._fieldset
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        # вложенный сериализатор получает свою часть fieldset от родителя
+        return self.context.get('fieldset') if parent is None else None
+
+
+class _Loads:
+    """Columns, joins and prefetches one serializer level needs."""
+
+    def __init__(self):
+        self.only = set()
+        self.related = set()
+        self.prefetches = []
+
+
+def _model_path(model, attrs, annotations):
+    """
+    Follow dotted attributes through foreign keys.
+    -> (lookup path, joined relation paths, related model or None) or None
+    if an attribute isn't a column, annotation or relation.
+    """
+    joins = []
+    for depth, attr in enumerate(attrs):
+        if depth == 0 and attr in annotations:
+            return None if len(attrs) > 1 else ('', [], None)
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        path = '__'.join(attrs[:depth + 1])
+        last = depth == len(attrs) - 1
+        if field.is_relation and (field.many_to_one or field.one_to_one):
+            if last:
+                return path, joins, field.related_model
+            joins.append(path)
+            model = field.related_model
+        elif field.is_relation or not last:
+            return None
+        else:
+            return path, joins, None
+    return None
+
+
+def _collect(serializer, model, annotations, prefix, loads):
+    def everything():
+        loads.only.update(prefix + field.name for field in model._meta.concrete_fields)
+
+    def attribute(attrs):
+        resolved = _model_path(model, attrs, annotations if not prefix else ())
+        if resolved is None:
+            everything()
+            return
+        path, joins, _ = resolved
+        if path:
+            loads.only.add(prefix + path)
+        for join in joins:
+            loads.only.add(prefix + join)
+            loads.related.add(prefix + join)
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            sources = getattr(serializer, 'method_field_sources', {}).get(name)
+            if sources is None:
+                everything()
+            for source in sources or ():
+                attribute(source.split('.'))
+            continue
+        if field.source == '*':
+            everything()
+            continue
+
+        nested = _nested(field)
+        many = isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField))
+        if many:
+            try:
+                relation = model._meta.get_field(field.source_attrs[0])
+            except FieldDoesNotExist:
+                everything()
+                continue
+            if len(field.source_attrs) != 1 or not relation.one_to_many:
+                everything()
+                continue
+            related_model = relation.related_model
+            child_queryset = related_model._default_manager.all()
+            if nested is not None:
+                child_fieldset = getattr(nested, '_fieldset', None) or Fieldset()
+                child_queryset = restrict_queryset(
+                    child_queryset, type(nested), child_fieldset, keep=[relation.field.name]
+                )
+            else:
+                child_queryset = child_queryset.only(relation.field.name)
+            loads.prefetches.append(Prefetch(prefix + field.source_attrs[0], queryset=child_queryset))
+            continue
+
+        if nested is not None:
+            resolved = _model_path(model, field.source_attrs, ())
+            if resolved is None or resolved[2] is None:
+                everything()
+                continue
+            path, joins, related_model = resolved
+            for join in joins + [path]:
+                loads.only.add(prefix + join)
+                loads.related.add(prefix + join)
+            _collect(nested, related_model, (), f'{prefix}{path}__', loads)
+            continue
+
+        attribute(field.source_attrs)
+
+
+def restrict_queryset(queryset, serializer_class, fieldset, keep=()):
+    """
+    `queryset` loading only what `serializer_class` renders under `fieldset`
+    (see the module docstring). `keep`: extra columns, e.g. ordering keys.
+    Unchanged when fieldset is None.
+    """
+    if fieldset is None:
+        return queryset
+
+    serializer = serializer_class()
+    serializer._fieldset = fieldset
+    annotations = set(queryset.query.annotations)
+
+    loads = _Loads()
+    _collect(serializer, queryset.model, annotations, '', loads)
+
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if loads.related:
+        queryset = queryset.select_related(*sorted(loads.related))
+    if loads.prefetches:
+        queryset = queryset.prefetch_related(*loads.prefetches)
+    columns = loads.only | {name for name in keep if name not in annotations}
+    return queryset.only(*sorted(columns))
+
+
+class SparseFieldsetViewMixin:
+    """
+    GenericAPIView mixin: ?fields= / ?expand= for GET (see module docstring).
+    """
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            request = self.request
+            self._fieldset = Fieldset.from_request(request) if request is not None and request.method == 'GET' else None
+        return self._fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = self.get_fieldset()
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        # ключи keyset-пагинации читаются из последней строки страницы
+        ordering = getattr(self, 'keyset_ordering', None) or ('id',)
+        keep = [field.lstrip('-') for field in ordering]
+        return restrict_queryset(queryset, self.get_serializer_class(), self.get_fieldset(), keep)
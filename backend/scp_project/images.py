@@ -0,0 +1,302 @@
+"""
+Resized derivatives of uploaded images.
+
+Product.image, ProductImage.image and SupplierProfile.logo are stored as
+uploaded, often multi-MB screenshots. For every upload a background worker
+builds:
+
+  * thumb (160 px), list (480 px) and detail (1200 px) versions, longest side,
+    never upscaled, each as WebP and as JPEG for clients without WebP;
+  * a 16 px JPEG placeholder, inlined as a data: URI, shown blurred while the
+    real image loads.
+
+The result lives on the row, in a JSON field next to the image
+(image_variants / logo_variants):
+
+    {"source": "products/milk.png", "width": 3024, "height": 1964,
+     "thumb": {"webp": "derivatives/products/milk-thumb.webp",
+               "jpeg": "derivatives/products/milk-thumb.jpg", "width": 160, "height": 104},
+     "list": {...}, "detail": {...}, "placeholder": "data:image/jpeg;base64,..."}
+
+`source` is the image the variants were built from. queue_if_changed(),
+called from post_save receivers, compares it with the saved image and
+queues a rebuild after commit. Builds run on a thread pool (Pillow releases
+the GIL while decoding, resizing and encoding). With IMAGE_DERIVATIVE_WORKERS
+= 0 they run inline after commit. A finished build is stored only if the row
+still holds the same image, so a slow build never overwrites a newer upload.
+`derivatives_built` is sent afterwards.
+
+ImageVariantsField renders the stored names as URLs. Order lines keep a copy
+of the thumb (thumb_snapshot, rendered by ThumbSnapshotField). When an image
+is replaced, rebuild() deletes the old files except those that receivers of
+`derivatives_in_use` report as still referenced (orders.signals: thumbs of
+order lines), so order history keeps its pictures. Such files are not
+deleted later either.
+"""
+import base64
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+
+logger = logging.getLogger(__name__)
+
+# самый крупный первым: каждый следующий размер уменьшается из предыдущего
+SIZES = {'detail': 1200, 'list': 480, 'thumb': 160}
+PLACEHOLDER_SIZE = 16
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+PLACEHOLDER_QUALITY = 40
+
+# sender=model, pk=..., variants=... (None when the image was removed)
+derivatives_built = Signal()
+# sender=model, pk=..., names=set of old derivative files; receivers return the names still referenced
+derivatives_in_use = Signal()
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _workers():
+    return getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2)
+
+
+def _encode(image, image_format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def _shrink(image, size):
+    if max(image.size) <= size:
+        return image
+    smaller = image.copy()
+    smaller.thumbnail((size, size), Image.Resampling.LANCZOS)
+    return smaller
+
+
+def build(source, storage=default_storage):
+    """
+    Render and save all variants of one stored image.
+    Returns the variants dict (see module docstring).
+    """
+    with storage.open(source, 'rb') as fileobj:
+        image = Image.open(fileobj)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    webp = image.convert('RGBA' if has_alpha else 'RGB')
+    if has_alpha:
+        # у JPEG нет прозрачности: кладём на белый фон
+        jpeg = Image.new('RGB', webp.size, (255, 255, 255))
+        jpeg.paste(webp, mask=webp.getchannel('A'))
+    else:
+        jpeg = webp
+
+    stem = os.path.splitext(source)[0]
+    variants = {'source': source, 'width': image.width, 'height': image.height}
+    for name, size in SIZES.items():
+        smaller = _shrink(webp, size)
+        jpeg = smaller if jpeg is webp else _shrink(jpeg, size)
+        webp = smaller
+        variants[name] = {
+            'webp': storage.save(
+                f'derivatives/{stem}-{name}.webp',
+                ContentFile(_encode(webp, 'WEBP', quality=WEBP_QUALITY, method=4)),
+            ),
+            'jpeg': storage.save(
+                f'derivatives/{stem}-{name}.jpg',
+                ContentFile(_encode(jpeg, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)),
+            ),
+            'width': webp.width,
+            'height': webp.height,
+        }
+
+    tiny = _encode(_shrink(jpeg, PLACEHOLDER_SIZE), 'JPEG', quality=PLACEHOLDER_QUALITY)
+    variants['placeholder'] = 'data:image/jpeg;base64,' + base64.b64encode(tiny).decode('ascii')
+    return variants
+
+
+def _file_names(variants):
+    if not variants:
+        return set()
+    return {
+        variants[name][image_format]
+        for name in SIZES
+        if name in variants
+        for image_format in ('webp', 'jpeg')
+    }
+
+
+def delete_files(variants, storage=default_storage, keep=None, retained=()):
+    """Remove the derivative files of `variants` (except those also in `keep` or in `retained`)."""
+    for name in _file_names(variants) - _file_names(keep) - set(retained):
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.warning("Could not delete image derivative %s", name)
+
+
+def rebuild(model, pk, field_name, variants_field, force=False):
+    """
+    Build variants for the current image of one row and store them
+    (unless they are up to date and not `force`).
+    Returns the stored variants, or None if there is nothing to store.
+    """
+    row = model._default_manager.filter(pk=pk).values(field_name, variants_field).first()
+    if row is None:
+        return None
+    source, previous = row[field_name] or None, row[variants_field]
+    if not force and (previous or {}).get('source') == source:
+        return previous
+
+    storage = model._meta.get_field(field_name).storage
+    variants = None
+    if source is not None:
+        try:
+            variants = build(source, storage)
+        except Exception as exc:
+            # битый файл: запоминаем, чтобы не пересобирать при каждом сохранении
+            logger.warning("Could not build derivatives of %s: %s", source, exc)
+            variants = {'source': source, 'error': str(exc)}
+
+    updated = model._default_manager.filter(pk=pk, **{field_name: row[field_name]}).update(
+        **{variants_field: variants}
+    )
+    if not updated:
+        # картинку успели заменить: эти варианты уже никому не нужны
+        delete_files(variants, storage)
+        return None
+    delete_files(previous, storage, keep=variants, retained=files_in_use(model, pk, previous))
+    derivatives_built.send(sender=model, pk=pk, variants=variants)
+    return variants
+
+
+def files_in_use(model, pk, variants):
+    """Derivative files of `variants` that other rows still reference (derivatives_in_use)."""
+    names = _file_names(variants)
+    if not names:
+        return set()
+    in_use = set()
+    for _, response in derivatives_in_use.send(sender=model, pk=pk, names=names):
+        in_use.update(response or ())
+    return in_use
+
+
+def _rebuild_in_worker(model, pk, field_name, variants_field):
+    try:
+        rebuild(model, pk, field_name, variants_field)
+    except Exception:
+        logger.exception("Image derivatives failed for %s %s", model.__name__, pk)
+    finally:
+        connections.close_all()
+
+
+def schedule(model, pk, field_name, variants_field):
+    global _executor
+
+    if _workers() <= 0:
+        rebuild(model, pk, field_name, variants_field)
+        return
+
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='image-derivatives')
+    _executor.submit(_rebuild_in_worker, model, pk, field_name, variants_field)
+
+
+def queue_if_changed(instance, field_name, variants_field):
+    """For post_save receivers: rebuild after commit if the image changed."""
+    source = getattr(instance, field_name).name or None
+    variants = getattr(instance, variants_field)
+    if (variants or {}).get('source') == source:
+        return
+    model, pk = type(instance), instance.pk
+    transaction.on_commit(lambda: schedule(model, pk, field_name, variants_field))
+
+
+def delete_for(instance, field_name, variants_field):
+    """For post_delete receivers: remove the derivative files after commit."""
+    variants = getattr(instance, variants_field)
+    if variants:
+        storage = instance._meta.get_field(field_name).storage
+        transaction.on_commit(lambda: delete_files(variants, storage))
+
+
+def variant_urls(variants, request=None, storage=default_storage):
+    """Stored variants -> the same structure with URLs, or None if not built (yet)."""
+    if not variants or 'thumb' not in variants:
+        return None
+
+    def url(name):
+        path = storage.url(name)
+        return request.build_absolute_uri(path) if request is not None else path
+
+    urls = {
+        name: {
+            'webp': url(variants[name]['webp']),
+            'jpeg': url(variants[name]['jpeg']),
+            'width': variants[name]['width'],
+            'height': variants[name]['height'],
+        }
+        for name in SIZES
+    }
+    urls['placeholder'] = variants['placeholder']
+    return urls
+
+
+def thumb_snapshot(variants):
+    """
+    The 'thumb' size (+ placeholder) of stored variants, to copy onto other
+    rows (order lines). None if the variants aren't built.
+    """
+    if not variants or 'thumb' not in variants:
+        return None
+    return dict(variants['thumb'], placeholder=variants['placeholder'])
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Read-only: {"thumb" | "list" | "detail": {"webp", "jpeg", "width", "height"},
+    "placeholder": data URI}, or null until the variants are built.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, variants):
+        return variant_urls(variants, self.context.get('request'))
+
+
+class ThumbSnapshotField(serializers.Field):
+    """
+    Read-only: a thumb_snapshot() with URLs, {"webp", "jpeg", "width",
+    "height", "placeholder"}, or null.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, thumb):
+        if not thumb:
+            return None
+        request = self.context.get('request')
+
+        def url(name):
+            path = default_storage.url(name)
+            return request.build_absolute_uri(path) if request is not None else path
+
+        return dict(thumb, webp=url(thumb['webp']), jpeg=url(thumb['jpeg']))
@@ -0,0 +1,227 @@
+"""
+Serving uploaded media.
+
+Every /media/ request goes through MediaView, which decides whether the
+caller may see the file and then hands the bytes off according to
+MEDIA_SERVE_MODE:
+
+  * 'x-accel'    - nginx: the response carries only
+                   X-Accel-Redirect: <MEDIA_ACCEL_PREFIX><name>, nginx sends
+                   the file (with range and conditional requests) from an
+                   internal location:
+
+                       location /protected-media/ { internal; alias /app/media/; }
+
+  * 'x-sendfile' - Apache mod_xsendfile / lighttpd: X-Sendfile: <absolute path>;
+  * 'django'     - default: FileResponse streams the file from the worker,
+                   with single-range requests (206 / 416) and ETag /
+                   Last-Modified conditional GETs (304).
+
+Catalog images (products, logos, their derivatives) are public. Chat and
+complaint attachments are private: PRIVATE_MEDIA maps their upload
+directories to checks that look the file up by name and apply the same
+rules as the API (see chat.views / complaints.views.can_read_attachment).
+Anything else under MEDIA_ROOT is not served.
+
+New uploads are stored by HashedFileSystemStorage as
+<name>.<16 hex digits of sha256><ext>. Such a name never gets other content,
+so these responses are cacheable for a year as immutable. Older, unhashed
+files are revalidated.
+"""
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.module_loading import import_string
+from rest_framework import permissions
+from rest_framework.views import APIView
+
+from accounts.scope import get_access_scope
+
+
+PUBLIC_MEDIA = ('products/', 'supplier_logos/', 'derivatives/')
+PRIVATE_MEDIA = {
+    'chat_attachments/': 'chat.views.can_read_attachment',
+    'complaint_responses/': 'complaints.views.can_read_attachment',
+}
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+PUBLIC_MAX_AGE = 60 * 60
+
+HASH_LENGTH = 16
+# <stem>.<hash>[_<суффикс get_available_name>]<ext>
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{%d}(_[A-Za-z0-9]{7})?\.[^./]+$' % HASH_LENGTH)
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    """
+    FileSystemStorage that puts a content hash into every saved name
+    (media/products/milk.png -> media/products/milk.3f2a9c0d41b7e655.png).
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        root, ext = os.path.splitext(name)
+        return super().save(f'{root}.{digest.hexdigest()[:HASH_LENGTH]}{ext}', content, max_length)
+
+
+def is_immutable(name):
+    return HASHED_NAME_RE.search(name) is not None
+
+
+def _access_rule(name):
+    """None: public; a check callable: private; raises Http404: not served."""
+    if name.startswith(PUBLIC_MEDIA):
+        return None
+    for prefix, check in PRIVATE_MEDIA.items():
+        if name.startswith(prefix):
+            return import_string(check)
+    raise Http404
+
+
+def _clean_name(path):
+    name = posixpath.normpath(path)
+    if path.startswith('/') or name != path or name.split('/')[0] in ('.', '..'):
+        raise Http404
+    return name
+
+
+def _cache_control(name, private):
+    if is_immutable(name):
+        return f"{'private' if private else 'public'}, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    return 'private, no-cache' if private else f'public, max-age={PUBLIC_MAX_AGE}'
+
+
+def _byte_range(header, size):
+    """
+    (start, end) inclusive for a single 'bytes=' range, None to send the whole
+    file (no header, several ranges or an unparsable one), or 'unsatisfiable'.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return 'unsatisfiable'
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+class _RangeFile:
+    """Reads at most `length` bytes of an already positioned file."""
+
+    def __init__(self, fileobj, length):
+        self.fileobj = fileobj
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        chunk = self.fileobj.read(size)
+        self.remaining -= len(chunk)
+        return chunk
+
+    def close(self):
+        self.fileobj.close()
+
+
+class MediaView(APIView):
+    """
+    GET /media/<path> - файл из MEDIA_ROOT с проверкой доступа
+    (вложения чатов и жалоб видят только участники).
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def perform_authentication(self, request):
+        # публичные картинки отдаём без проверки токена; request.user вычисляется лениво
+        pass
+
+    def get(self, request, path):
+        name = _clean_name(path)
+        check = _access_rule(name)
+        if check is not None:
+            if not request.user.is_authenticated or not check(get_access_scope(request), name):
+                raise Http404  # не раскрываем, существует ли файл
+        cache_control = _cache_control(name, private=check is not None)
+
+        mode = getattr(settings, 'MEDIA_SERVE_MODE', 'django')
+        if mode == 'x-accel':
+            response = HttpResponse(content_type=self.content_type(name))
+            response['X-Accel-Redirect'] = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/') + name
+        elif mode == 'x-sendfile':
+            response = HttpResponse(content_type=self.content_type(name))
+            response['X-Sendfile'] = default_storage.path(name)
+        else:
+            response = self.stream(request, name)
+        response['Cache-Control'] = cache_control
+        return response
+
+    @staticmethod
+    def content_type(name):
+        content_type, encoding = mimetypes.guess_type(name)
+        return content_type or 'application/octet-stream'
+
+    def stream(self, request, name):
+        try:
+            full_path = default_storage.path(name)
+            stat = os.stat(full_path)
+        except (OSError, ValueError):
+            raise Http404
+        if not os.path.isfile(full_path):
+            raise Http404
+
+        size, last_modified = stat.st_size, int(stat.st_mtime)
+        etag = quote_etag(f'{size:x}-{stat.st_mtime_ns:x}')
+        headers = {'ETag': etag, 'Last-Modified': http_date(last_modified), 'Accept-Ranges': 'bytes'}
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            for header, value in headers.items():
+                not_modified[header] = value
+            return not_modified
+
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        if if_range is None or if_range in (etag, headers['Last-Modified']):
+            byte_range = _byte_range(request.headers.get('Range'), size)
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        fileobj = open(full_path, 'rb')
+        content_type = self.content_type(name)
+        if byte_range is None:
+            response = FileResponse(fileobj, content_type=content_type)
+        else:
+            start, end = byte_range
+            fileobj.seek(start)
+            response = FileResponse(_RangeFile(fileobj, end - start + 1), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        for header, value in headers.items():
+            response[header] = value
+        return response
@@ -0,0 +1,80 @@
+"""
+Parsing of list query parameters, shared by the catalog and order filters
+and the order views.
+
+Each helper takes the query params (request.query_params, or any mapping)
+and a name, returns None when the parameter is absent or empty, and raises
+a DRF ValidationError {name: message} (400) when it can't be parsed.
+
+    ids(params, 'consumer')         ?consumer=3,7        -> [3, 7]
+    decimal(params, 'price_min')    ?price_min=99.5      -> Decimal('99.5'), not negative
+    date(params, 'created_from')    ?created_from=2026-10-01 -> date(2026, 10, 1)
+    boolean(params, 'in_stock')     ?in_stock=true       -> True (1/true/yes, 0/false/no)
+
+day_start(day) turns a parsed local day (TIME_ZONE) into the aware datetime
+it begins at, for ranges on DateTimeFields: day_start(start) <= t <
+day_start(end + 1 day).
+"""
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+
+TRUE_VALUES = {'1', 'true', 'yes'}
+FALSE_VALUES = {'0', 'false', 'no'}
+
+
+def ids(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return [int(part) for part in value.split(',')]
+    except ValueError:
+        raise ValidationError({name: 'Ожидается id или список id через запятую.'})
+
+
+def decimal(params, name):
+    value = params.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: 'Ожидается число.'})
+    if not number.is_finite() or number < 0:
+        raise ValidationError({name: 'Ожидается неотрицательное число.'})
+    return number
+
+
+def date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError({name: 'Дата в формате YYYY-MM-DD.'})
+    return day
+
+
+def boolean(params, name):
+    value = params.get(name)
+    if value is None or value == '':
+        return None
+    value = value.lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValidationError({name: 'Ожидается true или false.'})
+
+
+def day_start(day):
+    """Aware datetime of the local midnight that starts `day`."""
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Third party apps
     'rest_framework',
@@ -103,6 +104,50 @@ DATABASES = {
 }
 
 
+# Cache
+# Shared cache for authorization data (accepted links etc.).
+# In production point REDIS_URL to the redis service; locally a per-process cache is enough.
+
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# consumer -> accepted suppliers map (accounts.link_access)
+LINK_ACCESS_LOCAL_TTL = 5          # seconds in process memory
+LINK_ACCESS_CACHE_TTL = 60 * 60    # seconds in the shared cache
+LINK_ACCESS_VERSION_TTL = 24 * 60 * 60  # seconds; per-consumer versions in the shared cache
+
+# token -> user + profiles LRU (accounts.authentication)
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,  # seconds in process memory
+    'VERSION_TTL': 24 * 60 * 60,  # seconds; per-user versions in the shared cache
+}
+
+# background rebuild of catalog snapshots (catalog.snapshots); 0 = rebuild inline after commit
+CATALOG_SNAPSHOT_WORKERS = 2
+
+# incremental catalog sync (catalog.sync): older tokens get a full reset, older tombstones are pruned
+CATALOG_SYNC_RETENTION_DAYS = 90
+
+# stock held for a pending order (orders.reservations); expired holds are released by release_stock_holds
+STOCK_HOLD_TTL_MINUTES = 24 * 60
+
+# background resizing of uploaded images (scp_project.images); 0 = resize inline after commit
+IMAGE_DERIVATIVE_WORKERS = 2
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -137,6 +182,17 @@ USE_TZ = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# /media/ отдаёт scp_project.media.MediaView (с проверкой доступа к вложениям):
+# 'django' - FileResponse с Range / 304; 'x-accel' - nginx X-Accel-Redirect; 'x-sendfile' - Apache / lighttpd
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'django')
+MEDIA_ACCEL_PREFIX = '/protected-media/'  # internal location nginx, alias на MEDIA_ROOT
+
+STORAGES = {
+    # имена загруженных файлов содержат хэш содержимого -> Cache-Control: immutable
+    'default': {'BACKEND': 'scp_project.media.HashedFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -152,11 +208,13 @@ AUTH_USER_MODEL = 'accounts.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',   # токен
+        'accounts.authentication.CachingTokenAuthentication',  # токен (с кэшем, см. accounts/authentication.py)
         'rest_framework.authentication.SessionAuthentication', # можно логиниться через /admin
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    # opt-in: списки без ?page_size= / ?cursor= остаются обычными массивами
+    'DEFAULT_PAGINATION_CLASS': 'scp_project.pagination.KeysetPagination',
 }
 
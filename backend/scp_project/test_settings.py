@@ -6,3 +6,12 @@ DATABASES = {
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
+
+# быстрый хэшер паролей для тестов
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# снимки каталогов собираются сразу после commit, без фоновых потоков
+CATALOG_SNAPSHOT_WORKERS = 0
+
+# уменьшенные копии картинок тоже строятся сразу после commit
+IMAGE_DERIVATIVE_WORKERS = 0
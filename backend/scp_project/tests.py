@@ -0,0 +1,121 @@
+import shutil
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from accounts.models import User
+from accounts.tests import ScopeFixtureMixin
+
+from . import params
+
+
+class MediaServingTest(ScopeFixtureMixin, TestCase):
+    """scp_project/media.py: public product images and private chat attachments."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        super().setUp()
+
+        self.message = self.conversations[0].messages.first()
+        self.message.attachment.save('invoice.pdf', ContentFile(b'%PDF-1.4 invoice'))
+        self.attachment_url = self.message.attachment.url
+        self.image = default_storage.save('products/milk.png', ContentFile(b'0123456789'))
+
+    def get(self, url, **headers):
+        response = self.client.get(url, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_hashed_names(self):
+        self.assertRegex(self.image, r'^products/milk\.[0-9a-f]{16}\.png$')
+        self.assertRegex(self.message.attachment.name, r'^chat_attachments/invoice\.[0-9a-f]{16}\.pdf$')
+
+    def test_private_attachment_needs_a_participant(self):
+        response, _ = self.get(self.attachment_url)
+        self.assertEqual(response.status_code, 404)
+
+        stranger = User.objects.create_user(
+            username='stranger', email='stranger@example.com', password='password', user_type='consumer'
+        )
+        self.authenticate(stranger)
+        self.assertEqual(self.get(self.attachment_url)[0].status_code, 404)
+
+        self.authenticate(self.consumer_user)
+        response, body = self.get(self.attachment_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, b'%PDF-1.4 invoice')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Cache-Control'], 'private, max-age=31536000, immutable')
+
+    def test_ranges_and_conditional_requests(self):
+        url = default_storage.url(self.image)
+        response, body = self.get(url)
+        self.assertEqual((response.status_code, body), (200, b'0123456789'))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        response, body = self.get(url, range='bytes=2-4')
+        self.assertEqual((response.status_code, body, response['Content-Range']), (206, b'234', 'bytes 2-4/10'))
+        response, body = self.get(url, range='bytes=-3')
+        self.assertEqual((response.status_code, body), (206, b'789'))
+        response, body = self.get(url, range='bytes=7-')
+        self.assertEqual((response.status_code, body), (206, b'789'))
+        response, _ = self.get(url, range='bytes=20-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+        # устаревший If-Range: весь файл
+        response, body = self.get(url, range='bytes=2-4', if_range='"stale"')
+        self.assertEqual((response.status_code, body), (200, b'0123456789'))
+
+        etag = self.get(url)[0]['ETag']
+        self.assertEqual(self.get(url, if_none_match=etag)[0].status_code, 304)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel')
+    def test_offload_to_nginx(self):
+        self.authenticate(self.owner)
+        response, body = self.get(self.attachment_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.message.attachment.name)
+        self.assertEqual(body, b'')
+
+    def test_paths_outside_served_directories(self):
+        for url in ('/media/products/../chat_attachments/x.pdf', '/media/other/file.txt', '/media/products/missing.png'):
+            self.assertEqual(self.get(url)[0].status_code, 404, url)
+
+
+class QueryParamsTest(SimpleTestCase):
+    """scp_project/params.py: the same parsing and errors for every list filter."""
+
+    def test_values(self):
+        query = {'ids': '3,7', 'amount': '99.5', 'day': '2026-10-01', 'flag': 'Yes', 'empty': ''}
+        self.assertEqual(params.ids(query, 'ids'), [3, 7])
+        self.assertEqual(params.decimal(query, 'amount'), Decimal('99.5'))
+        self.assertEqual(params.date(query, 'day'), date(2026, 10, 1))
+        self.assertIs(params.boolean(query, 'flag'), True)
+        for parse in (params.ids, params.decimal, params.date, params.boolean):
+            self.assertIsNone(parse(query, 'empty'))
+            self.assertIsNone(parse(query, 'missing'))
+
+    def test_day_start_is_local_midnight(self):
+        start = params.day_start(date(2026, 10, 1))
+        self.assertTrue(timezone.is_aware(start))
+        self.assertEqual(timezone.localtime(start).replace(tzinfo=None), datetime(2026, 10, 1))
+
+    def test_errors_name_the_parameter(self):
+        for parse, value in (
+            (params.ids, '3,x'), (params.decimal, '-1'), (params.decimal, 'NaN'),
+            (params.date, '2026-13-01'), (params.boolean, 'maybe'),
+        ):
+            with self.subTest(parse=parse.__name__, value=value):
+                with self.assertRaises(ValidationError) as caught:
+                    parse({'p': value}, 'p')
+                self.assertIn('p', caught.exception.detail)
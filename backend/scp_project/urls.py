@@ -15,10 +15,10 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from accounts.views import EmailOrUsernameAuthTokenView
 from django.conf import settings
-from django.conf.urls.static import static
+from scp_project.media import MediaView
 
 
 urlpatterns = [
@@ -34,4 +34,7 @@ urlpatterns = [
     path('api/chat/', include('chat.urls')),
 ]
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# медиа с проверкой доступа и отдачей через X-Accel-Redirect / X-Sendfile / FileResponse (scp_project/media.py)
+urlpatterns += [
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$', MediaView.as_view(), name='media'),
+]